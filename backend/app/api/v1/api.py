@@ -1,23 +1,30 @@
+from importlib import import_module
+from typing import List, NamedTuple
 from fastapi import APIRouter
-from app.api.v1.endpoints import chat, newsletter, mentoring
-
-api_router = APIRouter()
-
-# Include routers with explicit prefixes
-api_router.include_router(
-    newsletter.router,
-    prefix="/newsletter",
-    tags=["newsletter"],
-)
-
-api_router.include_router(
-    chat.router,
-    prefix="/chat",
-    tags=["chat"],
-)
-
-api_router.include_router(
-    mentoring.router,
-    prefix="/mentoring",
-    tags=["mentoring"],
-)
\ No newline at end of file
+
+
+class Endpoint(NamedTuple):
+    module: str  # under app.api.v1.endpoints, exposing `router`
+    prefix: str
+    tags: List[str]
+
+
+# Routers with explicit prefixes; the serverless app imports each one on first use
+ENDPOINTS = [
+    Endpoint("newsletter", "/newsletter", ["newsletter"]),
+    Endpoint("chat", "/chat", ["chat"]),
+    Endpoint("mentoring", "/mentoring", ["mentoring"]),
+    Endpoint("transcripts", "/transcripts", ["transcripts"]),
+    Endpoint("tasks", "/tasks", ["tasks"]),
+]
+
+
+def load_router(endpoint: Endpoint) -> APIRouter:
+    return import_module(f"app.api.v1.endpoints.{endpoint.module}").router
+
+
+def build_api_router() -> APIRouter:
+    api_router = APIRouter()
+    for endpoint in ENDPOINTS:
+        api_router.include_router(load_router(endpoint), prefix=endpoint.prefix, tags=endpoint.tags)
+    return api_router
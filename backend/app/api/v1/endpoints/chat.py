@@ -1,38 +1,252 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from fastapi.responses import StreamingResponse
-from app.schemas.chat import ChatRequest, ChatResponse
-from app.services.ai_service import ai_service
-from app.utils.rate_limiter import rate_limit
+import asyncio
+from typing import Any, Awaitable, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, Header
+from fastapi.responses import Response, StreamingResponse
+from app.schemas.chat import ChatBatchRequest, ChatBatchResult, ChatRequest, ChatResponse
+from app.core.config import settings
+from app.services.ai_service import ai_service, STREAM_ERROR_PREFIX
+from app.services.chat_sessions import new_session_id
+from app.services.prompt_registry import UnknownPromptError, prompt_registry
+from app.services.upstream_governor import UpstreamSaturatedError
+from app.services.token_quota import QuotaDecision, enforce_token_quota, token_quota
+from app.services.resumable_stream import (
+    ERROR_OVERLOADED,
+    ERROR_RESUME_UNAVAILABLE,
+    encode_error,
+    encode_event,
+    encode_heartbeat,
+    parse_last_event_id,
+    resumable_streams,
+)
+from app.utils.rate_limiter import chat_batch_rate_limit, chat_rate_limit
 
 router = APIRouter()
 
+SESSION_HEADER = "X-Session-Id"
+DISCONNECT_POLL_SECONDS = 0.5
+CLIENT_CLOSED_REQUEST = 499  # nginx convention; never seen by the departed client
+BATCH_SATURATION_RETRIES = 2  # per prompt, after waiting out the governor's Retry-After
+BATCH_MAX_RETRY_WAIT_SECONDS = 10
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def _ensure_session(request_body: ChatRequest) -> None:
+    """Start a new server-side session when the client did not continue one."""
+    if settings.ENABLE_CHAT_SESSIONS and not request_body.session_id:
+        request_body.session_id = new_session_id()
+
+
+def _check_assistant(assistant: Optional[str]) -> None:
+    """Reject an unknown prompt template up front, before any stream has started."""
+    try:
+        prompt_registry.get(assistant)
+    except UnknownPromptError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+def _overloaded(retry_after: int, detail: str) -> HTTPException:
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+async def _run_unless_disconnected(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """Await `awaitable`, cancelling it (and its upstream call) if the client goes away."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
 # Mounted at /api/v1/chat by the parent router, so keep local path root
 @router.post("", response_model=ChatResponse)
-async def chat(request_body: ChatRequest, request: Request, _: None = Depends(rate_limit)):
+async def chat(
+    request_body: ChatRequest,
+    request: Request,
+    _: None = Depends(chat_rate_limit),
+    quota: QuotaDecision = Depends(enforce_token_quota),
+):
     """
     Chat endpoint that processes user messages and returns AI responses.
     """
+    _check_assistant(request_body.assistant)
+    _ensure_session(request_body)
     try:
-        response = await ai_service.generate_response(request_body)
+        response = await _run_unless_disconnected(
+            request, ai_service.generate_response(request_body, quota.subject, quota.downgrade)
+        )
         if response.status == "error":
             raise HTTPException(status_code=500, detail=response.error)
         return response
+    except HTTPException:
+        raise
+    except UpstreamSaturatedError as error:
+        raise _overloaded(error.retry_after, str(error))
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
 
 
 @router.post("/stream")
-async def chat_stream(request_body: ChatRequest, request: Request, _: None = Depends(rate_limit)):
+async def chat_stream(
+    request_body: ChatRequest,
+    request: Request,
+    _: None = Depends(chat_rate_limit),
+    quota: QuotaDecision = Depends(enforce_token_quota),
+    accept: Optional[str] = Header(default=None),
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
     """
-    Streaming chat endpoint. Emits a text/plain stream of partial tokens.
+    Streaming chat endpoint. Emits a text/plain stream of partial tokens, or a
+    resumable text/event-stream when the client sends `Accept: text/event-stream`.
     """
+    _check_assistant(request_body.assistant)
+    if accept and "text/event-stream" in accept:
+        return await _event_stream(request_body, quota, last_event_id)
+
+    _ensure_session(request_body)
+
+    # Wait for the first chunk before committing to a 200 so overload can still be a 503
+    stream = ai_service.stream_response(request_body, quota.subject, quota.downgrade)
+    try:
+        first_chunk = await stream.__anext__()
+    except StopAsyncIteration:
+        first_chunk = None
+    except UpstreamSaturatedError as error:
+        raise _overloaded(error.retry_after, str(error))
+
     async def text_event_generator():
-        async for chunk in ai_service.stream_response(request_body):
+        if first_chunk is None:
+            return
+        yield first_chunk
+        if first_chunk.startswith(STREAM_ERROR_PREFIX):
+            return
+        async for chunk in stream:
             # Normalize stream errors to an SSE-style line the client can detect
-            if chunk.startswith("[STREAM_ERROR]:"):
+            if chunk.startswith(STREAM_ERROR_PREFIX):
                 # End the stream with an error marker
                 yield chunk
                 return
             yield chunk
 
-    return StreamingResponse(text_event_generator(), media_type="text/plain; charset=utf-8")
\ No newline at end of file
+    headers = {SESSION_HEADER: request_body.session_id} if request_body.session_id else None
+    return StreamingResponse(text_event_generator(), media_type="text/plain; charset=utf-8", headers=headers)
+
+
+async def _event_stream(
+    request_body: ChatRequest,
+    quota: QuotaDecision,
+    last_event_id: Optional[str],
+) -> StreamingResponse:
+    """
+    Server-sent events with `<generation_id>:<seq>` ids. A reconnect carrying
+    Last-Event-ID replays the missed events from the generation's ring buffer and
+    follows it live, instead of starting a new upstream call.
+    """
+    resume = parse_last_event_id(last_event_id)
+    generation = None
+    after_seq = -1
+    if resume is not None:
+        generation_id, after_seq = resume
+        generation = resumable_streams.get(generation_id)
+    else:
+        _ensure_session(request_body)
+        generation = resumable_streams.start(
+            ai_service.stream_response(request_body, quota.subject, quota.downgrade),
+            {"session_id": request_body.session_id},
+        )
+        first = await resumable_streams.first_event(generation)
+        if first is not None and first.data.get("code") == ERROR_OVERLOADED:
+            raise _overloaded(first.data["retry_after"], first.data["message"])
+
+    async def sse_generator():
+        yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+        if generation is None:
+            yield encode_error(ERROR_RESUME_UNAVAILABLE, "This response is no longer available. Please ask again.")
+            return
+        try:
+            async for event in resumable_streams.iter_events(generation, after_seq):
+                yield encode_heartbeat() if event is None else encode_event(generation.id, event)
+        except LookupError as error:
+            yield encode_error(ERROR_RESUME_UNAVAILABLE, str(error))
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if request_body.session_id:
+        headers[SESSION_HEADER] = request_body.session_id
+    return StreamingResponse(sse_generator(), media_type="text/event-stream", headers=headers)
+
+
+async def _answer_batch_prompt(index: int, batch: ChatBatchRequest, quota: QuotaDecision) -> ChatBatchResult:
+    """Answer one prompt of a batch; every failure becomes an error result rather than an exception."""
+    request_body = ChatRequest(message=batch.prompts[index], context=batch.context, assistant=batch.assistant)
+    for attempt in range(BATCH_SATURATION_RETRIES + 1):
+        # Re-checked per prompt, since a large batch can use up the quota part-way through
+        downgrade = quota.downgrade
+        if token_quota.is_exhausted(quota.subject):
+            if settings.TOKEN_QUOTA_ACTION != "downgrade":
+                return ChatBatchResult(index=index, status="error", error="Token quota exceeded.")
+            downgrade = True
+        try:
+            response = await ai_service.generate_response(request_body, quota.subject, downgrade)
+        except UpstreamSaturatedError as error:
+            # Batches aren't interactive, so wait for capacity instead of failing the prompt
+            if attempt == BATCH_SATURATION_RETRIES:
+                return ChatBatchResult(index=index, status="error", error=str(error))
+            await asyncio.sleep(min(error.retry_after, BATCH_MAX_RETRY_WAIT_SECONDS))
+            continue
+        except Exception as error:
+            return ChatBatchResult(index=index, status="error", error=str(error))
+        if response.status == "error":
+            return ChatBatchResult(index=index, status="error", error=response.error, model=response.model)
+        return ChatBatchResult(index=index, status="success", response=response.response, model=response.model)
+
+
+@router.post("/batch")
+async def chat_batch(
+    batch: ChatBatchRequest,
+    _: None = Depends(chat_batch_rate_limit),
+    quota: QuotaDecision = Depends(enforce_token_quota),
+):
+    """
+    Answer independent prompts concurrently, at most CHAT_BATCH_CONCURRENCY at a
+    time. Streams one NDJSON line per prompt as soon as it finishes, in completion
+    order, carrying the prompt's `index`; a failed prompt yields an error line and
+    the rest of the batch carries on.
+    """
+    if len(batch.prompts) > settings.CHAT_BATCH_MAX_PROMPTS:
+        raise HTTPException(
+            status_code=400, detail=f"A batch can contain at most {settings.CHAT_BATCH_MAX_PROMPTS} prompts"
+        )
+    _check_assistant(batch.assistant)
+    concurrency = min(batch.concurrency or settings.CHAT_BATCH_CONCURRENCY, settings.CHAT_BATCH_CONCURRENCY)
+
+    async def results():
+        finished: asyncio.Queue = asyncio.Queue()
+        pending = iter(range(len(batch.prompts)))
+
+        async def worker() -> None:
+            for index in pending:
+                finished.put_nowait(await _answer_batch_prompt(index, batch, quota))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(batch.prompts)))]
+        try:
+            for _ in batch.prompts:
+                result = await finished.get()
+                yield result.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            # Client gone or batch done: stop outstanding upstream calls
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(results(), media_type="application/x-ndjson", headers=headers)
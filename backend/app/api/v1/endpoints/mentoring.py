@@ -1,94 +1,254 @@
-from typing import List, Optional
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, Query, Header
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_async_db
 from app.models.mentee_application import MenteeApplication
 from app.schemas.mentee import (
     MenteeApplicationCreate,
+    MenteeApplicationPage,
     MenteeApplicationResponse,
+    MenteeApplicationSearchHit,
+    MenteeApplicationSearchPage,
 )
-from app.utils.rate_limiter import rate_limit
-from app.core.config import settings
-from app.utils.auth import verify_bearer_token
+from app.services import application_search
+from app.services.notifications import APPLICATION_STATUS_CHANGED, email_enabled
+from app.services.task_queue import task_queue
+from app.utils.admin import require_admin
+from app.utils.datetimes import utc_naive
+from app.utils.rate_limiter import mentoring_rate_limit
+from app.utils.auth import verify_bearer_token_async
 
 
 router = APIRouter()
 
+STATUS_PATTERN = "^(pending|accepted|rejected)$"
+EXPORT_BATCH_ROWS = 500
+COUNT_CACHE_TTL_SECONDS = 30
 
-@router.post("/applications", response_model=MenteeApplicationResponse, dependencies=[Depends(rate_limit)])
-def create_application(
+# Filtered totals for the admin list: filters -> (total, expires_at)
+_count_cache: Dict[Tuple[Any, ...], Tuple[int, float]] = {}
+
+
+@router.post("/applications", response_model=MenteeApplicationResponse, dependencies=[Depends(mentoring_rate_limit)])
+async def create_application(
     application_in: MenteeApplicationCreate,
-    db: Session = Depends(get_db),
-    user_email: str = Depends(verify_bearer_token),
+    db: AsyncSession = Depends(get_async_db),
+    user_email: str = Depends(verify_bearer_token_async),
 ):
     # Basic validation
     if not (application_in.goals and application_in.goals.strip()):
         raise HTTPException(status_code=400, detail="Please include your goals for mentoring.")
-    # Basic rate limit per IP
-    # Note: FastAPI's dependency for rate_limit needs Request; so call directly if provided
-    # In routing, we cannot inject Request without signature, so we perform manual guard below
-    # This keeps MVP simple
-    # (Cursor inline dependency injection for Request is brittle; skip for now)
-    existing = (
-        db.query(MenteeApplication)
-        .filter(MenteeApplication.user_email == application_in.user_email)
-        .order_by(MenteeApplication.id.desc())
-        .first()
-    )
-    # Optional: prevent rapid duplicate submissions; keep simplest behavior
+    # Per-IP rate limiting is applied by the route's mentoring_rate_limit dependency
     payload = application_in.model_dump()
     payload["user_email"] = user_email
     new_app = MenteeApplication(**payload)
     db.add(new_app)
-    db.commit()
-    db.refresh(new_app)
+    await db.commit()
+    await db.refresh(new_app)
+    _count_cache.clear()
     return new_app
 
 
 @router.get("/applications", response_model=List[MenteeApplicationResponse])
-def list_my_applications(
-    db: Session = Depends(get_db),
-    user_email: str = Depends(verify_bearer_token),
+async def list_my_applications(
+    db: AsyncSession = Depends(get_async_db),
+    user_email: str = Depends(verify_bearer_token_async),
 ):
-    apps = (
-        db.query(MenteeApplication)
-        .filter(MenteeApplication.user_email == user_email)
+    result = await db.scalars(
+        select(MenteeApplication)
+        .where(MenteeApplication.user_email == user_email)
         .order_by(MenteeApplication.id.desc())
-        .all()
     )
-    return apps
+    return result.all()
+
+
+def _admin_filters(
+    status: Optional[str], created_from: Optional[datetime], created_to: Optional[datetime]
+) -> List[Any]:
+    filters = []
+    if status:
+        filters.append(MenteeApplication.status == status)
+    if created_from:
+        filters.append(MenteeApplication.created_at >= utc_naive(created_from))
+    if created_to:
+        filters.append(MenteeApplication.created_at < utc_naive(created_to))
+    return filters
+
+
+async def _estimate_total(db: AsyncSession, filters: List[Any], key: Tuple[Any, ...]) -> int:
+    """
+    Row count for the current filters, cached briefly so paging doesn't recount.
+    Unfiltered on PostgreSQL this reads the planner's estimate instead of scanning.
+    """
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    total: Optional[int] = None
+    if not filters and db.get_bind().dialect.name == "postgresql":
+        estimate = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {"table": MenteeApplication.__tablename__},
+        )
+        # reltuples is -1 until the table has been analyzed
+        if estimate is not None and estimate >= 0:
+            total = int(estimate)
+    if total is None:
+        total = await db.scalar(select(func.count()).select_from(MenteeApplication).where(*filters))
+
+    for expired in [k for k, (_, expires_at) in _count_cache.items() if expires_at <= now]:
+        del _count_cache[expired]
+    _count_cache[key] = (total, now + COUNT_CACHE_TTL_SECONDS)
+    return total
+
+
+@router.get("/admin/applications", response_model=MenteeApplicationPage)
+async def admin_list_all(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    status: Optional[str] = Query(None, pattern=STATUS_PATTERN),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Newest applications first, paginated by id so every page is an index range scan."""
+    require_admin(x_admin_token)
+    filters = _admin_filters(status, created_from, created_to)
+    query = select(MenteeApplication).where(*filters)
+    if cursor is not None:
+        query = query.where(MenteeApplication.id < cursor)
+    result = await db.scalars(query.order_by(MenteeApplication.id.desc()).limit(limit + 1))
+    rows = result.all()
+
+    items = rows[:limit]
+    next_cursor = items[-1].id if len(rows) > limit else None
+    total = await _estimate_total(db, filters, (status, created_from, created_to))
+    return MenteeApplicationPage(items=items, next_cursor=next_cursor, total_estimate=total)
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
 
+async def _export_rows(filters: List[Any], export_format: str) -> AsyncIterator[str]:
+    """Stream matching rows from a server-side cursor, one chunk per fetched batch."""
+    columns = list(MenteeApplication.__table__.columns)
+    names = [column.name for column in columns]
+    # Own session: dependency-provided sessions are closed before the body streams
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(*columns)
+            .where(*filters)
+            .order_by(MenteeApplication.id)
+            .execution_options(yield_per=EXPORT_BATCH_ROWS)
+        )
+        if export_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(names)
+            yield buffer.getvalue()
+        async for partition in result.partitions():
+            buffer = io.StringIO()
+            if export_format == "csv":
+                writer = csv.writer(buffer)
+                writer.writerows(
+                    [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                    for row in partition
+                )
+            else:
+                for row in partition:
+                    buffer.write(json.dumps(dict(zip(names, row)), default=_json_default))
+                    buffer.write("\n")
+            yield buffer.getvalue()
 
-def _require_admin(x_admin_token: Optional[str]) -> None:
-    if not settings.BACKUP_API_KEY or x_admin_token != settings.BACKUP_API_KEY:
-        raise HTTPException(status_code=401, detail="Unauthorized")
 
+@router.get("/admin/applications/export")
+async def admin_export(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None, pattern=STATUS_PATTERN),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+):
+    require_admin(x_admin_token)
+    filters = _admin_filters(status, created_from, created_to)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(filters, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="mentee_applications.{format}"'},
+    )
 
-@router.get("/admin/applications", response_model=List[MenteeApplicationResponse])
-def admin_list_all(
+
+@router.get("/admin/applications/search", response_model=MenteeApplicationSearchPage)
+async def admin_search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    status: Optional[str] = Query(None, pattern=STATUS_PATTERN),
     x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    _require_admin(x_admin_token)
-    return db.query(MenteeApplication).order_by(MenteeApplication.id.desc()).all()
+    """Full-text search over goals, background, areas and expectations, best matches first."""
+    require_admin(x_admin_token)
+    if not await application_search.search_index_ready():
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite with FTS5")
+    terms = application_search.parse_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query has no searchable words")
+    try:
+        after = application_search.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    hits, next_cursor = await application_search.search_applications(db, terms, limit, status=status, cursor=after)
+    if not hits:
+        return MenteeApplicationSearchPage(items=[], next_cursor=None)
+    result = await db.scalars(
+        select(MenteeApplication).where(MenteeApplication.id.in_([hit["id"] for hit in hits]))
+    )
+    applications = {app.id: app for app in result.all()}
+    items = [
+        MenteeApplicationSearchHit(
+            **MenteeApplicationResponse.model_validate(applications[hit["id"]]).model_dump(),
+            score=hit["score"],
+            snippet=hit["snippet"],
+        )
+        for hit in hits
+        if hit["id"] in applications
+    ]
+    return MenteeApplicationSearchPage(items=items, next_cursor=next_cursor)
 
 
 @router.post("/admin/applications/{app_id}/status", response_model=MenteeApplicationResponse)
-def admin_update_status(
+async def admin_update_status(
     app_id: int,
-    status: str = Query(..., pattern="^(pending|accepted|rejected)$"),
+    status: str = Query(..., pattern=STATUS_PATTERN),
     x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    _require_admin(x_admin_token)
-    app = db.query(MenteeApplication).filter(MenteeApplication.id == app_id).first()
+    require_admin(x_admin_token)
+    app = await db.get(MenteeApplication, app_id)
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
+    if app.status != status and email_enabled():
+        # Committed with the status change; the email goes out after the response
+        task_queue.stage(db, APPLICATION_STATUS_CHANGED, {"application_id": app.id, "status": status})
     app.status = status
-    db.add(app)
-    db.commit()
-    db.refresh(app)
+    await db.commit()
+    await db.refresh(app)
+    _count_cache.clear()
     return app
 
 
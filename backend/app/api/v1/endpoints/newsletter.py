@@ -1,9 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.subscriber import Subscriber
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
 from pydantic import BaseModel, EmailStr
-from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.models.newsletter_issue import NewsletterDelivery, NewsletterIssue
+from app.schemas.newsletter import NewsletterIssueCreate, NewsletterIssueResponse
+from app.services.newsletter_dispatch import DispatchConflictError, IssueNotFoundError, newsletter_dispatcher
+from app.services.subscription_batcher import (
+    ALREADY_SUBSCRIBED,
+    REACTIVATED,
+    SUBSCRIBED,
+    subscription_batcher,
+)
+from app.utils.admin import require_admin
+from app.utils.rate_limiter import newsletter_rate_limit
 import re
 
 router = APIRouter()
@@ -15,40 +26,102 @@ def is_valid_email(email: str) -> bool:
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return bool(re.match(pattern, email))
 
-@router.post("/subscribe", response_model=dict)
-async def subscribe(request: SubscribeRequest, db: Session = Depends(get_db)):
+_OUTCOME_MESSAGES = {
+    SUBSCRIBED: "Subscribed successfully",
+    REACTIVATED: "Subscription reactivated successfully",
+}
+
+@router.post("/subscribe", response_model=dict, dependencies=[Depends(newsletter_rate_limit)])
+async def subscribe(request: SubscribeRequest):
     if not is_valid_email(request.email):
         raise HTTPException(status_code=400, detail="Invalid email format")
 
-    # Execute blocking DB operations in a threadpool to avoid blocking the event loop
-    def upsert_subscription():
-        existing_subscriber = (
-            db.query(Subscriber)
-            .filter(Subscriber.email == request.email)
-            .first()
-        )
-        if existing_subscriber:
-            if existing_subscriber.is_active:
-                return "Email already subscribed", False
-            existing_subscriber.is_active = True
-            db.commit()
-            return "Subscription reactivated successfully", True
-
-        new_subscriber = Subscriber(email=request.email)
-        db.add(new_subscriber)
-        try:
-            db.commit()
-            return "Subscribed successfully", True
-        except Exception:
-            db.rollback()
-            raise
-
+    # Signups are queued and committed in batches with a single upsert
     try:
-        message, changed = await run_in_threadpool(upsert_subscription)
-        if not changed and message == "Email already subscribed":
-            raise HTTPException(status_code=400, detail=message)
-        return {"message": message}
-    except HTTPException:
-        raise
+        outcome = await subscription_batcher.subscribe(request.email)
     except Exception:
-        raise HTTPException(status_code=500, detail="Failed to subscribe. Please try again.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to subscribe. Please try again.")
+
+    if outcome == ALREADY_SUBSCRIBED:
+        raise HTTPException(status_code=400, detail="Email already subscribed")
+    return {"message": _OUTCOME_MESSAGES[outcome]}
+
+
+async def _issue_response(db: AsyncSession, issue: NewsletterIssue) -> NewsletterIssueResponse:
+    counts = dict(
+        (
+            await db.execute(
+                select(NewsletterDelivery.status, func.count())
+                .where(NewsletterDelivery.issue_id == issue.id)
+                .group_by(NewsletterDelivery.status)
+            )
+        ).all()
+    )
+    return NewsletterIssueResponse(
+        id=issue.id,
+        subject=issue.subject,
+        status=issue.status,
+        created_at=issue.created_at,
+        started_at=issue.started_at,
+        finished_at=issue.finished_at,
+        sent=counts.get("sent", 0),
+        failed=counts.get("failed", 0),
+        running=newsletter_dispatcher.is_running(issue.id),
+    )
+
+
+@router.post("/admin/issues", response_model=NewsletterIssueResponse, status_code=201)
+async def create_issue(
+    issue_in: NewsletterIssueCreate,
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    require_admin(x_admin_token)
+    issue = NewsletterIssue(**issue_in.model_dump())
+    db.add(issue)
+    await db.commit()
+    await db.refresh(issue)
+    return await _issue_response(db, issue)
+
+
+@router.get("/admin/issues/{issue_id}", response_model=NewsletterIssueResponse)
+async def get_issue(
+    issue_id: int,
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Issue status with delivery counts so far; poll it while a dispatch runs."""
+    require_admin(x_admin_token)
+    issue = await db.get(NewsletterIssue, issue_id)
+    if issue is None:
+        raise HTTPException(status_code=404, detail="Issue not found")
+    return await _issue_response(db, issue)
+
+
+@router.post("/admin/issues/{issue_id}/dispatch", response_model=NewsletterIssueResponse, status_code=202)
+async def dispatch_issue(
+    issue_id: int,
+    resume: bool = Query(
+        False, description="Continue an interrupted run or retry a partial one's failed recipients; sent ones are skipped"
+    ),
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Start sending the issue to every active subscriber in the background. Returns
+    once the issue is claimed; a draft starts, while an interrupted or `partial` issue
+    needs `resume`, which sends only to recipients not yet delivered.
+    """
+    require_admin(x_admin_token)
+    if not newsletter_dispatcher.host:
+        raise HTTPException(status_code=503, detail="SMTP is not configured (set SMTP_HOST)")
+    if newsletter_dispatcher.is_running(issue_id):
+        raise HTTPException(status_code=409, detail="This issue is already being sent")
+    try:
+        issue = await newsletter_dispatcher.claim(issue_id, resume)
+    except IssueNotFoundError:
+        raise HTTPException(status_code=404, detail="Issue not found")
+    except DispatchConflictError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    newsletter_dispatcher.start(issue)
+    return await _issue_response(db, issue)
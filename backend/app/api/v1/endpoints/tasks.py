@@ -0,0 +1,99 @@
+import json
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.database import get_async_db
+from app.models.background_task import BackgroundTask
+from app.schemas.background_task import (
+    BackgroundTaskDrain,
+    BackgroundTaskPage,
+    BackgroundTaskResponse,
+    BackgroundTaskStats,
+)
+from app.services import notifications  # noqa: F401 - registers the task handlers
+from app.services.task_queue import TaskNotFoundError, TaskStateError, task_queue
+from app.utils.admin import require_admin
+
+router = APIRouter()
+
+
+def _task_response(task: BackgroundTask) -> BackgroundTaskResponse:
+    return BackgroundTaskResponse(
+        id=task.id,
+        name=task.name,
+        payload=json.loads(task.payload),
+        status=task.status,
+        attempts=task.attempts,
+        max_attempts=task.max_attempts,
+        available_at=task.available_at,
+        locked_until=task.locked_until,
+        last_error=task.last_error,
+        created_at=task.created_at,
+        updated_at=task.updated_at,
+    )
+
+
+# Mounted at /api/v1/tasks by the parent router
+@router.get("", response_model=BackgroundTaskPage)
+async def list_tasks(
+    status: str = Query("dead", pattern="^(queued|running|done|dead)$"),
+    name: Optional[str] = Query(None, max_length=100),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Newest background tasks first, paginated by id; by default the dead-letter list."""
+    require_admin(x_admin_token)
+    query = select(BackgroundTask).where(BackgroundTask.status == status)
+    if name:
+        query = query.where(BackgroundTask.name == name)
+    if cursor is not None:
+        query = query.where(BackgroundTask.id < cursor)
+    result = await db.scalars(query.order_by(BackgroundTask.id.desc()).limit(limit + 1))
+    rows = result.all()
+
+    items = [_task_response(row) for row in rows[:limit]]
+    next_cursor = items[-1].id if len(rows) > limit else None
+    return BackgroundTaskPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/stats", response_model=BackgroundTaskStats)
+async def task_stats(x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token")):
+    require_admin(x_admin_token)
+    return BackgroundTaskStats(counts=await task_queue.counts(), process=task_queue.stats())
+
+
+# GET as well, since that is what Vercel Cron sends
+@router.api_route("/drain", methods=["GET", "POST"], response_model=BackgroundTaskDrain)
+async def drain_tasks(
+    max_seconds: float = Query(20.0, gt=0, le=300, description="Stop claiming new tasks after this long"),
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    authorization: Optional[str] = Header(default=None),
+):
+    """
+    Run due tasks within this request. Serverless deployments run no workers, so a
+    cron calls this instead; Vercel Cron authenticates with `Bearer $CRON_SECRET`.
+    """
+    if not (settings.CRON_SECRET and authorization == f"Bearer {settings.CRON_SECRET}"):
+        require_admin(x_admin_token)
+    started = time.perf_counter()
+    outcomes = await task_queue.drain(max_seconds)
+    return BackgroundTaskDrain(outcomes=outcomes, seconds=round(time.perf_counter() - started, 3))
+
+
+@router.post("/{task_id}/requeue", response_model=BackgroundTaskResponse)
+async def requeue_task(task_id: int, x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token")):
+    """Give a dead-lettered task a fresh set of attempts."""
+    require_admin(x_admin_token)
+    try:
+        task = await task_queue.requeue(task_id)
+    except TaskNotFoundError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    except TaskStateError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    return _task_response(task)
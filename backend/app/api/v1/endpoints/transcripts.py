@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, Header, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_db
+from app.models.chat_transcript import ChatTranscript
+from app.schemas.transcript import TranscriptPage, TranscriptResponse
+from app.services.transcript_store import decompress
+from app.utils.admin import require_admin
+from app.utils.datetimes import utc_naive
+
+router = APIRouter()
+
+
+def _filters(
+    session_id: Optional[str],
+    subject: Optional[str],
+    assistant: Optional[str],
+    created_from: Optional[datetime],
+    created_to: Optional[datetime],
+) -> List[Any]:
+    filters = []
+    if session_id:
+        filters.append(ChatTranscript.session_id == session_id)
+    if subject:
+        filters.append(ChatTranscript.subject == subject)
+    if assistant:
+        filters.append(ChatTranscript.assistant == assistant)
+    if created_from:
+        filters.append(ChatTranscript.created_at >= utc_naive(created_from))
+    if created_to:
+        filters.append(ChatTranscript.created_at < utc_naive(created_to))
+    return filters
+
+
+# Mounted at /api/v1/transcripts by the parent router
+@router.get("", response_model=TranscriptPage)
+async def list_transcripts(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    session_id: Optional[str] = Query(None, max_length=64),
+    subject: Optional[str] = Query(None),
+    assistant: Optional[str] = Query(None, max_length=64),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Newest chat exchanges first, paginated by id. Exchanges still queued for the
+    next write-behind batch (up to TRANSCRIPT_BATCH_MAX_DELAY_MS old) are not listed yet.
+    """
+    require_admin(x_admin_token)
+    query = select(ChatTranscript).where(*_filters(session_id, subject, assistant, created_from, created_to))
+    if cursor is not None:
+        query = query.where(ChatTranscript.id < cursor)
+    result = await db.scalars(query.order_by(ChatTranscript.id.desc()).limit(limit + 1))
+    rows = result.all()
+
+    items = [
+        TranscriptResponse(
+            id=row.id,
+            session_id=row.session_id,
+            subject=row.subject,
+            assistant=row.assistant,
+            model=row.model,
+            mode=row.mode,
+            cached=row.cached,
+            prompt=decompress(row.prompt),
+            response=decompress(row.response),
+            created_at=row.created_at,
+        )
+        for row in rows[:limit]
+    ]
+    next_cursor = items[-1].id if len(rows) > limit else None
+    return TranscriptPage(items=items, next_cursor=next_cursor)
@@ -0,0 +1,297 @@
+"""
+Response compression negotiated from Accept-Encoding: brotli, zstd or gzip.
+
+Unlike Starlette's GZipMiddleware, streaming responses are never held back: every
+chunk is compressed and sync-flushed as it is sent, so chat tokens reach the client
+as soon as they are produced. Policies pick, per route prefix or per content type,
+whether a response is compressed at all (`off`), flushed chunk by chunk (`flush`,
+the default) or left to the compressor's own buffering (`buffer`), which suits bulk
+downloads that nobody watches arrive. Server-sent events default to `off`: each
+event is tiny and proxies treat compressed event streams poorly.
+
+Whole bodies are compressed once and kept, by digest, in a small LRU cache, so
+repeated static JSON (the OpenAPI document, say) is not recompressed per request.
+`brotli` and `zstandard` are optional; encodings whose module is missing are simply
+not offered.
+"""
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+POLICY_OFF = "off"
+POLICY_FLUSH = "flush"
+POLICY_BUFFER = "buffer"
+POLICIES = (POLICY_OFF, POLICY_FLUSH, POLICY_BUFFER)
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "image/svg+xml",
+)
+
+
+class Encoder(Protocol):
+    def compress(self, data: bytes, flush: bool) -> bytes: ...
+
+    def finish(self) -> bytes: ...
+
+
+class _GzipEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + self._compressor.flush() if flush else output
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else output
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_encodings() -> List[str]:
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate(accept_encoding: str, preference: List[str]) -> Optional[str]:
+    """
+    The encoding to use for an Accept-Encoding value: highest q-value first, ties
+    broken by `preference` (the server's order). None means send identity.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = part.strip().split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    wildcard = weights.get("*")
+    best, best_weight = None, 0.0
+    for encoding in preference:
+        weight = weights.get(encoding, wildcard if wildcard is not None else 0.0)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def parse_policies(value: str) -> List[Tuple[str, str]]:
+    """Parse "key:policy,key:policy" (keys are path prefixes or media types)."""
+    policies = []
+    for entry in value.split(","):
+        key, _, policy = entry.strip().rpartition(":")
+        if key and policy in POLICIES:
+            policies.append((key, policy))
+    return policies
+
+
+class CompressedBodyCache:
+    """
+    LRU of compressed bodies keyed by (encoding, digest of the uncompressed body),
+    for whole responses up to `max_body_bytes`. Keying on content means an entry can
+    never be stale, only unused. Safe on the event loop without locking: nothing awaits.
+    """
+
+    def __init__(self, max_entries: int, max_body_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._entries: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compress(self, encoding: str, body: bytes, compress: Callable[[bytes], bytes]) -> bytes:
+        if self.max_entries <= 0 or len(body) > self.max_body_bytes:
+            return compress(body)
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        compressed = self._entries[key] = compress(body)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return compressed
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI, so streamed bodies are compressed and forwarded chunk by chunk instead
+    of being collected the way BaseHTTPMiddleware-style wrappers do.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        encodings: Optional[List[str]] = None,
+        route_policies: Optional[List[Tuple[str, str]]] = None,
+        content_type_policies: Optional[List[Tuple[str, str]]] = None,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+        cache: Optional[CompressedBodyCache] = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        supported = available_encodings()
+        self.encodings = [encoding for encoding in (encodings or supported) if encoding in supported]
+        # Longest prefix wins
+        self.route_policies = sorted(route_policies or [], key=lambda item: len(item[0]), reverse=True)
+        self.content_type_policies = dict(content_type_policies or [])
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        self.cache = cache
+
+    def _encoder(self, encoding: str) -> Encoder:
+        if encoding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+        if encoding == "zstd":
+            return _ZstdEncoder(self.zstd_level)
+        return _GzipEncoder(self.gzip_level)
+
+    def _compress_whole(self, encoding: str, body: bytes) -> bytes:
+        encoder = self._encoder(encoding)
+        return encoder.compress(body, flush=False) + encoder.finish()
+
+    def _route_policy(self, path: str) -> Optional[str]:
+        for prefix, policy in self.route_policies:
+            if path.startswith(prefix):
+                return policy
+        return None
+
+    def _content_policy(self, headers: Headers) -> str:
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        policy = self.content_type_policies.get(media_type)
+        if policy is None:
+            policy = self.content_type_policies.get(media_type.split("/")[0] + "/*")
+        if policy is not None:
+            return policy
+        return POLICY_FLUSH if media_type.startswith(COMPRESSIBLE_TYPES) else POLICY_OFF
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        route_policy = self._route_policy(scope["path"])
+        if encoding is None or route_policy == POLICY_OFF:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        policy = POLICY_OFF
+        encoder: Optional[Encoder] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, policy, encoder
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether this is a stream
+                start = message
+                headers = Headers(raw=message.get("headers", []))
+                policy = route_policy or self._content_policy(headers)
+                if (
+                    "content-encoding" in headers
+                    or "no-transform" in headers.get("cache-control", "")
+                    or message["status"] in (204, 304)
+                ):
+                    policy = POLICY_OFF
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                response_start, start = start, None
+                if policy == POLICY_OFF or (not more_body and len(body) < self.minimum_size):
+                    await send(response_start)
+                    await send(message)
+                    policy = POLICY_OFF
+                    return
+                headers = MutableHeaders(raw=response_start.setdefault("headers", []))
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    compress = lambda raw: self._compress_whole(encoding, raw)  # noqa: E731
+                    body = self.cache.get_or_compress(encoding, body, compress) if self.cache else compress(body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(response_start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                encoder = self._encoder(encoding)
+                await send(response_start)
+            elif encoder is None:
+                await send(message)
+                return
+
+            if more_body:
+                chunk = encoder.compress(body, flush=policy == POLICY_FLUSH)
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                chunk = encoder.compress(body, flush=False) + encoder.finish()
+                await send({"type": "http.response.body", "body": chunk})
+
+        await self.app(scope, receive, send_compressed)
@@ -15,10 +15,13 @@ class Settings(BaseSettings):
     # Environment
     ENVIRONMENT: Environment = Environment.DEVELOPMENT
     DEBUG: bool = False
+    # Serverless (Vercel): routers load on first use, no schema work or background tasks
+    SERVERLESS: bool = False
     
     # API Keys
     ANTHROPIC_API_KEY: str
     BACKUP_API_KEY: Optional[str] = None
+    ANTHROPIC_BASE_URL: Optional[str] = None  # e.g. a local stand-in for benchmarks
 
     # CORS Settings
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:3001,https://ht-catalyst-vuvietkienptithcm-gmailcoms-projects.vercel.app"
@@ -27,13 +30,191 @@ class Settings(BaseSettings):
     AI_MODEL: str = "claude-3-opus-20240229"
     MAX_TOKENS: int = 1024
     TEMPERATURE: float = 0.7
+
+    # System prompt templates (app/services/prompt_registry.py), picked per request by `assistant`
+    PROMPT_DEFAULT_TEMPLATE: str = "chat"
+    PROMPT_TEMPLATE_VERSIONS: str = ""  # name:version pins, e.g. "finance:1"; unpinned names use the newest
+    PROMPT_CACHE_MIN_TOKENS: int = 1024  # Anthropic's minimum cacheable prefix (2048 on Haiku)
+
+    # Model routing: short prompts go to a faster model, AI_MODEL handles the rest
+    ENABLE_MODEL_ROUTER: bool = True
+    MODEL_ROUTER_TIERS: str = "claude-3-haiku-20240307:280"  # model:max_prompt_chars, checked in order
+    MODEL_ROUTER_COMPLEX_PATTERN: Optional[str] = r"```|\b(code|debug|architecture|design|analy[sz]e|compare|strategy|roadmap)\b"
+    MODEL_ROUTER_FALLBACK_MODELS: str = "claude-3-5-sonnet-20241022"  # tried, then AI_MODEL, on overload
+    MODEL_ROUTER_MAX_P95_SECONDS: float = 20.0  # plain calls: total time; streams: time to first token
+    MODEL_ROUTER_MAX_ERROR_RATE: float = 0.25
+    MODEL_ROUTER_MIN_SAMPLES: int = 20
+    MODEL_ROUTER_WINDOW_SECONDS: float = 300.0
     
+    # Database connection pool (DATABASE_URL itself is read by app.database)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800  # seconds; recycle before server-side idle timeouts
+    DB_POOL_TIMEOUT: int = 30
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 64 * 1024 * 1024  # 64 MiB
+
+    # Newsletter signups are written in batches by one flusher task
+    ENABLE_SUBSCRIPTION_BATCHING: bool = True
+    SUBSCRIPTION_BATCH_MAX_ROWS: int = 200
+    SUBSCRIPTION_BATCH_MAX_DELAY_MS: int = 20
+
+    # Newsletter dispatch over SMTP: persistent connections, one per worker, throttled per second
+    SMTP_HOST: Optional[str] = None  # unset: no newsletter dispatch and no notification emails are queued
+    SMTP_PORT: int = 25
+    SMTP_USERNAME: Optional[str] = None
+    SMTP_PASSWORD: Optional[str] = None
+    SMTP_USE_TLS: bool = False  # implicit TLS, usually port 465
+    SMTP_START_TLS: Optional[bool] = None  # None upgrades when the server offers STARTTLS
+    SMTP_TIMEOUT_SECONDS: float = 30.0
+    NEWSLETTER_FROM: str = "Human-Technology Catalyst <newsletter@localhost>"
+    NEWSLETTER_CONCURRENCY: int = 4
+    NEWSLETTER_RATE_PER_SECOND: float = 10.0  # across all connections; 0 disables throttling
+    NEWSLETTER_READ_CHUNK_ROWS: int = 500
+    NEWSLETTER_RECORD_BATCH_ROWS: int = 100
+    NEWSLETTER_MAX_ATTEMPTS: int = 3
+    NEWSLETTER_MESSAGES_PER_CONNECTION: int = 100  # reconnect after this many; many servers cap a session
+    NEWSLETTER_LEASE_SECONDS: float = 60.0  # a run renews its claim on the issue; resume waits for it to lapse
+
+    # Durable background tasks (emails after a status change or signup), kept in the app database
+    TASK_QUEUE_WORKERS: int = 0  # in the web process; 0 leaves them to `python -m app.worker`
+    TASK_QUEUE_POLL_SECONDS: float = 1.0  # idle workers check for due tasks this often
+    TASK_QUEUE_VISIBILITY_TIMEOUT_SECONDS: float = 60.0  # lease per attempt; also the handler's time limit
+    TASK_QUEUE_MAX_ATTEMPTS: int = 5  # then the task is dead-lettered
+    TASK_QUEUE_BACKOFF_BASE_SECONDS: float = 5.0
+    TASK_QUEUE_BACKOFF_MAX_SECONDS: float = 900.0
+    TASK_QUEUE_SWEEP_SECONDS: float = 30.0  # requeue expired leases, purge old done tasks
+    TASK_QUEUE_RETENTION_HOURS: int = 72  # done tasks are deleted after this; 0 keeps them
+    TASK_QUEUE_SHUTDOWN_GRACE_SECONDS: float = 10.0
+    CRON_SECRET: Optional[str] = None  # Vercel Cron's bearer token, accepted by /api/v1/tasks/drain
+
+    # Metrics (/metrics); set PROMETHEUS_MULTIPROC_DIR when running several workers
+    ENABLE_METRICS: bool = True
+    # Scrapers send "Authorization: Bearer <token>"; without one, production serves no /metrics
+    METRICS_TOKEN: Optional[str] = None
+
+    # Response compression: br/zstd/gzip from Accept-Encoding; streams are flushed per chunk
+    ENABLE_COMPRESSION: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # whole bodies only; streams are always compressed
+    COMPRESSION_ENCODINGS: str = "br,zstd,gzip"  # server preference on equal q-values
+    # path_prefix:off|flush|buffer, longest prefix wins. Token deltas are a few bytes each,
+    # so flushing them per chunk costs more bytes than it saves: the token stream goes as is
+    COMPRESSION_ROUTE_POLICIES: str = "/api/v1/chat/stream:off"
+    COMPRESSION_CONTENT_TYPE_POLICIES: str = "text/event-stream:off"  # media_type:off|flush|buffer
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_CACHE_MAX_ENTRIES: int = 256  # compressed whole bodies, keyed by content digest
+    COMPRESSION_CACHE_MAX_BODY_BYTES: int = 256 * 1024
+
+    # Logging: JSON lines written off the event loop by a queue listener thread
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json | text
+    LOG_SAMPLE_PER_SECOND: float = 20.0  # per logger, below WARNING; 0 keeps everything
+
+    # Authentication
+    FIREBASE_PROJECT_ID: Optional[str] = None  # defaults to the Admin SDK app's project
+    AUTH_CLAIMS_CACHE_MAX_ENTRIES: int = 10000
+
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_CHAT_PER_MINUTE: Optional[int] = None  # defaults to RATE_LIMIT_PER_MINUTE
+    RATE_LIMIT_MENTORING_PER_MINUTE: Optional[int] = 20
+    RATE_LIMIT_NEWSLETTER_PER_MINUTE: Optional[int] = 10
+    RATE_LIMIT_CHAT_BATCH_PER_MINUTE: Optional[int] = 5
+    RATE_LIMIT_BACKEND: str = "memory"  # memory | sqlite (shared across workers on one host)
+    RATE_LIMIT_SQLITE_PATH: str = "./rate_limits.db"
+    RATE_LIMIT_SHARDS: int = 16
     
     # Caching
     ENABLE_CACHE: bool = False
     CACHE_TTL: int = 3600  # 1 hour
+    CACHE_MAX_ENTRIES: int = 1000
+    CACHE_MAX_BYTES: int = 16 * 1024 * 1024  # 16 MiB of cached response text
+
+    # Share one upstream stream between identical concurrent /chat/stream requests
+    ENABLE_STREAM_COALESCING: bool = True
+
+    # Near-duplicate prompt cache (MinHash LSH), opt-in
+    ENABLE_NEAR_DUP_CACHE: bool = False
+    NEAR_DUP_THRESHOLD: float = 0.85  # minimum Jaccard similarity of prompt shingles
+    NEAR_DUP_MAX_ENTRIES: int = 5000
+    NEAR_DUP_TTL: int = 86400  # 1 day
+    NEAR_DUP_SHINGLE_SIZE: int = 4
+    NEAR_DUP_SNAPSHOT_PATH: Optional[str] = "./near_dup_cache.json"
+    NEAR_DUP_SNAPSHOT_INTERVAL: int = 300  # seconds between background snapshots
+
+    # Server-side chat sessions
+    ENABLE_CHAT_SESSIONS: bool = True
+    CHAT_SESSION_BACKEND: str = "memory"  # memory | sqlite (uses DATABASE_URL)
+    CHAT_SESSION_MAX_SESSIONS: int = 10000
+    CHAT_SESSION_IDLE_TTL: int = 1800  # 30 minutes
+    CHAT_SESSION_MAX_TURNS: int = 50  # messages kept per session
+    CHAT_HISTORY_TOKEN_BUDGET: int = 2000  # history tokens sent upstream per request
+    CHAT_HISTORY_SUMMARY_TOKENS: int = 200  # budget for the summary of dropped turns
+
+    # Chat transcripts: queued on the request path, written in batches, bodies zlib-compressed
+    ENABLE_CHAT_TRANSCRIPTS: bool = True
+    TRANSCRIPT_BATCH_MAX_ROWS: int = 200
+    TRANSCRIPT_BATCH_MAX_DELAY_MS: int = 1000
+    TRANSCRIPT_QUEUE_MAX: int = 10000  # exchanges waiting to be written; newer ones are dropped beyond this
+    TRANSCRIPT_ZLIB_LEVEL: int = 1  # when first written: fast, off the request path but on the event loop
+    TRANSCRIPT_COMPACT_ZLIB_LEVEL: int = 9  # when recompressed by the maintenance job
+    TRANSCRIPT_COMPACT_AFTER_HOURS: int = 24
+    TRANSCRIPT_RETENTION_DAYS: int = 90  # 0 keeps transcripts forever
+    TRANSCRIPT_MAINTENANCE_SECONDS: int = 3600
+    TRANSCRIPT_MAINTENANCE_BATCH_ROWS: int = 500  # rows deleted or recompressed per transaction
+
+    # Resumable text/event-stream chat streaming
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+    SSE_RETRY_MS: int = 2000  # reconnect delay suggested to EventSource clients
+    SSE_RESUME_BUFFER_EVENTS: int = 1024  # ring buffer size per generation
+    SSE_RESUME_RETENTION_SECONDS: float = 60.0  # keep finished generations for late resumes
+    SSE_ABANDON_AFTER_SECONDS: float = 30.0  # cancel upstream if nobody reconnects
+
+    # POST /chat/batch: prompts answered concurrently, results streamed as NDJSON
+    CHAT_BATCH_MAX_PROMPTS: int = 100
+    CHAT_BATCH_CONCURRENCY: int = 8
+
+    # Upstream concurrency governor for Anthropic calls
+    ENABLE_UPSTREAM_GOVERNOR: bool = True
+    UPSTREAM_MAX_CONCURRENCY: int = 8
+    UPSTREAM_MAX_QUEUE: int = 32
+    UPSTREAM_MAX_QUEUE_WAIT_SECONDS: float = 10.0
+
+    # Anthropic call timeouts, retries and circuit breaking (the SDK's own retries are off)
+    UPSTREAM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    UPSTREAM_READ_TIMEOUT_SECONDS: float = 60.0  # max gap between bytes, per attempt
+    UPSTREAM_REQUEST_TIMEOUT_SECONDS: float = 60.0  # whole non-streaming attempt
+    UPSTREAM_MAX_RETRIES: int = 2
+    UPSTREAM_BACKOFF_BASE_SECONDS: float = 0.5
+    UPSTREAM_BACKOFF_MAX_SECONDS: float = 8.0  # also the longest retry-after we wait out
+    UPSTREAM_RETRY_BUDGET_RATIO: float = 0.2  # retries per request over a 10s window
+    UPSTREAM_RETRY_BUDGET_MIN_RETRIES: int = 10  # allowed per window regardless of traffic
+    ENABLE_CIRCUIT_BREAKER: bool = True
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive retryable failures
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = 1
+
+    # Anthropic HTTP connection pool, opened at start-up and kept warm between requests
+    UPSTREAM_WRITE_TIMEOUT_SECONDS: float = 30.0
+    UPSTREAM_POOL_TIMEOUT_SECONDS: float = 10.0  # waiting for a free pooled connection
+    UPSTREAM_POOL_MAX_CONNECTIONS: int = 100
+    UPSTREAM_POOL_MAX_KEEPALIVE: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY_SECONDS: float = 60.0  # idle connections are closed after this
+    UPSTREAM_HTTP2: bool = False  # needs the h2 package (httpx[http2])
+    UPSTREAM_PREWARM_CONNECTIONS: int = 2  # opened at start-up; 0 disables pre-warming
+    UPSTREAM_KEEPALIVE_PING_SECONDS: float = 25.0  # ping idle pools this often; 0 disables
+
+    # Per-user/IP token quotas from Anthropic usage accounting
+    ENABLE_TOKEN_QUOTA: bool = True
+    TOKEN_QUOTA_BUDGET: int = 200_000  # input + output tokens per window
+    TOKEN_QUOTA_WINDOW_SECONDS: int = 86400  # rolling 24 hours
+    TOKEN_QUOTA_BUCKETS: int = 24
+    TOKEN_QUOTA_FLUSH_SECONDS: float = 10.0  # batched persistence interval
+    TOKEN_QUOTA_ACTION: str = "downgrade"  # downgrade | reject
+    TOKEN_QUOTA_DOWNGRADE_MODEL: str = "claude-3-haiku-20240307"
+    TOKEN_QUOTA_DOWNGRADE_MAX_TOKENS: int = 512
 
     def validate_api_key(self) -> bool:
         """Validate that API key is properly formatted."""
@@ -0,0 +1,206 @@
+"""
+Prometheus metrics for the API.
+
+Series are plain prometheus_client collectors: updating one is an uncontended lock
+around a float add, cheap enough for the request path. Under `uvicorn --workers N`
+set PROMETHEUS_MULTIPROC_DIR to an empty directory before start-up; every worker
+then writes to mmap'd files in it and /metrics aggregates all of them.
+"""
+import hmac
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+_UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+_TTFT_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+_TOKENS_PER_SECOND_BUCKETS = (5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+_QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+_DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time until the last response byte was sent", ["method", "route"]
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Anthropic call duration; for streams, until the last event",
+    ["model", "mode"],
+    buckets=_UPSTREAM_BUCKETS,
+)
+UPSTREAM_TTFT = Histogram(
+    "upstream_time_to_first_token_seconds", "Time from stream start to the first text delta", ["model"],
+    buckets=_TTFT_BUCKETS,
+)
+UPSTREAM_TOKENS_PER_SECOND = Histogram(
+    "upstream_stream_tokens_per_second", "Output tokens per second after the first token", ["model"],
+    buckets=_TOKENS_PER_SECOND_BUCKETS,
+)
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Anthropic calls retried after an error", ["model"])
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Anthropic calls that failed", ["model", "mode"])
+UPSTREAM_RETRIES_DENIED = Counter(
+    "upstream_retries_denied_total", "Retries skipped because the global retry budget was spent"
+)
+UPSTREAM_SHORT_CIRCUITS = Counter(
+    "upstream_short_circuits_total", "Anthropic calls refused by an open circuit breaker", ["model"]
+)
+# Circuit breaker state per model, as CIRCUIT_STATES' index: 0 closed, 1 half-open, 2 open
+CIRCUIT_STATES = ("closed", "half_open", "open")
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state", "Circuit breaker state by model: 0 closed, 1 half-open, 2 open", ["model"],
+    multiprocess_mode="livemax",
+)
+UPSTREAM_CIRCUIT_OPENS = Counter(
+    "upstream_circuit_opens_total", "Times a model's circuit breaker opened", ["model"]
+)
+GOVERNOR_IN_FLIGHT = Gauge(
+    "upstream_governor_in_flight", "Anthropic calls holding a governor slot", multiprocess_mode="livesum"
+)
+GOVERNOR_QUEUE_DEPTH = Gauge(
+    "upstream_governor_queue_depth", "Callers waiting for a governor slot", multiprocess_mode="livesum"
+)
+GOVERNOR_QUEUE_WAIT = Histogram(
+    "upstream_governor_queue_wait_seconds", "Time queued callers waited for a slot, admitted or not",
+    buckets=_QUEUE_WAIT_BUCKETS,
+)
+GOVERNOR_SHED = Counter(
+    "upstream_governor_shed_total", "Calls refused with 503 by the governor (queue_full, timeout)", ["reason"]
+)
+STREAM_SUBSCRIPTIONS = Counter(
+    "stream_coalescer_subscriptions_total",
+    "Coalesced stream subscriptions by role; upstream = streams opened, joined = rode along on one",
+    ["role"],
+)
+STREAM_COALESCER_IN_FLIGHT = Gauge(
+    "stream_coalescer_in_flight", "Upstream streams currently shared by the coalescer", multiprocess_mode="livesum"
+)
+UPSTREAM_HTTP_REQUESTS = Counter(
+    "upstream_http_requests_total", "HTTP requests sent to Anthropic, keep-alive pings included"
+)
+UPSTREAM_CONNECTIONS_OPENED = Counter(
+    "upstream_connections_opened_total",
+    "New connections to Anthropic; reuse ratio = 1 - opened / upstream_http_requests_total",
+)
+PROMPT_INPUT_TOKENS = Counter(
+    "upstream_input_tokens_total",
+    "Anthropic input tokens by prompt template and kind (uncached, cache_read, cache_write)",
+    ["template", "kind"],
+)
+MODEL_ROUTES = Counter(
+    "model_routes_total", "Chat requests by the model first chosen for them and why", ["model", "reason"]
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests rejected with 429", ["scope"]
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Response cache lookups; hit ratio = hit / (hit + miss)", ["cache", "result"]
+)
+NEWSLETTER_DELIVERIES = Counter(
+    "newsletter_deliveries_total", "Newsletter emails by final delivery status (sent, failed)", ["status"]
+)
+CHAT_TRANSCRIPTS = Counter(
+    "chat_transcripts_total", "Chat exchanges by transcript outcome (written, dropped, failed)", ["outcome"]
+)
+BACKGROUND_TASKS = Counter(
+    "background_tasks_total",
+    "Background tasks by handler and outcome (enqueued, done, retried, expired, dead)",
+    ["name", "outcome"],
+)
+DB_SESSION_DURATION = Histogram(
+    "db_connection_held_seconds", "Time a pooled database connection is checked out", ["engine"],
+    buckets=_DB_BUCKETS,
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Time each pool checkout-to-checkin, i.e. how long a session holds a connection."""
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record) -> None:
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is not None:
+            DB_SESSION_DURATION.labels(name).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware) so streaming responses pass through
+    untouched. Routes are labelled by their template, e.g. /api/v1/mentoring/admin/
+    applications/{app_id}/status, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - started)
+
+
+def _authorized(request: Request) -> bool:
+    if not settings.METRICS_TOKEN:
+        return True
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if not _authorized(request):
+        return Response("Unauthorized", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead() -> None:
+    """Let the multiprocess collector drop this worker's live-only series on exit."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,21 +1,98 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import AsyncGenerator, Generator
 import os
 
+from app.core.config import settings
+from app.core.metrics import instrument_engine
+
 # Database URL - use SQLite for simplicity, can be changed to PostgreSQL/MySQL later
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ht_catalyst.db")
 
+# Async drivers for the request path; the sync URL keeps working for scripts and create_all
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def _async_url(url: str) -> str:
+    """Swap the sync driver in `url` for its async counterpart, e.g. sqlite -> sqlite+aiosqlite."""
+    parsed = make_url(url)
+    if parsed.get_driver_name() in ("aiosqlite", "asyncpg"):
+        return url
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+_is_sqlite = DATABASE_URL.startswith("sqlite")
+_is_memory_sqlite = _is_sqlite and make_url(DATABASE_URL).database in (None, "", ":memory:")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """WAL lets readers run alongside the writer; NORMAL sync is safe under WAL."""
+    cursor = dbapi_connection.cursor()
+    try:
+        if not _is_memory_sqlite:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+def _pool_options() -> dict:
+    # In-memory SQLite uses a single static connection, which takes no pool sizing
+    if _is_memory_sqlite:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": not _is_sqlite,
+    }
+
+
 # Create SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+    connect_args={"check_same_thread": False} if _is_sqlite else {},
+    **_pool_options(),
 )
 
+# Async engine used by request handlers, so database waits don't hold worker threads
+# (aiosqlite defaults to NullPool; pool it too so connections and their PRAGMAs are reused)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **({"poolclass": AsyncAdaptedQueuePool} if _is_sqlite and not _is_memory_sqlite else {}),
+    **_pool_options(),
+)
+
+if _is_sqlite:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+if settings.ENABLE_METRICS:
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions keep loaded attributes after commit so responses can serialize them
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -29,8 +106,24 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency that provides an async database session.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def create_tables():
     """
     Create all database tables.
     """
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+
+def create_missing_indexes():
+    """
+    Create indexes added to models after their table already existed.
+    create_all skips existing tables entirely, indexes included.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
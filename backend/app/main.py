@@ -1,19 +1,225 @@
+import asyncio
+import logging
+import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.compression import CompressedBodyCache, CompressionMiddleware, parse_policies
 from app.core.config import settings
-from app.api.v1.api import api_router
-from app.database import Base, engine
-from app.models import subscriber  # ensure model is imported
-from app.models import mentee_application  # ensure model is imported
+from app.core.logging_config import REQUEST_ID_HEADER, RequestIdMiddleware, configure_logging
+from app.api.v1.api import ENDPOINTS, build_api_router, load_router
 import os
 
-def create_application() -> FastAPI:
-    """Create and configure the FastAPI application."""
+# Services, models and the database are imported inside the functions below, so the
+# serverless app only pays for the ones a request actually touches.
+logger = logging.getLogger(__name__)
+
+
+async def _snapshot_near_duplicates_periodically() -> None:
+    """Persist the near-duplicate index in the background so a restart does not start cold."""
+    from app.services.near_duplicate_cache import near_duplicate_cache
+
+    while True:
+        await asyncio.sleep(settings.NEAR_DUP_SNAPSHOT_INTERVAL)
+        try:
+            await near_duplicate_cache.save_snapshot_async()
+        except Exception as error:
+            logger.warning("Near-duplicate snapshot failed: %s", error)
+
+
+async def _maintain_transcripts_periodically() -> None:
+    """Apply transcript retention and recompression; the first pass runs at start-up."""
+    from app.services.transcript_store import transcript_store
+
+    await transcript_store.run_maintenance(settings.TRANSCRIPT_MAINTENANCE_SECONDS)
+
+
+async def _flush_token_usage_periodically() -> None:
+    """Persist buffered token usage in batches instead of on the request path."""
+    from app.services.token_quota import token_quota
+
+    while True:
+        await asyncio.sleep(settings.TOKEN_QUOTA_FLUSH_SECONDS)
+        try:
+            await token_quota.flush()
+        except Exception as error:
+            logger.warning("Token usage flush failed: %s", error)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background work tied to the application lifetime."""
+    from app.core.metrics import mark_process_dead
+    from app.database import async_engine
+    from app.services.ai_service import ai_service
+    from app.services.application_search import ensure_search_index
+    from app.services.near_duplicate_cache import near_duplicate_cache
+    from app.services.newsletter_dispatch import newsletter_dispatcher
+    from app.services.prompt_registry import prompt_registry
+    from app.services import notifications  # noqa: F401 - registers the task handlers
+    from app.services.subscription_batcher import subscription_batcher
+    from app.services.task_queue import task_queue
+    from app.services.token_quota import token_quota
+    from app.services.transcript_store import transcript_store
+    from app.services.upstream_http import upstream_http
+    from app.utils.auth import firebase_auth_enabled
+    from app.utils.token_verifier import firebase_public_keys
+
+    background_tasks: list[asyncio.Task] = []
+
+    # Pay for the Anthropic SDK and the DNS/TCP/TLS set-up at boot rather than on the first chat
+    ai_service.client
+    try:
+        await upstream_http.warm()
+    except Exception as error:
+        logger.warning("Could not pre-warm upstream connections: %s", error)
+    if upstream_http.ping_interval > 0:
+        background_tasks.append(asyncio.create_task(upstream_http.run_keepalive()))
+
+    # Serverless instances compile each template on first use instead
+    compiled = prompt_registry.compile()
+    logger.info("Compiled %d prompt template(s): %s", compiled, prompt_registry.stats())
+
+    await ensure_search_index(async_engine)
+
+    if near_duplicate_cache.enabled:
+        loaded = near_duplicate_cache.load_snapshot()
+        logger.info("Loaded %d near-duplicate cache entries from snapshot", loaded)
+        background_tasks.append(asyncio.create_task(_snapshot_near_duplicates_periodically()))
+
+    if token_quota.enabled:
+        try:
+            await token_quota.load()
+        except Exception as error:
+            logger.warning("Could not load persisted token usage: %s", error)
+        background_tasks.append(asyncio.create_task(_flush_token_usage_periodically()))
+
+    if transcript_store.enabled:
+        background_tasks.append(asyncio.create_task(_maintain_transcripts_periodically()))
+
+    # Side effects staged by requests; with TASK_QUEUE_WORKERS=0 `python -m app.worker` runs them
+    workers = task_queue.start()
+    if workers:
+        logger.info("Started %d background task worker(s)", workers)
+
+    if firebase_auth_enabled():
+        # Keep Firebase signing certificates warm so token checks never wait on a fetch
+        background_tasks.append(asyncio.create_task(firebase_public_keys.run_refresher()))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    if near_duplicate_cache.enabled:
+        await near_duplicate_cache.save_snapshot_async()
+
+    if token_quota.enabled:
+        try:
+            await token_quota.flush()
+        except Exception as error:
+            logger.warning("Final token usage flush failed: %s", error)
+
+    # Flushed first: its last batch may stage confirmation tasks
+    await subscription_batcher.close()
+    await task_queue.close()
+    await transcript_store.close()
+    # Interrupted issues stay `sending`; dispatch them with resume=true after the restart
+    await newsletter_dispatcher.close()
+    await upstream_http.aclose()
+    await async_engine.dispose()
+    mark_process_dead()
+
+
+@asynccontextmanager
+async def serverless_lifespan(app: FastAPI):
+    """
+    No start-up work: a serverless instance may serve a single request. On shutdown,
+    flush and close only what this instance actually imported.
+    """
+    yield
+
+    token_quota_module = sys.modules.get("app.services.token_quota")
+    if token_quota_module is not None and token_quota_module.token_quota.enabled:
+        try:
+            await token_quota_module.token_quota.flush()
+        except Exception as error:
+            logger.warning("Final token usage flush failed: %s", error)
+
+    batcher_module = sys.modules.get("app.services.subscription_batcher")
+    if batcher_module is not None:
+        await batcher_module.subscription_batcher.close()
+
+    dispatch_module = sys.modules.get("app.services.newsletter_dispatch")
+    if dispatch_module is not None:
+        await dispatch_module.newsletter_dispatcher.close()
+
+    transcript_module = sys.modules.get("app.services.transcript_store")
+    if transcript_module is not None:
+        await transcript_module.transcript_store.close()
+
+    upstream_http_module = sys.modules.get("app.services.upstream_http")
+    if upstream_http_module is not None:
+        await upstream_http_module.upstream_http.aclose()
+
+    database_module = sys.modules.get("app.database")
+    if database_module is not None:
+        await database_module.async_engine.dispose()
+
+
+class LazyRouterMiddleware:
+    """
+    Includes each endpoint router the first time a request reaches its prefix, so a
+    cold start imports only the chat stack, say, instead of every service. Requests
+    for the OpenAPI docs load everything.
+    """
+
+    def __init__(self, app: ASGIApp, fastapi_app: FastAPI) -> None:
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self.pending = {f"{settings.API_V1_STR}{endpoint.prefix}": endpoint for endpoint in ENDPOINTS}
+        self.docs_paths = {fastapi_app.openapi_url, fastapi_app.docs_url, fastapi_app.redoc_url}
+
+    def _include(self, prefix: str) -> None:
+        # Synchronous, so two concurrent first requests cannot both include a router
+        endpoint = self.pending.pop(prefix, None)
+        if endpoint is None:
+            return
+        self.fastapi_app.include_router(
+            load_router(endpoint), prefix=f"{settings.API_V1_STR}{endpoint.prefix}", tags=endpoint.tags
+        )
+        self.fastapi_app.openapi_schema = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and self.pending:
+            path = scope["path"]
+            if path in self.docs_paths:
+                for prefix in list(self.pending):
+                    self._include(prefix)
+            else:
+                for prefix in list(self.pending):
+                    if path == prefix or path.startswith(prefix + "/"):
+                        self._include(prefix)
+        await self.app(scope, receive, send)
+
+
+def create_application(serverless: bool = settings.SERVERLESS) -> FastAPI:
+    """
+    Create and configure the FastAPI application.
+
+    `serverless` builds the same routes for a short-lived instance: routers load on
+    first use, and there is no schema work, metrics endpoint or background task.
+    """
+    configure_logging(
+        settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLE_PER_SECOND, threaded=not serverless
+    )
     app = FastAPI(
         title=settings.PROJECT_NAME,
         openapi_url=f"{settings.API_V1_STR}/openapi.json",
-        debug=settings.DEBUG
+        debug=settings.DEBUG,
+        lifespan=serverless_lifespan if serverless else lifespan,
     )
 
     # Configure CORS using settings
@@ -25,22 +231,67 @@ def create_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Session-Id", REQUEST_ID_HEADER],
     )
 
-    # Add compression for larger responses
-    app.add_middleware(GZipMiddleware, minimum_size=1024)
+    # Compress by Accept-Encoding; streamed chunks are flushed as they go, never held back
+    if settings.ENABLE_COMPRESSION:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+            encodings=[encoding.strip() for encoding in settings.COMPRESSION_ENCODINGS.split(",") if encoding.strip()],
+            route_policies=parse_policies(settings.COMPRESSION_ROUTE_POLICIES),
+            content_type_policies=parse_policies(settings.COMPRESSION_CONTENT_TYPE_POLICIES),
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+            zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+            cache=CompressedBodyCache(
+                settings.COMPRESSION_CACHE_MAX_ENTRIES, settings.COMPRESSION_CACHE_MAX_BODY_BYTES
+            ),
+        )
 
-    # Add production middleware
-    if settings.is_production:
-        from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
-        app.add_middleware(HTTPSRedirectMiddleware)
+    # Tag every request so its log lines can be correlated
+    app.add_middleware(RequestIdMiddleware)
 
-    # In production, prefer migrations over create_all
-    if not settings.is_production and os.getenv("ENABLE_CREATE_ALL", "true").lower() == "true":
-        Base.metadata.create_all(bind=engine)
+    if serverless:
+        # The platform terminates TLS and scrapes nothing, so no redirect or /metrics
+        app.add_middleware(LazyRouterMiddleware, fastapi_app=app)
+    else:
+        # Outermost, so request timings include compression
+        if settings.ENABLE_METRICS and settings.is_production and not settings.METRICS_TOKEN:
+            logger.warning("Not serving /metrics in production without METRICS_TOKEN")
+        elif settings.ENABLE_METRICS:
+            from app.core.metrics import MetricsMiddleware, metrics_endpoint
 
-    # Include API router
-    app.include_router(api_router, prefix=settings.API_V1_STR)
+            app.add_middleware(MetricsMiddleware)
+            app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+        # Add production middleware
+        if settings.is_production:
+            from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
+            app.add_middleware(HTTPSRedirectMiddleware)
+
+        # In production, prefer migrations over create_all
+        if not settings.is_production and os.getenv("ENABLE_CREATE_ALL", "true").lower() == "true":
+            from app.database import Base, create_missing_indexes, engine
+            from app.models import subscriber  # ensure model is imported
+            from app.models import mentee_application  # ensure model is imported
+            from app.models import chat_session  # ensure model is imported
+            from app.models import token_usage  # ensure model is imported
+            from app.models import chat_transcript  # ensure model is imported
+            from app.models import newsletter_issue  # ensure model is imported
+            from app.models import background_task  # ensure model is imported
+
+            Base.metadata.create_all(bind=engine)
+            create_missing_indexes()
+        else:
+            # Refuse to start without the schema, e.g. when a deploy skipped `python -m app.schema`
+            from app.schema import check_schema
+
+            check_schema()
+
+        # Include API router
+        app.include_router(build_api_router(), prefix=settings.API_V1_STR)
 
     @app.get("/")
     async def root():
@@ -53,4 +304,5 @@ def create_application() -> FastAPI:
 
     return app
 
-app = create_application()
\ No newline at end of file
+
+app = create_application()
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class BackgroundTask(Base):
+    """
+    One unit of post-request work. Workers claim `queued` rows whose available_at has
+    passed and hold them `running` until locked_until; a lease that runs out is handed
+    back to the queue. Finished rows become `done`, and rows out of attempts `dead`.
+    """
+
+    __tablename__ = "background_tasks"
+    # Serves the claim (queued, oldest available first) and the expired-lease sweep
+    __table_args__ = (Index("ix_background_tasks_status_available_at", "status", "available_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    available_at = Column(DateTime(timezone=True), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
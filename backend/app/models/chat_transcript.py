@@ -0,0 +1,21 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer, LargeBinary, String
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ChatTranscript(Base):
+    __tablename__ = "chat_transcripts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, index=True, nullable=True)
+    subject = Column(String, index=True, nullable=True)  # quota subject: user email or client IP
+    assistant = Column(String, nullable=True)  # prompt template key, e.g. "chat@1"
+    model = Column(String, nullable=True)
+    mode = Column(String, nullable=False)  # create | stream
+    cached = Column(Boolean, nullable=False, default=False)  # answered from a response cache
+    prompt = Column(LargeBinary, nullable=False)  # zlib-compressed UTF-8
+    response = Column(LargeBinary, nullable=False)  # zlib-compressed UTF-8
+    prompt_chars = Column(Integer, nullable=False, default=0)
+    response_chars = Column(Integer, nullable=False, default=0)
+    compacted = Column(Boolean, nullable=False, default=False)  # recompressed by the maintenance job
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
 
 class MenteeApplication(Base):
     __tablename__ = "mentee_applications"
+    # Serves the admin list's status filter with keyset pagination on id
+    __table_args__ = (Index("ix_mentee_applications_status_id", "status", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_email = Column(String, index=True, nullable=False)
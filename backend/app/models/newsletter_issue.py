@@ -0,0 +1,35 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class NewsletterIssue(Base):
+    __tablename__ = "newsletter_issues"
+
+    id = Column(Integer, primary_key=True, index=True)
+    subject = Column(String, nullable=False)
+    body_text = Column(Text, nullable=False)
+    body_html = Column(Text, nullable=True)  # derived from body_text when empty
+    status = Column(String, nullable=False, default="draft")  # draft | sending | sent | partial
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # The run sending the issue renews this lease; another may resume only once it lapses
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class NewsletterDelivery(Base):
+    """One row per issue and recipient; a dispatch skips recipients already marked sent."""
+
+    __tablename__ = "newsletter_deliveries"
+    __table_args__ = (UniqueConstraint("issue_id", "subscriber_id", name="uq_newsletter_delivery_issue_subscriber"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    issue_id = Column(Integer, ForeignKey("newsletter_issues.id", ondelete="CASCADE"), index=True, nullable=False)
+    subscriber_id = Column(Integer, ForeignKey("subscribers.id", ondelete="CASCADE"), nullable=False)
+    email = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # sent | failed
+    attempts = Column(Integer, nullable=False, default=1)
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+from app.database import Base
+
+
+class TokenUsage(Base):
+    __tablename__ = "token_usage"
+    __table_args__ = (UniqueConstraint("subject", "bucket_start", name="uq_token_usage_subject_bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    subject = Column(String, index=True, nullable=False)
+    bucket_start = Column(Integer, index=True, nullable=False)  # epoch seconds
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
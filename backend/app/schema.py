@@ -0,0 +1,87 @@
+"""
+Create or check the database schema for deployments that skip create_all
+(ENVIRONMENT=production, ENABLE_CREATE_ALL=false, serverless):
+
+    cd backend
+    python -m app.schema            # create missing tables and indexes in DATABASE_URL
+    python -m app.schema --check    # list missing tables; exit 1 if there are any
+    python -m app.schema --sql      # print the DDL for DATABASE_URL's dialect instead
+
+Creating is idempotent: existing tables and indexes are left as they are.
+"""
+import argparse
+import sys
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.database import Base, create_missing_indexes, engine
+
+MODEL_MODULES = (
+    "subscriber",
+    "mentee_application",
+    "chat_session",
+    "token_usage",
+    "chat_transcript",
+    "newsletter_issue",
+    "background_task",
+)
+
+
+def import_models() -> None:
+    """Register every model's table on Base.metadata."""
+    from importlib import import_module
+
+    for module in MODEL_MODULES:
+        import_module(f"app.models.{module}")
+
+
+def missing_tables() -> List[str]:
+    import_models()
+    existing = set(inspect(engine).get_table_names())
+    return [table.name for table in Base.metadata.sorted_tables if table.name not in existing]
+
+
+def check_schema() -> None:
+    """Fail at start-up, rather than on the first write, when a model's table is missing."""
+    missing = missing_tables()
+    if missing:
+        raise RuntimeError(
+            f"Database is missing tables: {', '.join(missing)}. Create them with `python -m app.schema`."
+        )
+
+
+def ddl() -> str:
+    import_models()
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=engine.dialect)).strip())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            statements.append(str(CreateIndex(index).compile(dialect=engine.dialect)).strip())
+    return ";\n\n".join(statements) + ";\n"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true", help="only report missing tables")
+    mode.add_argument("--sql", action="store_true", help="print the DDL without connecting")
+    args = parser.parse_args()
+
+    if args.sql:
+        print(ddl())
+        return 0
+    missing = missing_tables()
+    if args.check:
+        print("\n".join(missing) if missing else "schema is complete")
+        return 1 if missing else 0
+
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
+    print(f"created {len(missing)} table(s){': ' + ', '.join(missing) if missing else ''}; indexes are up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
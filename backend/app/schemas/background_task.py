@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BackgroundTaskResponse(BaseModel):
+    id: int
+    name: str
+    payload: Dict[str, Any]
+    status: str = Field(description="queued, running, done or dead")
+    attempts: int
+    max_attempts: int
+    available_at: Optional[datetime] = Field(default=None, description="Earliest time the next attempt may start")
+    locked_until: Optional[datetime] = Field(default=None, description="Lease expiry while running")
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class BackgroundTaskPage(BaseModel):
+    items: List[BackgroundTaskResponse]
+    next_cursor: Optional[int] = Field(default=None, description="Pass as `cursor` to fetch the next page")
+
+
+class BackgroundTaskStats(BaseModel):
+    counts: Dict[str, int] = Field(description="Tasks in the database by status")
+    process: Dict[str, Any] = Field(description="This process's workers and counters since start-up")
+
+
+class BackgroundTaskDrain(BaseModel):
+    outcomes: Dict[str, int] = Field(description="Tasks run by this call, by outcome (done, retried, dead)")
+    seconds: float
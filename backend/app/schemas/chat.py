@@ -8,8 +8,29 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str = Field(..., description="The user's message")
     context: Optional[List[ChatMessage]] = Field(default=None, description="Previous conversation context")
+    session_id: Optional[str] = Field(default=None, max_length=64, description="Server-side conversation session id")
+    assistant: Optional[str] = Field(
+        default=None, max_length=64, description="Prompt template: chat, finance or mentoring, optionally name@version"
+    )
 
 class ChatResponse(BaseModel):
     response: str = Field(..., description="The AI's response")
     status: str = Field(default="success", description="Status of the response")
-    error: Optional[str] = Field(default=None, description="Error message if any") 
\ No newline at end of file
+    error: Optional[str] = Field(default=None, description="Error message if any")
+    session_id: Optional[str] = Field(default=None, description="Conversation session id to send with the next message")
+    model: Optional[str] = Field(default=None, description="Model that produced the response")
+
+
+class ChatBatchRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, description="Independent prompts, each answered on its own")
+    context: Optional[List[ChatMessage]] = Field(default=None, description="Conversation context shared by every prompt")
+    concurrency: Optional[int] = Field(default=None, ge=1, description="Prompts in flight at once; capped by the server")
+    assistant: Optional[str] = Field(default=None, max_length=64, description="Prompt template used for every prompt")
+
+
+class ChatBatchResult(BaseModel):
+    index: int = Field(..., description="Position of the prompt in the request")
+    status: str = Field(..., description="success or error")
+    response: Optional[str] = Field(default=None, description="The AI's response")
+    error: Optional[str] = Field(default=None, description="Why this prompt failed")
+    model: Optional[str] = Field(default=None, description="Model that produced the response")
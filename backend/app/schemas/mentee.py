@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel, EmailStr, Field
 
@@ -47,3 +47,17 @@ class MenteeApplicationResponse(MenteeApplicationInDBBase):
     pass
 
 
+class MenteeApplicationPage(BaseModel):
+    items: List[MenteeApplicationResponse]
+    next_cursor: Optional[int] = Field(default=None, description="Pass as `cursor` to fetch the next page")
+    total_estimate: int = Field(description="Approximate number of rows matching the filters")
+
+
+class MenteeApplicationSearchHit(MenteeApplicationResponse):
+    score: float = Field(description="bm25 relevance; lower is more relevant")
+    snippet: str = Field(description="HTML-escaped excerpt with matches wrapped in <mark>")
+
+
+class MenteeApplicationSearchPage(BaseModel):
+    items: List[MenteeApplicationSearchHit]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class NewsletterIssueCreate(BaseModel):
+    subject: str = Field(..., min_length=1, max_length=200)
+    body_text: str = Field(..., min_length=1, description="Plain-text body; paragraphs separated by blank lines")
+    body_html: Optional[str] = Field(default=None, description="HTML body; generated from body_text when omitted")
+
+
+class NewsletterIssueResponse(BaseModel):
+    id: int
+    subject: str
+    status: str = Field(description="draft, sending, sent, or partial (some recipients failed)")
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    sent: int = Field(default=0, description="Recipients delivered so far")
+    failed: int = Field(default=0, description="Recipients whose latest attempt failed")
+    running: bool = Field(default=False, description="A dispatch is in progress in this process")
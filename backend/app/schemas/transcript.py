@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class TranscriptResponse(BaseModel):
+    id: int
+    session_id: Optional[str] = None
+    subject: Optional[str] = None
+    assistant: Optional[str] = Field(default=None, description="Prompt template key, e.g. chat@1")
+    model: Optional[str] = None
+    mode: str = Field(description="create or stream")
+    cached: bool = Field(description="Answered from a response cache")
+    prompt: str
+    response: str
+    created_at: Optional[datetime] = None
+
+
+class TranscriptPage(BaseModel):
+    items: List[TranscriptResponse]
+    next_cursor: Optional[int] = Field(default=None, description="Pass as `cursor` to fetch the next page")
@@ -1,101 +1,521 @@
-from anthropic import AsyncAnthropic
 from app.core.config import settings
+from app.core import metrics
 from app.schemas.chat import ChatRequest, ChatResponse
-from typing import Dict, Any
+from app.services.response_cache import response_cache, make_cache_key
+from app.services.stream_coalescer import stream_coalescer
+from app.services.near_duplicate_cache import near_duplicate_cache
+from app.services.chat_sessions import chat_session_store, trim_history
+from app.services.upstream_governor import upstream_governor, UpstreamSaturatedError
+from app.services.token_quota import token_quota
+from app.services.model_router import model_router
+from app.services.prompt_registry import CompiledPrompt, prompt_registry
+from app.services.transcript_store import Transcript, transcript_store
+from app.services.upstream_resilience import (
+    OPEN,
+    CircuitBreaker,
+    UpstreamUnavailableError,
+    backoff_seconds,
+    circuit_breakers,
+    is_retryable,
+    retry_after_seconds,
+    retry_budget,
+    unavailable_error,
+)
+from typing import Dict, Any, List, Optional
 import asyncio
+import time
 
-DEFAULT_REQUEST_TIMEOUT_SECONDS = 60
-MAX_RETRY_ATTEMPTS = 2
-INITIAL_BACKOFF_SECONDS = 0.5
+STREAM_ERROR_PREFIX = "[STREAM_ERROR]:"
+# Internal first chunk naming the model that answered; stream_response strips it
+_STREAM_MODEL_PREFIX = "[STREAM_MODEL]:"
 
 class AIService:
     def __init__(self):
-        # Use async client to avoid blocking the event loop
-        self.client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self._client = None
         self.model = settings.AI_MODEL
         self.max_tokens = settings.MAX_TOKENS
         self.temperature = settings.TEMPERATURE
 
-    def format_chat_params(self, request: ChatRequest) -> Dict[str, Any]:
-        """Format the chat parameters for the Anthropic API."""
-        return {
-            "model": self.model,
-            "max_tokens": self.max_tokens,
+    @property
+    def client(self):
+        """
+        The Anthropic client, built (and the SDK imported) on first use so that
+        importing this module stays cheap for a cold serverless instance.
+        """
+        if self._client is None:
+            from anthropic import AsyncAnthropic
+            from app.services.upstream_http import upstream_http
+
+            # Use async client to avoid blocking the event loop
+            # Retries are ours (see _retry_delay), so the SDK's built-in ones are turned off
+            # Pool limits, keep-alive and timeouts come from the shared, pre-warmed HTTP client
+            self._client = AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                base_url=settings.ANTHROPIC_BASE_URL or None,
+                max_retries=0,
+                http_client=upstream_http.client,
+            )
+        return self._client
+
+    def format_chat_params(
+        self,
+        request: ChatRequest,
+        history: Optional[List[Dict[str, str]]] = None,
+        downgrade: bool = False,
+        model: Optional[str] = None,
+        prompt: Optional[CompiledPrompt] = None,
+    ) -> Dict[str, Any]:
+        """
+        Format the chat parameters for the Anthropic API.
+        The system prompt is the compiled template `prompt` (default: the one the
+        request's `assistant` selects), whose blocks end in a cache breakpoint once long
+        enough to be cached. Prior turns are trimmed to the configured token budget and
+        the last one kept may get a second breakpoint; turns that do not fit are condensed into a short summary
+        appended to the system prompt, after the cached blocks since it changes as the
+        conversation grows. `downgrade` switches to the cheaper model used once a token
+        quota is exhausted; `model` (the router's choice) overrides either.
+        """
+        prompt = prompt or prompt_registry.get(request.assistant)
+        kept, summary = trim_history(
+            history or [],
+            token_budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+            summary_token_budget=settings.CHAT_HISTORY_SUMMARY_TOKENS,
+        )
+        params: Dict[str, Any] = {
+            "model": model or (settings.TOKEN_QUOTA_DOWNGRADE_MODEL if downgrade else self.model),
+            "max_tokens": min(self.max_tokens, settings.TOKEN_QUOTA_DOWNGRADE_MAX_TOKENS) if downgrade else self.max_tokens,
             "temperature": self.temperature,
-            "messages": [{"role": "user", "content": request.message}]
+            "system": list(prompt.system_blocks),
+            "messages": [
+                *prompt_registry.apply_history_breakpoint(prompt, kept),
+                {"role": "user", "content": request.message},
+            ],
         }
+        if summary:
+            params["system"].append({"type": "text", "text": summary})
+        return params
 
-    async def generate_response(self, request: ChatRequest) -> ChatResponse:
-        """Generate a response using the Anthropic API with timeout and simple retries."""
-        chat_params = self.format_chat_params(request)
+    async def load_history(self, request: ChatRequest) -> List[Dict[str, str]]:
+        """Return prior turns from the server-side session, else from the client-supplied context."""
+        if request.session_id and settings.ENABLE_CHAT_SESSIONS:
+            turns = await chat_session_store.get_turns(request.session_id)
+            if turns:
+                return turns
+        if request.context:
+            return [{"role": message.role, "content": message.content} for message in request.context]
+        return []
 
-        last_error: Exception | None = None
-        backoff_seconds = INITIAL_BACKOFF_SECONDS
+    async def record_turn(self, request: ChatRequest, answer: str) -> None:
+        """Append the completed exchange to the request's session, if it has one."""
+        if not (request.session_id and settings.ENABLE_CHAT_SESSIONS and answer):
+            return
+        await chat_session_store.append_turns(
+            request.session_id,
+            [
+                {"role": "user", "content": request.message},
+                {"role": "assistant", "content": answer},
+            ],
+        )
 
-        for attempt in range(1, MAX_RETRY_ATTEMPTS + 2):
-            try:
-                message = await asyncio.wait_for(
-                    self.client.messages.create(**chat_params),
-                    timeout=DEFAULT_REQUEST_TIMEOUT_SECONDS,
-                )
+    @staticmethod
+    def record_transcript(
+        request: ChatRequest,
+        answer: str,
+        mode: str,
+        model: Optional[str],
+        subject: Optional[str],
+        prompt: CompiledPrompt,
+        cached: bool = False,
+    ) -> None:
+        """Queue the completed exchange for the transcript store; never waits on the database."""
+        if not answer:
+            return
+        transcript_store.record(
+            Transcript(
+                prompt=request.message,
+                response=answer,
+                mode=mode,
+                session_id=request.session_id,
+                subject=subject,
+                assistant=prompt.key,
+                model=model,
+                cached=cached,
+            )
+        )
+
+    def _record_usage(self, subject: Optional[str], usage: Any) -> None:
+        """Charge the token usage reported by Anthropic to `subject`'s quota."""
+        if usage is None:
+            return
+        token_quota.record(
+            subject,
+            getattr(usage, "input_tokens", 0) or 0,
+            getattr(usage, "output_tokens", 0) or 0,
+        )
+
+    @staticmethod
+    def _retry_delay(
+        error: Exception, attempt: int, breaker: Optional[CircuitBreaker], can_retry: bool = True
+    ) -> Optional[float]:
+        """
+        Report a failed attempt to the model's circuit breaker and decide whether to
+        try again: returns the backoff to sleep first, or None to give up. Only
+        retryable errors are retried, and only while attempts, the retry budget and
+        the breaker allow; a retry-after longer than our backoff cap isn't waited out.
+        """
+        retryable = is_retryable(error)
+        if breaker is not None:
+            if retryable:
+                breaker.record_failure()
+            else:
+                # The upstream answered; the request itself was at fault
+                breaker.record_success()
+        if not (can_retry and retryable) or attempt > settings.UPSTREAM_MAX_RETRIES:
+            return None
+        if breaker is not None and breaker.state == OPEN:
+            return None
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None and retry_after > settings.UPSTREAM_BACKOFF_MAX_SECONDS:
+            return None
+        if not retry_budget.try_acquire():
+            return None
+        return backoff_seconds(attempt, retry_after)
+
+    async def generate_response(
+        self,
+        request: ChatRequest,
+        subject: Optional[str] = None,
+        downgrade: bool = False,
+    ) -> ChatResponse:
+        """
+        Generate a response using the Anthropic API on the model picked by the model
+        router. A model that stays overloaded after retries (or whose circuit is open)
+        hands over to the router's next candidate; if the last one fails too the call
+        raises UpstreamUnavailableError (503). Other errors come back as an error
+        ChatResponse.
+        """
+        history = await self.load_history(request)
+        route = model_router.route(request.message, downgrade)
+        prompt = prompt_registry.get(request.assistant)
+        chat_params = self.format_chat_params(
+            request, history, downgrade=downgrade, model=route.models[0], prompt=prompt
+        )
 
+        cache_key = make_cache_key(chat_params)
+        cached = response_cache.get(cache_key)
+        metrics.record_cache_lookup("response", cached is not None)
+        if cached is not None:
+            await self.record_turn(request, cached)
+            self.record_transcript(request, cached, "create", chat_params["model"], subject, prompt, cached=True)
+            return ChatResponse(
+                response=cached, status="success", session_id=request.session_id, model=chat_params["model"]
+            )
+
+        # Near-duplicate lookup only applies to single-turn prompts
+        params_tag = f"{prompt.key}|{chat_params['model']}|{chat_params['max_tokens']}|{chat_params['temperature']}"
+        use_near_dup = near_duplicate_cache.enabled and not history
+        if use_near_dup:
+            similar = near_duplicate_cache.lookup(request.message, params_tag)
+            metrics.record_cache_lookup("near_duplicate", similar is not None)
+            if similar is not None:
+                await self.record_turn(request, similar)
+                self.record_transcript(request, similar, "create", chat_params["model"], subject, prompt, cached=True)
                 return ChatResponse(
-                    response=message.content[0].text,
-                    status="success",
+                    response=similar, status="success", session_id=request.session_id, model=chat_params["model"]
                 )
+
+        for index, model in enumerate(route.models):
+            try:
+                text = await self._create({**chat_params, "model": model}, subject, prompt.key)
+            except UpstreamUnavailableError:
+                # Overloaded or circuit open: the next candidate may still have capacity
+                if index + 1 < len(route.models):
+                    continue
+                raise
+            except UpstreamSaturatedError:
+                # Our own concurrency limit; another model wouldn't help
+                raise
             except Exception as error:  # broad catch to translate into consistent API errors
-                last_error = error
-                if attempt <= MAX_RETRY_ATTEMPTS:
-                    await asyncio.sleep(backoff_seconds)
-                    backoff_seconds *= 2
-                else:
-                    break
-
-        return ChatResponse(
-            response="",
-            status="error",
-            error=str(last_error) if last_error else "Unknown error",
-        )
+                return ChatResponse(
+                    response="",
+                    status="error",
+                    error=str(error),
+                    session_id=request.session_id,
+                    model=model,
+                )
+
+            # Both caches are keyed on the primary model, so a fallback's answer stays out
+            if index == 0:
+                response_cache.set(cache_key, text)
+                if use_near_dup:
+                    near_duplicate_cache.add(request.message, text, params_tag)
+            await self.record_turn(request, text)
+            self.record_transcript(request, text, "create", model, subject, prompt)
+            return ChatResponse(
+                response=text,
+                status="success",
+                session_id=request.session_id,
+                model=model,
+            )
 
-    async def stream_response(self, request: ChatRequest):
+    async def _create(
+        self, chat_params: Dict[str, Any], subject: Optional[str] = None, prompt_key: Optional[str] = None
+    ) -> str:
+        """
+        One non-streaming answer from `chat_params["model"]`, retried per the upstream
+        policy; its usage is added to `prompt_key`'s prompt cache stats. Raises UpstreamUnavailableError once retryable failures run out, and the
+        last error for anything else.
+        """
+        model = chat_params["model"]
+        breaker = circuit_breakers.get(model)
+        retry_budget.record_request()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                if breaker is not None:
+                    breaker.before_call()
+                async with upstream_governor.slot():
+                    started = time.perf_counter()
+                    message = await asyncio.wait_for(
+                        self.client.messages.create(**chat_params),
+                        timeout=settings.UPSTREAM_REQUEST_TIMEOUT_SECONDS,
+                    )
+                    elapsed = time.perf_counter() - started
+                    metrics.UPSTREAM_DURATION.labels(model, "create").observe(elapsed)
+                if breaker is not None:
+                    breaker.record_success()
+                model_router.record(model, elapsed, True)
+                self._record_usage(subject, getattr(message, "usage", None))
+                if prompt_key:
+                    prompt_registry.record_usage(prompt_key, getattr(message, "usage", None))
+                return message.content[0].text
+            except UpstreamSaturatedError:
+                # Retrying would only add to the queue (or hit an open circuit); shed the request
+                raise
+            except Exception as error:
+                metrics.UPSTREAM_ERRORS.labels(model, "create").inc()
+                if is_retryable(error):
+                    model_router.record(model, time.perf_counter() - started, False)
+                delay = self._retry_delay(error, attempt, breaker)
+                if delay is None:
+                    if is_retryable(error):
+                        raise unavailable_error(error, breaker) from error
+                    raise
+                metrics.UPSTREAM_RETRIES.labels(model).inc()
+                await asyncio.sleep(delay)
+
+    async def stream_response(
+        self,
+        request: ChatRequest,
+        subject: Optional[str] = None,
+        downgrade: bool = False,
+    ):
         """
         Async generator that yields plain text chunks of the assistant response using Anthropic streaming.
         Intended to be wrapped by a StreamingResponse/SSE endpoint.
         """
-        chat_params = self.format_chat_params(request)
+        history = await self.load_history(request)
+        route = model_router.route(request.message, downgrade)
+        prompt = prompt_registry.get(request.assistant)
+        chat_params = self.format_chat_params(
+            request, history, downgrade=downgrade, model=route.models[0], prompt=prompt
+        )
+
+        # Serve repeats from the response cache as a single chunk
+        cache_key = make_cache_key(chat_params)
+        cached = response_cache.get(cache_key)
+        metrics.record_cache_lookup("response", cached is not None)
+        if cached is not None:
+            await self.record_turn(request, cached)
+            self.record_transcript(request, cached, "stream", chat_params["model"], subject, prompt, cached=True)
+            yield cached
+            return
+
+        # Identical concurrent requests share one upstream stream
+        chunks: list[str] = []
+        model = chat_params["model"]
+        async for chunk in stream_coalescer.subscribe(
+            cache_key,
+            lambda: self._stream_with_fallback(route.models, chat_params, cache_key, subject, prompt.key),
+        ):
+            if chunk.startswith(_STREAM_MODEL_PREFIX):
+                model = chunk[len(_STREAM_MODEL_PREFIX):]
+                continue
+            if chunk.startswith(STREAM_ERROR_PREFIX):
+                yield chunk
+                return
+            chunks.append(chunk)
+            yield chunk
+        answer = "".join(chunks)
+        await self.record_turn(request, answer)
+        self.record_transcript(request, answer, "stream", model, subject, prompt)
+
+    async def _stream_with_fallback(
+        self,
+        models: List[str],
+        chat_params: Dict[str, Any],
+        cache_key: str,
+        subject: Optional[str] = None,
+        prompt_key: Optional[str] = None,
+    ):
+        """
+        Stream from the first of `models` that isn't overloaded before its first chunk,
+        announcing it with a _STREAM_MODEL_PREFIX chunk. Only the primary model's answer
+        is cached, since `cache_key` was made from its parameters.
+        """
+        for index, model in enumerate(models):
+            announced = False
+            try:
+                async for chunk in self._stream_upstream(
+                    {**chat_params, "model": model}, cache_key if index == 0 else None, subject, prompt_key
+                ):
+                    if not announced:
+                        announced = True
+                        yield f"{_STREAM_MODEL_PREFIX}{model}"
+                    yield chunk
+                return
+            except UpstreamUnavailableError:
+                if index + 1 == len(models):
+                    raise
+
+    async def _stream_upstream(
+        self,
+        chat_params: Dict[str, Any],
+        cache_key: Optional[str],
+        subject: Optional[str] = None,
+        prompt_key: Optional[str] = None,
+    ):
+        """
+        Stream one response from Anthropic, populating the response cache on success
+        unless `cache_key` is None.
+        Usage from message_start/message_delta events is charged to `subject`, the
+        requester that started the stream, even if the stream is cut short, and added
+        to `prompt_key`'s prompt cache stats. Failures
+        before the first chunk follow the same retry policy as _create;
+        after it, text already sent can't be taken back, so the error is surfaced.
+        """
+        # Collected so a fully streamed answer can populate the cache
+        chunks: list[str] = []
+        usage = {"input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        model = chat_params["model"]
+        breaker = circuit_breakers.get(model)
+        retry_budget.record_request()
+        started = time.perf_counter()
+        first_token_at: Optional[float] = None
+        failed = False
 
-        # Attempt streaming with a timeout; surface partial chunks as they arrive
         try:
-            # The AsyncAnthropic SDK supports streaming; depending on SDK version, either:
-            # 1) client.messages.create(..., stream=True) returns an event stream
-            # 2) client.messages.stream(...) is available as a context manager
-            # We'll prefer the context manager API when present.
-            stream_ctx = getattr(self.client.messages, "stream", None)
-            if stream_ctx is not None:
+            for attempt in range(1, settings.UPSTREAM_MAX_RETRIES + 2):
+                attempt_started = time.perf_counter()
+                try:
+                    if breaker is not None:
+                        breaker.before_call()
+                    async with upstream_governor.slot():
+                        attempt_started = time.perf_counter()
+                        async for text in self._stream_attempt(chat_params, usage):
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                model_router.record(model, first_token_at - attempt_started, True)
+                            chunks.append(text)
+                            yield text
+                    if breaker is not None:
+                        breaker.record_success()
+                    if cache_key is not None:
+                        response_cache.set(cache_key, "".join(chunks))
+                    return
+                except UpstreamSaturatedError:
+                    # Propagated so the endpoint can answer 503 with Retry-After
+                    failed = True
+                    raise
+                except Exception as error:
+                    metrics.UPSTREAM_ERRORS.labels(model, "stream").inc()
+                    if is_retryable(error) and not chunks:
+                        model_router.record(model, time.perf_counter() - attempt_started, False)
+                    delay = self._retry_delay(error, attempt, breaker, can_retry=not chunks)
+                    if delay is None:
+                        failed = True
+                        if not chunks and is_retryable(error):
+                            raise unavailable_error(error, breaker)
+                        # Surface error as a yielded exception text so the SSE endpoint can forward it as an error event
+                        yield f"{STREAM_ERROR_PREFIX} {str(error)}"
+                        return
+                    metrics.UPSTREAM_RETRIES.labels(model).inc()
+                    await asyncio.sleep(delay)
+        finally:
+            if usage["input_tokens"] or usage["output_tokens"]:
+                token_quota.record(subject, usage["input_tokens"], usage["output_tokens"])
+                if prompt_key:
+                    prompt_registry.record_usage(prompt_key, usage)
+            self._observe_stream(model, started, first_token_at, usage["output_tokens"], failed)
+
+    async def _stream_attempt(self, chat_params: Dict[str, Any], usage: Dict[str, int]):
+        """One upstream streaming call, yielding text deltas and adding its token usage to `usage`."""
+        # The AsyncAnthropic SDK supports streaming; depending on SDK version, either:
+        # 1) client.messages.create(..., stream=True) returns an event stream
+        # 2) client.messages.stream(...) is available as a context manager
+        # We'll prefer the context manager API when present.
+        stream_ctx = getattr(self.client.messages, "stream", None)
+        if stream_ctx is not None:
+            input_tokens = output_tokens = cache_read = cache_write = 0
+            try:
                 async with stream_ctx(**chat_params) as stream:
                     async for event in stream:
+                        event_type = getattr(event, "type", "")
+                        if event_type == "message_start":
+                            message_usage = getattr(getattr(event, "message", None), "usage", None)
+                            input_tokens = getattr(message_usage, "input_tokens", 0) or 0
+                            cache_read = getattr(message_usage, "cache_read_input_tokens", 0) or 0
+                            cache_write = getattr(message_usage, "cache_creation_input_tokens", 0) or 0
+                        elif event_type == "message_delta":
+                            # Output usage on message_delta is cumulative
+                            delta_usage = getattr(event, "usage", None)
+                            output_tokens = getattr(delta_usage, "output_tokens", 0) or output_tokens
                         # Emit only textual deltas
-                        if getattr(event, "type", "") == "content_block_delta":
+                        if event_type == "content_block_delta":
                             delta = getattr(event, "delta", None)
                             text = getattr(delta, "text", None) if delta else None
                             if text:
                                 yield text
-                return
-            else:
-                # Fallback: create with stream=True and iterate .text_stream if available
-                message = await self.client.messages.create(stream=True, **chat_params)
-                text_stream = getattr(message, "text_stream", None)
-                if text_stream is not None:
-                    async for text in text_stream:
-                        if text:
-                            yield text
-                    return
-                # If no streaming API available, perform a single request and yield once
-                message = await self.client.messages.create(**chat_params)
-                yield message.content[0].text
-        except Exception as error:
-            # Surface error as a yielded exception text so the SSE endpoint can forward it as an error event
-            yield f"[STREAM_ERROR]: {str(error)}"
+            finally:
+                usage["input_tokens"] += input_tokens
+                usage["output_tokens"] += output_tokens
+                usage["cache_read_input_tokens"] += cache_read
+                usage["cache_creation_input_tokens"] += cache_write
+            return
+
+        # Fallback: create with stream=True and iterate .text_stream if available
+        message = await self.client.messages.create(stream=True, **chat_params)
+        text_stream = getattr(message, "text_stream", None)
+        if text_stream is not None:
+            async for text in text_stream:
+                if text:
+                    yield text
+            return
+        # If no streaming API available, perform a single request and yield once
+        message = await self.client.messages.create(**chat_params)
+        message_usage = getattr(message, "usage", None)
+        usage["input_tokens"] += getattr(message_usage, "input_tokens", 0) or 0
+        usage["output_tokens"] += getattr(message_usage, "output_tokens", 0) or 0
+        usage["cache_read_input_tokens"] += getattr(message_usage, "cache_read_input_tokens", 0) or 0
+        usage["cache_creation_input_tokens"] += getattr(message_usage, "cache_creation_input_tokens", 0) or 0
+        yield message.content[0].text
+
+    @staticmethod
+    def _observe_stream(
+        model: str, started: float, first_token_at: Optional[float], output_tokens: int, failed: bool
+    ) -> None:
+        finished = time.perf_counter()
+        if not failed:
+            metrics.UPSTREAM_DURATION.labels(model, "stream").observe(finished - started)
+        if first_token_at is None:
+            return
+        metrics.UPSTREAM_TTFT.labels(model).observe(first_token_at - started)
+        generating = finished - first_token_at
+        if output_tokens and generating > 0:
+            metrics.UPSTREAM_TOKENS_PER_SECOND.labels(model).observe(output_tokens / generating)
 
 # Create global AI service instance
 ai_service = AIService() 
\ No newline at end of file
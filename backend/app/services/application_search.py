@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import html
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "mentee_applications_fts"
+# Free-text columns that are searched, most important first; bm25 weights follow this order
+SEARCH_COLUMNS = ("goals", "background", "areas", "expectations")
+COLUMN_WEIGHTS = (4.0, 2.0, 2.0, 1.0)
+SNIPPET_TOKENS = 16
+
+# Control characters as highlight markers, so user text can be HTML-escaped before
+# the markers are turned into <mark> tags
+_HIGHLIGHT_OPEN = "\x02"
+_HIGHLIGHT_CLOSE = "\x03"
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_columns = ", ".join(SEARCH_COLUMNS)
+_new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+_old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+
+# External-content FTS5 table: the index stores only tokens and reads column text
+# back from mentee_applications. status is indexed too (with zero bm25 weight) so a
+# status filter is an index intersection inside MATCH rather than a per-row lookup.
+_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_columns}, status, content='mentee_applications', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON mentee_applications BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}, status) VALUES (new.id, {_new_values}, new.status); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON mentee_applications BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}, status) "
+    f"VALUES ('delete', old.id, {_old_values}, old.status); END",
+    # Only re-index when a searched column or the status actually changes
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_columns}, status "
+    f"ON mentee_applications BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}, status) "
+    f"VALUES ('delete', old.id, {_old_values}, old.status); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}, status) VALUES (new.id, {_new_values}, new.status); END",
+]
+
+search_available = False
+_index_checked = False
+_index_lock = asyncio.Lock()
+
+
+async def ensure_search_index(engine: AsyncEngine) -> bool:
+    """
+    Create the FTS5 table and its sync triggers if missing, backfilling existing rows
+    the first time. A no-op (returning False) on databases other than SQLite.
+    """
+    global search_available, _index_checked
+    if engine.dialect.name != "sqlite":
+        _index_checked = True
+        return False
+    try:
+        async with engine.begin() as connection:
+            existing = await connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+            )
+            created = existing.first() is None
+            for statement in _SCHEMA:
+                await connection.exec_driver_sql(statement)
+            if created:
+                await connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+                logger.info("Built full-text index over existing mentee applications")
+    except Exception as error:
+        logger.warning("Full-text search over applications is unavailable: %s", error)
+        search_available = False
+        _index_checked = True
+        return False
+    # Only now, so concurrent first searches wait on the lock for the build to finish
+    search_available = True
+    _index_checked = True
+    return True
+
+
+async def search_index_ready() -> bool:
+    """
+    Whether full-text search works, creating the index on the first call. The eager
+    lifespan does this at start-up; serverless instances skip start-up work.
+    """
+    if not _index_checked:
+        async with _index_lock:
+            if not _index_checked:
+                from app.database import async_engine
+
+                await ensure_search_index(async_engine)
+    return search_available
+
+
+def parse_terms(query: str) -> List[str]:
+    """Words of a free-text query; punctuation and FTS5 operators are dropped."""
+    return _TERM_RE.findall(query)
+
+
+def match_expression(terms: List[str], prefix: bool = True) -> str:
+    """
+    Safe FTS5 expression over the searched columns in which every term must match.
+    With `prefix`, the last term also matches as a prefix so results update while
+    the admin is still typing it.
+    """
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return f"{{{' '.join(SEARCH_COLUMNS)}}} : ({' '.join(quoted)})"
+
+
+def highlight(snippet: Optional[str]) -> str:
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_HIGHLIGHT_OPEN, "<mark>").replace(_HIGHLIGHT_CLOSE, "</mark>")
+
+
+def encode_cursor(score: float, row_id: int) -> str:
+    raw = json.dumps([score, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Raises ValueError for anything that isn't a cursor we issued."""
+    try:
+        score, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(score), int(row_id)
+    except Exception as error:
+        raise ValueError("Invalid cursor") from error
+
+
+async def _snippets(db: AsyncSession, match: str, ids: List[int]) -> Dict[int, str]:
+    placeholders = ", ".join(f":id{index}" for index in range(len(ids)))
+    rows = await db.execute(
+        text(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, :open, :close, '…', {SNIPPET_TOKENS}) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match AND rowid IN ({placeholders})"
+        ),
+        {
+            "match": match,
+            "open": _HIGHLIGHT_OPEN,
+            "close": _HIGHLIGHT_CLOSE,
+            **{f"id{index}": row_id for index, row_id in enumerate(ids)},
+        },
+    )
+    return dict(rows.all())
+
+
+async def search_applications(
+    db: AsyncSession,
+    terms: List[str],
+    limit: int,
+    status: Optional[str] = None,
+    cursor: Optional[Tuple[float, int]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Applications matching every term (the last as a prefix), best first by bm25
+    (lower is better in SQLite) with ties broken by id, paginated on (score, id).
+    Returns ([{id, score, snippet}], next_cursor).
+    """
+    # The trailing 0 gives the status column no say in relevance
+    weights = ", ".join(str(weight) for weight in (*COLUMN_WEIGHTS, 0.0))
+    match = match_expression(terms)
+    if status:
+        match = f'({match}) AND status : "{status}"'
+    params: Dict[str, Any] = {"match": match, "limit": limit + 1}
+
+    keyset = ""
+    if cursor is not None:
+        keyset = "WHERE score > :after_score OR (score = :after_score AND id > :after_id)"
+        params["after_score"], params["after_id"] = cursor
+
+    ranked = (
+        await db.execute(
+            text(
+                f"SELECT id, score FROM ("
+                f"SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS score "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+                f") {keyset} ORDER BY score, id LIMIT :limit"
+            ),
+            params,
+        )
+    ).all()
+    page = ranked[:limit]
+    if not page:
+        return [], None
+    next_cursor = encode_cursor(page[-1].score, page[-1].id) if len(ranked) > limit else None
+
+    # Snippets are built only for this page. Exact terms first: stemming already covers
+    # inflections and it avoids re-merging the prefix doclist, which dominates query
+    # time for common prefixes. Rows left without a highlight matched only on a
+    # partially typed word and get a prefix snippet instead.
+    ids = [row.id for row in page]
+    snippets = await _snippets(db, match_expression(terms, prefix=False), ids)
+    partial = [row_id for row_id in ids if _HIGHLIGHT_OPEN not in (snippets.get(row_id) or "")]
+    if partial:
+        snippets.update(await _snippets(db, match_expression(terms), partial))
+
+    hits = [{"id": row.id, "score": row.score, "snippet": highlight(snippets.get(row.id))} for row in page]
+    return hits, next_cursor
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat_session import ChatSessionMessage
+
+# Rough per-message overhead of the Messages API framing, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_SNIPPET_CHARS = 120
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def trim_history(
+    turns: List[Dict[str, str]],
+    token_budget: int,
+    summary_token_budget: int,
+) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """
+    Keep the newest turns that fit in `token_budget` and condense the rest.
+
+    Returns the kept messages (oldest first, starting with a user turn as the
+    Messages API requires) and an optional summary of the dropped turns built from
+    the opening of each earlier user question, capped at `summary_token_budget`.
+    """
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > token_budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+
+    # History must start with a user message
+    while kept and kept[0]["role"] != "user":
+        kept.pop(0)
+
+    dropped = turns[: len(turns) - len(kept)]
+    if not dropped or summary_token_budget <= 0:
+        return kept, None
+
+    snippets: List[str] = []
+    summary_used = 0
+    # Walk newest-first so the most recent context survives the summary cap
+    for turn in reversed(dropped):
+        if turn["role"] != "user":
+            continue
+        snippet = " ".join(turn["content"].split())
+        if len(snippet) > SUMMARY_SNIPPET_CHARS:
+            snippet = snippet[:SUMMARY_SNIPPET_CHARS].rstrip() + "..."
+        cost = estimate_tokens(snippet) + 1
+        if summary_used + cost > summary_token_budget:
+            break
+        snippets.append(snippet)
+        summary_used += cost
+    if not snippets:
+        return kept, None
+    snippets.reverse()
+    summary = "Earlier in this conversation the user asked about: " + "; ".join(snippets)
+    return kept, summary
+
+
+class ChatSessionStore:
+    """Interface for conversation history storage keyed by session id."""
+
+    async def get_turns(self, session_id: str) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+    async def append_turns(self, session_id: str, turns: List[Dict[str, str]]) -> None:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+
+@dataclass
+class _Session:
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    last_access: float = field(default_factory=time.monotonic)
+
+
+class InMemoryChatSessionStore(ChatSessionStore):
+    """
+    Bounded in-process session store.
+    Sessions idle for longer than `idle_ttl_seconds` are dropped, the least recently
+    used session is evicted beyond `max_sessions`, and each session keeps at most
+    `max_turns` messages.
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl_seconds: int, max_turns: int) -> None:
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_turns = max_turns
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    def _evict_idle(self, now: float) -> None:
+        # Sessions are kept in access order, so idle ones are at the front
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_access < self.idle_ttl_seconds:
+                break
+            del self._sessions[oldest_id]
+
+    async def get_turns(self, session_id: str) -> List[Dict[str, str]]:
+        now = time.monotonic()
+        self._evict_idle(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            return []
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        return list(session.turns)
+
+    async def append_turns(self, session_id: str, turns: List[Dict[str, str]]) -> None:
+        now = time.monotonic()
+        self._evict_idle(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = _Session()
+            self._sessions[session_id] = session
+        session.turns.extend(turns)
+        if len(session.turns) > self.max_turns:
+            del session.turns[: len(session.turns) - self.max_turns]
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteChatSessionStore(ChatSessionStore):
+    """
+    Session store persisted in the application database (SQLite by default), so
+    conversations survive restarts and are shared between workers. Idle sessions are
+    purged every `purge_every` appends.
+    """
+
+    def __init__(self, idle_ttl_seconds: int, max_turns: int, purge_every: int = 500) -> None:
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_turns = max_turns
+        self.purge_every = purge_every
+        self._appends_since_purge = 0
+
+    async def get_turns(self, session_id: str) -> List[Dict[str, str]]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ChatSessionMessage.role, ChatSessionMessage.content)
+                .where(ChatSessionMessage.session_id == session_id)
+                .order_by(ChatSessionMessage.id.desc())
+                .limit(self.max_turns)
+            )
+            rows = result.all()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    async def append_turns(self, session_id: str, turns: List[Dict[str, str]]) -> None:
+        self._appends_since_purge += 1
+        purge = self._appends_since_purge >= self.purge_every
+        if purge:
+            self._appends_since_purge = 0
+
+        async with AsyncSessionLocal() as db:
+            try:
+                db.add_all(
+                    ChatSessionMessage(session_id=session_id, role=turn["role"], content=turn["content"])
+                    for turn in turns
+                )
+                if purge:
+                    await self._purge_idle(db)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+    async def _purge_idle(self, db: AsyncSession) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.idle_ttl_seconds)
+        idle_sessions = (
+            select(ChatSessionMessage.session_id)
+            .group_by(ChatSessionMessage.session_id)
+            .having(func.max(ChatSessionMessage.created_at) < cutoff)
+        )
+        await db.execute(
+            delete(ChatSessionMessage)
+            .where(ChatSessionMessage.session_id.in_(idle_sessions.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        )
+
+    async def delete(self, session_id: str) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(ChatSessionMessage).where(ChatSessionMessage.session_id == session_id))
+            await db.commit()
+
+
+def _create_store() -> ChatSessionStore:
+    if settings.CHAT_SESSION_BACKEND == "sqlite":
+        return SQLiteChatSessionStore(
+            idle_ttl_seconds=settings.CHAT_SESSION_IDLE_TTL,
+            max_turns=settings.CHAT_SESSION_MAX_TURNS,
+        )
+    return InMemoryChatSessionStore(
+        max_sessions=settings.CHAT_SESSION_MAX_SESSIONS,
+        idle_ttl_seconds=settings.CHAT_SESSION_IDLE_TTL,
+        max_turns=settings.CHAT_SESSION_MAX_TURNS,
+    )
+
+
+chat_session_store = _create_store()
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+# Route reasons, also used as the `reason` metric label
+ROUTE_TIER = "tier"
+ROUTE_COMPLEX = "complex"
+ROUTE_DEFAULT = "default"
+ROUTE_DEGRADED = "degraded"
+ROUTE_DOWNGRADE = "downgrade"
+
+
+@dataclass
+class RouteDecision:
+    models: List[str]  # preferred first, then fallbacks for overload
+    reason: str
+
+
+class ModelHealth:
+    """
+    Rolling latency and error samples for one model over the last `window_seconds`
+    (at most `max_samples` of them), kept as a deque of (time, seconds, ok).
+    """
+
+    def __init__(self, window_seconds: float, max_samples: int = 500) -> None:
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=max_samples)
+
+    def record(self, seconds: float, ok: bool) -> None:
+        self._samples.append((time.monotonic(), seconds, ok))
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        horizon = time.monotonic() - self.window_seconds
+        while self._samples and self._samples[0][0] < horizon:
+            self._samples.popleft()
+        return list(self._samples)
+
+    def snapshot(self) -> Dict[str, float]:
+        samples = self._recent()
+        latencies = sorted(seconds for _, seconds, ok in samples if ok)
+        errors = sum(1 for _, _, ok in samples if not ok)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return {
+            "samples": len(samples),
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "p95_seconds": p95,
+        }
+
+
+class ModelRouter:
+    """
+    Picks the model for a chat request.
+
+    `tiers` are (model, max_prompt_chars) pairs checked in order: the first tier whose
+    limit fits the prompt wins, unless the prompt matches `complex_pattern`, in which
+    case (as for prompts too long for every tier) `default_model` is used. A model
+    whose rolling p95 latency or error rate is over its limit is moved behind the
+    healthy candidates; the remaining candidates (`fallback_models`, then the default)
+    are what AIService falls back to when a model is overloaded.
+    """
+
+    def __init__(
+        self,
+        default_model: str,
+        tiers: List[Tuple[str, int]],
+        fallback_models: List[str],
+        complex_pattern: Optional[str],
+        max_p95_seconds: float,
+        max_error_rate: float,
+        min_samples: int,
+        window_seconds: float,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.default_model = default_model
+        self.tiers = tiers
+        self.fallback_models = fallback_models
+        self.complex_re = re.compile(complex_pattern, re.IGNORECASE) if complex_pattern else None
+        self.max_p95_seconds = max_p95_seconds
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.window_seconds = window_seconds
+        self._health: Dict[str, ModelHealth] = {}
+
+    def _health_for(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth(self.window_seconds)
+        return health
+
+    def record(self, model: str, seconds: float, ok: bool) -> None:
+        """Report one upstream call: total time for a plain call, time to first token for a stream."""
+        if self.enabled:
+            self._health_for(model).record(seconds, ok)
+
+    def is_degraded(self, model: str) -> bool:
+        health = self._health.get(model)
+        if health is None:
+            return False
+        snapshot = health.snapshot()
+        if snapshot["samples"] < self.min_samples:
+            return False
+        return snapshot["error_rate"] > self.max_error_rate or snapshot["p95_seconds"] > self.max_p95_seconds
+
+    def _preferred(self, prompt: str) -> Tuple[str, str]:
+        if self.complex_re is not None and self.complex_re.search(prompt):
+            return self.default_model, ROUTE_COMPLEX
+        for model, max_chars in self.tiers:
+            if len(prompt) <= max_chars:
+                return model, ROUTE_TIER
+        return self.default_model, ROUTE_DEFAULT
+
+    def route(self, prompt: str, downgrade: bool = False) -> RouteDecision:
+        if downgrade:
+            decision = RouteDecision([settings.TOKEN_QUOTA_DOWNGRADE_MODEL], ROUTE_DOWNGRADE)
+        elif not self.enabled:
+            decision = RouteDecision([self.default_model], ROUTE_DEFAULT)
+        else:
+            preferred, reason = self._preferred(prompt)
+            candidates: List[str] = []
+            for model in (preferred, *self.fallback_models, self.default_model):
+                if model not in candidates:
+                    candidates.append(model)
+            healthy = [model for model in candidates if not self.is_degraded(model)]
+            if healthy and healthy[0] != preferred:
+                reason = ROUTE_DEGRADED
+            # Degraded models stay at the back so they still serve if everything is degraded
+            models = healthy + [model for model in candidates if model not in healthy]
+            decision = RouteDecision(models, reason)
+        metrics.MODEL_ROUTES.labels(decision.models[0], decision.reason).inc()
+        return decision
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            model: {**health.snapshot(), "degraded": self.is_degraded(model)}
+            for model, health in self._health.items()
+        }
+
+
+def _parse_tiers(value: str) -> List[Tuple[str, int]]:
+    tiers = []
+    for entry in value.split(","):
+        model, _, max_chars = entry.strip().rpartition(":")
+        if model and max_chars.isdigit():
+            tiers.append((model, int(max_chars)))
+    return tiers
+
+
+model_router = ModelRouter(
+    default_model=settings.AI_MODEL,
+    tiers=_parse_tiers(settings.MODEL_ROUTER_TIERS),
+    fallback_models=[model.strip() for model in settings.MODEL_ROUTER_FALLBACK_MODELS.split(",") if model.strip()],
+    complex_pattern=settings.MODEL_ROUTER_COMPLEX_PATTERN,
+    max_p95_seconds=settings.MODEL_ROUTER_MAX_P95_SECONDS,
+    max_error_rate=settings.MODEL_ROUTER_MAX_ERROR_RATE,
+    min_samples=settings.MODEL_ROUTER_MIN_SAMPLES,
+    window_seconds=settings.MODEL_ROUTER_WINDOW_SECONDS,
+    enabled=settings.ENABLE_MODEL_ROUTER,
+)
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_HASH_SEED = 1337  # fixed so signatures are reproducible across restarts
+
+_TOKEN_RE = re.compile(r"[\w']+", re.UNICODE)
+
+# Words that change the wording of a question but rarely its meaning
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "please", "pls", "plz", "kindly", "hi", "hello", "hey",
+    "um", "uh", "erm", "so", "well", "just", "really", "actually", "basically",
+    "thanks", "thank", "thx", "can", "could", "would", "you", "me", "tell",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip punctuation and drop filler words."""
+    tokens = _TOKEN_RE.findall(text.casefold())
+    kept = [token for token in tokens if token not in FILLER_WORDS]
+    # A prompt made only of filler words still needs something to compare
+    return kept or tokens
+
+
+def shingle(text: str, size: int) -> FrozenSet[int]:
+    """Hash the character `size`-grams of the normalized prompt into 32-bit ints."""
+    normalized = " ".join(tokenize(text))
+    if len(normalized) <= size:
+        grams = {normalized}
+    else:
+        grams = {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+    return frozenset(
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "big")
+        for gram in grams
+    )
+
+
+def jaccard(left: FrozenSet[int], right: FrozenSet[int]) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+@dataclass
+class _Entry:
+    prompt: str
+    response: str
+    params_tag: str
+    shingles: FrozenSet[int]
+    band_keys: Tuple[Tuple[int, ...], ...]
+    created_at: float  # wall clock so snapshots survive restarts
+
+
+class NearDuplicateCache:
+    """
+    MinHash LSH index over recent single-turn prompts and their answers.
+
+    Each prompt is reduced to character shingles and a MinHash signature split into
+    `bands` bands of `rows` rows; prompts sharing any band are candidates and are
+    confirmed with the exact Jaccard similarity of their shingle sets. Entries are
+    bounded with LRU eviction and can be snapshotted to disk as JSON.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries: int,
+        ttl_seconds: int,
+        shingle_size: int = 4,
+        bands: int = 16,
+        rows: int = 4,
+        snapshot_path: Optional[str] = None,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = rows
+        self.snapshot_path = snapshot_path
+
+        rng = random.Random(_HASH_SEED)
+        num_perm = bands * rows
+        self._perm_a = [rng.randrange(1, _MERSENNE_PRIME) for _ in range(num_perm)]
+        self._perm_b = [rng.randrange(0, _MERSENNE_PRIME) for _ in range(num_perm)]
+
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: List[Dict[Tuple[int, ...], Set[int]]] = [dict() for _ in range(bands)]
+        self._next_id = 0
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self, shingles: FrozenSet[int]) -> List[int]:
+        if not shingles:
+            return [_MAX_HASH] * len(self._perm_a)
+        return [
+            min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in shingles)
+            for a, b in zip(self._perm_a, self._perm_b)
+        ]
+
+    def _band_keys(self, signature: List[int]) -> Tuple[Tuple[int, ...], ...]:
+        return tuple(
+            tuple(signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        )
+
+    def lookup(self, prompt: str, params_tag: str) -> Optional[str]:
+        """Return a stored answer for a prompt similar enough to `prompt`, if any."""
+        if not self.enabled:
+            return None
+        shingles = shingle(prompt, self.shingle_size)
+        band_keys = self._band_keys(self._signature(shingles))
+
+        candidates: Set[int] = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        now = time.time()
+        best_id: Optional[int] = None
+        best_score = 0.0
+        for entry_id in candidates:
+            entry = self._entries.get(entry_id)
+            if entry is None or entry.params_tag != params_tag:
+                continue
+            if entry.created_at + self.ttl_seconds <= now:
+                self._remove(entry_id)
+                continue
+            score = jaccard(shingles, entry.shingles)
+            if score >= self.threshold and score > best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        return self._entries[best_id].response
+
+    def add(self, prompt: str, response: str, params_tag: str, created_at: Optional[float] = None) -> None:
+        if not self.enabled or not response:
+            return
+        shingles = shingle(prompt, self.shingle_size)
+        entry = _Entry(
+            prompt=prompt,
+            response=response,
+            params_tag=params_tag,
+            shingles=shingles,
+            band_keys=self._band_keys(self._signature(shingles)),
+            created_at=created_at if created_at is not None else time.time(),
+        )
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        for band, key in enumerate(entry.band_keys):
+            self._buckets[band].setdefault(key, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        self._dirty = True
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for band, key in enumerate(entry.band_keys):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band][key]
+        self._dirty = True
+
+    def snapshot_payload(self) -> Optional[Dict[str, object]]:
+        """
+        Copy the index into a JSON-ready payload, or None when nothing changed since the
+        last snapshot. Must run on the event loop, the only thread that mutates the index.
+        """
+        if not self._dirty:
+            return None
+        payload = {
+            "version": SNAPSHOT_VERSION,
+            "shingle_size": self.shingle_size,
+            "entries": [
+                {
+                    "prompt": entry.prompt,
+                    "response": entry.response,
+                    "params_tag": entry.params_tag,
+                    "created_at": entry.created_at,
+                }
+                for entry in self._entries.values()
+            ],
+        }
+        # Clear now so entries added while the payload is written mark the index dirty again
+        self._dirty = False
+        return payload
+
+    @staticmethod
+    def write_snapshot(payload: Dict[str, object], path: str) -> None:
+        """Serialize and atomically replace the snapshot file. Touches no cache state, so it is thread-safe."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".near_dup_", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def save_snapshot(self, path: Optional[str] = None) -> bool:
+        """Write the index to disk in the calling thread. Returns False when there was nothing to do."""
+        path = path or self.snapshot_path
+        payload = self.snapshot_payload() if path else None
+        if payload is None:
+            return False
+        try:
+            self.write_snapshot(payload, path)
+        except Exception:
+            self._dirty = True
+            raise
+        return True
+
+    async def save_snapshot_async(self, path: Optional[str] = None) -> bool:
+        """Like save_snapshot, but only the serialize-and-write step leaves the event loop."""
+        path = path or self.snapshot_path
+        payload = self.snapshot_payload() if path else None
+        if payload is None:
+            return False
+        try:
+            await asyncio.to_thread(self.write_snapshot, payload, path)
+        except Exception:
+            self._dirty = True
+            raise
+        return True
+
+    def load_snapshot(self, path: Optional[str] = None) -> int:
+        """Rebuild the index from a snapshot, skipping expired entries. Returns entries loaded."""
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (OSError, ValueError) as error:
+            logger.warning("Ignoring unreadable near-duplicate snapshot %s: %s", path, error)
+            return 0
+        if payload.get("version") != SNAPSHOT_VERSION or payload.get("shingle_size") != self.shingle_size:
+            logger.info("Ignoring near-duplicate snapshot %s written with different parameters", path)
+            return 0
+
+        cutoff = time.time() - self.ttl_seconds
+        loaded = 0
+        for item in payload.get("entries", []):
+            if item.get("created_at", 0) <= cutoff:
+                continue
+            self.add(item["prompt"], item["response"], item["params_tag"], created_at=item["created_at"])
+            loaded += 1
+        self._dirty = False
+        return loaded
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+near_duplicate_cache = NearDuplicateCache(
+    threshold=settings.NEAR_DUP_THRESHOLD,
+    max_entries=settings.NEAR_DUP_MAX_ENTRIES,
+    ttl_seconds=settings.NEAR_DUP_TTL,
+    shingle_size=settings.NEAR_DUP_SHINGLE_SIZE,
+    snapshot_path=settings.NEAR_DUP_SNAPSHOT_PATH,
+    enabled=settings.ENABLE_NEAR_DUP_CACHE,
+)
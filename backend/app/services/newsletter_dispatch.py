@@ -0,0 +1,536 @@
+from __future__ import annotations
+
+import asyncio
+import html
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid, parseaddr
+from string import Template
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core import metrics
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.newsletter_issue import NewsletterDelivery, NewsletterIssue
+from app.models.subscriber import Subscriber
+from app.utils.smtp import is_permanent
+
+if TYPE_CHECKING:
+    import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+DRAFT = "draft"
+SENDING = "sending"
+SENT = "sent"
+PARTIAL = "partial"  # finished with failed recipients; resume retries them
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+
+HTML_LAYOUT = Template(
+    """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>$subject</title></head>
+<body style="font-family: Arial, sans-serif; line-height: 1.5; max-width: 640px; margin: 0 auto;">
+$body
+<hr>
+<p style="font-size: 12px; color: #666;">You are receiving this because you subscribed to the $project newsletter.</p>
+</body>
+</html>
+"""
+)
+
+
+class IssueNotFoundError(LookupError):
+    pass
+
+
+class DispatchConflictError(RuntimeError):
+    """The issue is already being sent, or was already sent."""
+
+
+class LeaseLostError(DispatchConflictError):
+    """The run could not renew its lease on the issue, so another run may have taken over."""
+
+
+@dataclass
+class RenderedIssue:
+    """An issue as wire-ready bytes; only the To and Message-ID headers differ per recipient."""
+
+    issue_id: int
+    sender: str
+    message: bytes
+    msgid_domain: str
+
+    def for_recipient(self, email: str) -> bytes:
+        headers = f"To: {email}\r\nMessage-ID: {make_msgid(domain=self.msgid_domain)}\r\n"
+        return headers.encode("utf-8") + self.message
+
+
+@dataclass
+class DispatchStats:
+    issue_id: int
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0  # already sent by an earlier run
+    retries: int = 0
+    connections: int = 0
+    seconds: float = 0.0
+
+    @property
+    def emails_per_second(self) -> float:
+        return self.sent / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "issue_id": self.issue_id,
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "retries": self.retries,
+            "connections": self.connections,
+            "seconds": round(self.seconds, 3),
+            "emails_per_second": round(self.emails_per_second, 1),
+        }
+
+
+def render_issue(issue: NewsletterIssue, sender: str) -> RenderedIssue:
+    """Build the issue's MIME message once: text part, HTML part and shared headers."""
+    body_html = issue.body_html or "\n".join(
+        f"<p>{html.escape(paragraph).replace(chr(10), '<br>')}</p>"
+        for paragraph in issue.body_text.split("\n\n")
+        if paragraph.strip()
+    )
+    message = EmailMessage(policy=SMTP)
+    message["Subject"] = issue.subject
+    message["From"] = sender
+    message["Date"] = formatdate(localtime=False)
+    message.set_content(issue.body_text)
+    message.add_alternative(
+        HTML_LAYOUT.substitute(subject=html.escape(issue.subject), body=body_html, project=settings.PROJECT_NAME),
+        subtype="html",
+    )
+    domain = parseaddr(sender)[1].rpartition("@")[2] or "localhost"
+    return RenderedIssue(issue.id, parseaddr(sender)[1], message.as_bytes(), domain)
+
+
+class _Throttle:
+    """Spaces sends `1 / rate` seconds apart across all workers; rate 0 disables it."""
+
+    def __init__(self, rate_per_second: float) -> None:
+        self.interval = 1 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class _SmtpConnection:
+    """One worker's SMTP session, kept open across messages and reopened every `messages_per_connection`."""
+
+    def __init__(self, dispatcher: NewsletterDispatcher, stats: DispatchStats) -> None:
+        self.dispatcher = dispatcher
+        self.stats = stats
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._messages = 0
+
+    async def send(self, sender: str, email: str, message: bytes) -> None:
+        if self._smtp is not None and (
+            not self._smtp.is_connected or self._messages >= self.dispatcher.messages_per_connection
+        ):
+            await self.close()
+        if self._smtp is None:
+            self._smtp = self.dispatcher.connect()
+            await self._smtp.connect()
+            self.stats.connections += 1
+            self._messages = 0
+        try:
+            await self._smtp.sendmail(sender, [email], message)
+        except Exception:
+            # A refused recipient leaves the session usable; anything else may not
+            if not self._smtp.is_connected:
+                self._smtp = None
+            raise
+        finally:
+            self._messages += 1
+
+    async def close(self) -> None:
+        if self._smtp is not None:
+            smtp, self._smtp = self._smtp, None
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+
+class NewsletterDispatcher:
+    """
+    Sends a newsletter issue to every active subscriber.
+
+    Subscribers are read in `read_chunk` rows at a time by id (keyset pagination), so
+    memory stays flat however long the list is, and handed through a bounded queue to
+    `concurrency` workers, each holding its own persistent SMTP connection. A shared
+    throttle keeps the whole run under `rate_per_second`. The message is rendered once
+    per issue; per recipient only the To and Message-ID headers are prepended.
+
+    Every outcome is upserted into newsletter_deliveries in batches of `record_batch`.
+    Recipients already marked sent are skipped when their chunk is read, so running
+    the issue again after a crash or restart picks up where it stopped; only sends not
+    yet recorded when the process died (under `record_batch`, plus those in flight)
+    can go out twice. Temporary failures (4xx, dropped connections) are retried up to
+    `max_attempts` times within the run. A run that ends with failed recipients leaves
+    the issue `partial` rather than `sent`; dispatching it again with `resume` tries
+    just those recipients (and anyone who subscribed since) once more.
+
+    Only one run sends an issue at a time, across processes and hosts: claiming it
+    takes a lease on the issue row, which the run renews every third of
+    `lease_seconds`. A `sending` issue can be resumed only once that lease has lapsed
+    (its process died) or been released (the run was cancelled); a run that fails to
+    renew stops sending.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str],
+        password: Optional[str],
+        use_tls: bool,
+        start_tls: Optional[bool],
+        timeout: float,
+        sender: str,
+        concurrency: int,
+        rate_per_second: float,
+        read_chunk: int,
+        record_batch: int,
+        max_attempts: int,
+        messages_per_connection: int,
+        lease_seconds: float = 60.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.timeout = timeout
+        self.sender = sender
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.read_chunk = read_chunk
+        self.record_batch = record_batch
+        self.max_attempts = max_attempts
+        self.messages_per_connection = messages_per_connection
+        self.lease = timedelta(seconds=lease_seconds)
+        self._running: Dict[int, asyncio.Task] = {}
+        self.last_stats: Dict[int, DispatchStats] = {}
+
+    def connect(self) -> aiosmtplib.SMTP:
+        import aiosmtplib
+
+        return aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+
+    def is_running(self, issue_id: int) -> bool:
+        task = self._running.get(issue_id)
+        return task is not None and not task.done()
+
+    async def claim(self, issue_id: int, resume: bool = False) -> NewsletterIssue:
+        """
+        Mark the issue as sending. Only a draft can start; an interrupted (`sending`) or
+        `partial` one only with `resume`.
+        """
+        now = datetime.now(timezone.utc)
+        claimable = NewsletterIssue.status == DRAFT
+        if resume:
+            # A `sending` issue is only up for grabs once its run stopped renewing the lease
+            lapsed = or_(NewsletterIssue.lease_expires_at.is_(None), NewsletterIssue.lease_expires_at <= now)
+            claimable = or_(
+                claimable,
+                NewsletterIssue.status == PARTIAL,
+                and_(NewsletterIssue.status == SENDING, lapsed),
+            )
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(NewsletterIssue)
+                .where(NewsletterIssue.id == issue_id, claimable)
+                .values(status=SENDING, started_at=now, lease_owner=owner, lease_expires_at=now + self.lease)
+            )
+            await db.commit()
+            issue = await db.get(NewsletterIssue, issue_id)
+        if issue is None:
+            raise IssueNotFoundError(f"Newsletter issue {issue_id} not found")
+        if result.rowcount == 0:
+            if resume and issue.status == SENDING:
+                raise DispatchConflictError(f"Newsletter issue {issue_id} is being sent by another run")
+            raise DispatchConflictError(
+                f"Newsletter issue {issue_id} is {issue.status}"
+                + ("; pass resume to continue or retry failed recipients" if issue.status in (SENDING, PARTIAL) else "")
+            )
+        return issue
+
+    async def _hold_lease(self, issue_id: int, owner: str) -> None:
+        """Renew the run's lease until cancelled; raises LeaseLostError once it lapsed or was taken."""
+        expires = time.monotonic() + self.lease.total_seconds()
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            now = datetime.now(timezone.utc)
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        update(NewsletterIssue)
+                        .where(
+                            NewsletterIssue.id == issue_id,
+                            NewsletterIssue.lease_owner == owner,
+                            NewsletterIssue.lease_expires_at > now,
+                        )
+                        .values(lease_expires_at=now + self.lease)
+                    )
+                    await db.commit()
+            except Exception as error:
+                # Keep sending while the lease we hold is still valid; try again next beat
+                if time.monotonic() < expires:
+                    logger.warning("Could not renew the lease on newsletter issue %d: %s", issue_id, error)
+                    continue
+                raise LeaseLostError(f"Newsletter issue {issue_id}: lease lapsed while the database was unreachable") from error
+            if not result.rowcount:
+                raise LeaseLostError(f"Newsletter issue {issue_id}: this run's lease lapsed or was taken over")
+            expires = time.monotonic() + self.lease.total_seconds()
+
+    async def _release_lease(self, issue_id: int, owner: str, **values: Any) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(NewsletterIssue)
+                .where(NewsletterIssue.id == issue_id, NewsletterIssue.lease_owner == owner)
+                .values(lease_owner=None, lease_expires_at=None, **values)
+            )
+            await db.commit()
+
+    def start(self, issue: NewsletterIssue) -> asyncio.Task:
+        """Send a claimed issue in the background; one run per issue per process."""
+        if self.is_running(issue.id):
+            raise DispatchConflictError(f"Newsletter issue {issue.id} is already being sent")
+        task = asyncio.create_task(self.send(issue))
+        self._running[issue.id] = task
+        task.add_done_callback(lambda _: self._running.pop(issue.id, None))
+        return task
+
+    async def dispatch(self, issue_id: int, resume: bool = False) -> DispatchStats:
+        """Claim the issue and send it; returns once every recipient has been tried."""
+        return await self.send(await self.claim(issue_id, resume))
+
+    async def send(self, issue: NewsletterIssue) -> DispatchStats:
+        """Send a claimed issue; `issue.lease_owner` identifies the claim."""
+        issue_id = issue.id
+        owner = issue.lease_owner
+        rendered = render_issue(issue, self.sender)
+        stats = self.last_stats[issue_id] = DispatchStats(issue_id)
+        throttle = _Throttle(self.rate_per_second)
+        recipients: asyncio.Queue = asyncio.Queue(maxsize=max(self.concurrency * 4, self.read_chunk))
+        outcomes: List[Dict[str, Any]] = []
+        started = time.perf_counter()
+
+        async def produce() -> None:
+            async for subscriber_id, email in self._pending_recipients(issue_id, stats):
+                await recipients.put((subscriber_id, email))
+            for _ in range(self.concurrency):
+                await recipients.put(None)
+
+        async def work() -> None:
+            connection = _SmtpConnection(self, stats)
+            try:
+                while True:
+                    item = await recipients.get()
+                    if item is None:
+                        return
+                    outcomes.append(await self._deliver(connection, rendered, item, throttle, stats))
+                    if len(outcomes) >= self.record_batch:
+                        batch = outcomes[:]
+                        outcomes.clear()
+                        await self._record(issue_id, batch)
+            finally:
+                await connection.close()
+
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        lease = asyncio.create_task(self._hold_lease(issue_id, owner))
+        sending = asyncio.gather(*tasks)
+        finished = False
+        try:
+            await asyncio.wait([sending, lease], return_when=asyncio.FIRST_COMPLETED)
+            if lease.done():
+                lease.result()  # raises LeaseLostError
+            await sending
+            finished = True
+        except BaseException:
+            # One failed (a database error, say), the lease was lost, or we were
+            # cancelled: stop the rest too. Before Python 3.12 a wait_for inside aiosmtplib
+            # can swallow the cancellation if the reply lands in the same step, leaving a
+            # worker blocked on the queue, so cancel again until every task has stopped.
+            pending = set(tasks)
+            while pending:
+                for task in pending:
+                    task.cancel()
+                _, pending = await asyncio.wait(pending, timeout=1)
+            await asyncio.gather(sending, return_exceptions=True)
+            raise
+        finally:
+            lease.cancel()
+            await asyncio.gather(lease, return_exceptions=True)
+            # Also on cancellation or error, so the next run skips what did go out
+            if outcomes:
+                await asyncio.shield(self._record(issue_id, outcomes))
+            stats.seconds = time.perf_counter() - started
+            # Give the lease back so a resume need not wait for it to lapse. Guarded by
+            # the owner, so a lease another run has taken since is left alone.
+            values = (
+                {"status": PARTIAL if stats.failed else SENT, "finished_at": datetime.now(timezone.utc)}
+                if finished
+                else {}
+            )
+            await asyncio.shield(self._release_lease(issue_id, owner, **values))
+
+        logger.info("Newsletter issue %d dispatched: %s", issue_id, stats.as_dict())
+        return stats
+
+    async def _pending_recipients(self, issue_id: int, stats: DispatchStats):
+        """Active subscribers in id order, `read_chunk` at a time, minus those already sent this issue."""
+        after_id = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                rows = (
+                    await db.execute(
+                        select(Subscriber.id, Subscriber.email)
+                        .where(Subscriber.is_active.is_(True), Subscriber.id > after_id)
+                        .order_by(Subscriber.id)
+                        .limit(self.read_chunk)
+                    )
+                ).all()
+                if not rows:
+                    return
+                sent = set(
+                    (
+                        await db.scalars(
+                            select(NewsletterDelivery.subscriber_id).where(
+                                NewsletterDelivery.issue_id == issue_id,
+                                NewsletterDelivery.status == DELIVERY_SENT,
+                                NewsletterDelivery.subscriber_id.in_([row.id for row in rows]),
+                            )
+                        )
+                    ).all()
+                )
+            for subscriber_id, email in rows:
+                if subscriber_id in sent:
+                    stats.skipped += 1
+                else:
+                    yield subscriber_id, email
+            if len(rows) < self.read_chunk:
+                return
+            after_id = rows[-1].id
+
+    async def _deliver(
+        self,
+        connection: _SmtpConnection,
+        rendered: RenderedIssue,
+        recipient: Tuple[int, str],
+        throttle: _Throttle,
+        stats: DispatchStats,
+    ) -> Dict[str, Any]:
+        subscriber_id, email = recipient
+        error: Optional[Exception] = None
+        attempt = 0
+        while attempt < self.max_attempts:
+            attempt += 1
+            await throttle.wait()
+            try:
+                await connection.send(rendered.sender, email, rendered.for_recipient(email))
+                error = None
+                break
+            except Exception as failure:
+                error = failure
+                if is_permanent(failure):
+                    break
+                if attempt < self.max_attempts:
+                    stats.retries += 1
+                    await asyncio.sleep(min(2 ** (attempt - 1), 30))
+        status = DELIVERY_FAILED if error is not None else DELIVERY_SENT
+        if error is None:
+            stats.sent += 1
+        else:
+            stats.failed += 1
+            logger.warning("Newsletter to subscriber %d failed after %d attempt(s): %s", subscriber_id, attempt, error)
+        metrics.NEWSLETTER_DELIVERIES.labels(status).inc()
+        return {
+            "issue_id": rendered.issue_id,
+            "subscriber_id": subscriber_id,
+            "email": email,
+            "status": status,
+            "attempts": attempt,
+            "error": str(error)[:500] if error is not None else None,
+        }
+
+    async def _record(self, issue_id: int, outcomes: List[Dict[str, Any]]) -> None:
+        async with AsyncSessionLocal() as db:
+            dialect = db.get_bind().dialect.name
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            statement = insert(NewsletterDelivery).values(outcomes)
+            statement = statement.on_conflict_do_update(
+                index_elements=["issue_id", "subscriber_id"],
+                set_={
+                    "status": statement.excluded.status,
+                    "attempts": NewsletterDelivery.attempts + statement.excluded.attempts,
+                    "error": statement.excluded.error,
+                },
+            )
+            await db.execute(statement)
+            await db.commit()
+
+    async def close(self) -> None:
+        """Stop running dispatches; their issues stay `sending` and resume on the next run."""
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+newsletter_dispatcher = NewsletterDispatcher(
+    host=settings.SMTP_HOST,
+    port=settings.SMTP_PORT,
+    username=settings.SMTP_USERNAME,
+    password=settings.SMTP_PASSWORD,
+    use_tls=settings.SMTP_USE_TLS,
+    start_tls=settings.SMTP_START_TLS,
+    timeout=settings.SMTP_TIMEOUT_SECONDS,
+    sender=settings.NEWSLETTER_FROM,
+    concurrency=settings.NEWSLETTER_CONCURRENCY,
+    rate_per_second=settings.NEWSLETTER_RATE_PER_SECOND,
+    read_chunk=settings.NEWSLETTER_READ_CHUNK_ROWS,
+    record_batch=settings.NEWSLETTER_RECORD_BATCH_ROWS,
+    max_attempts=settings.NEWSLETTER_MAX_ATTEMPTS,
+    messages_per_connection=settings.NEWSLETTER_MESSAGES_PER_CONNECTION,
+    lease_seconds=settings.NEWSLETTER_LEASE_SECONDS,
+)
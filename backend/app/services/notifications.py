@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+from email.message import EmailMessage
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid, parseaddr
+from typing import Any, Dict
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.mentee_application import MenteeApplication
+from app.models.subscriber import Subscriber
+from app.services.task_queue import PermanentTaskError, task_queue
+from app.utils.smtp import is_permanent
+
+logger = logging.getLogger(__name__)
+
+# Emails sent after the request was answered: staged by the endpoint in the same
+# transaction as the change that calls for them, then run by the task queue
+APPLICATION_STATUS_CHANGED = "mentoring.application_status_changed"
+SUBSCRIPTION_CONFIRMATION = "newsletter.subscription_confirmation"
+
+
+def email_enabled() -> bool:
+    """Emails are only queued when SMTP is configured; otherwise they would just retry and die."""
+    return bool(settings.SMTP_HOST)
+
+
+_STATUS_MESSAGES = {
+    "pending": "Your application is back under review. We will be in touch once a decision is made.",
+    "accepted": "Congratulations, your application has been accepted! We will follow up shortly about next steps.",
+    "rejected": (
+        "Thank you for your interest. We are unable to offer you a place in this round, "
+        "but we encourage you to apply again in the future."
+    ),
+}
+
+
+async def send_email(to: str, subject: str, body: str) -> None:
+    """Send one plain-text email. SMTP 5xx replies are permanent failures and are not retried."""
+    import aiosmtplib
+
+    message = EmailMessage(policy=SMTP)
+    message["Subject"] = subject
+    message["From"] = settings.NEWSLETTER_FROM
+    message["To"] = to
+    message["Date"] = formatdate(localtime=False)
+    message["Message-ID"] = make_msgid(domain=parseaddr(settings.NEWSLETTER_FROM)[1].rpartition("@")[2] or "localhost")
+    message.set_content(body)
+    try:
+        await aiosmtplib.send(
+            message,
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USERNAME,
+            password=settings.SMTP_PASSWORD,
+            use_tls=settings.SMTP_USE_TLS,
+            start_tls=settings.SMTP_START_TLS,
+            timeout=settings.SMTP_TIMEOUT_SECONDS,
+        )
+    except Exception as error:
+        if is_permanent(error):
+            raise PermanentTaskError(str(error)) from error
+        raise
+
+
+@task_queue.task(APPLICATION_STATUS_CHANGED)
+async def notify_application_status(payload: Dict[str, Any]) -> None:
+    async with AsyncSessionLocal() as db:
+        application = await db.get(MenteeApplication, payload["application_id"])
+    if application is None:
+        logger.info("Mentee application %s no longer exists; nothing to notify", payload["application_id"])
+        return
+    if application.status != payload["status"]:
+        # Changed again since; that change queued its own notification
+        return
+
+    greeting = f"Hi {application.full_name}," if application.full_name else "Hi,"
+    await send_email(
+        application.user_email,
+        f"Your {settings.PROJECT_NAME} mentoring application",
+        f"{greeting}\n\n{_STATUS_MESSAGES[application.status]}\n\nThe {settings.PROJECT_NAME} team\n",
+    )
+
+
+@task_queue.task(SUBSCRIPTION_CONFIRMATION)
+async def confirm_subscription(payload: Dict[str, Any]) -> None:
+    async with AsyncSessionLocal() as db:
+        active = await db.scalar(select(Subscriber.is_active).where(Subscriber.email == payload["email"]))
+    if not active:
+        # Unsubscribed before the confirmation went out
+        return
+
+    await send_email(
+        payload["email"],
+        f"You're subscribed to the {settings.PROJECT_NAME} newsletter",
+        f"Thanks for subscribing! You will receive the {settings.PROJECT_NAME} newsletter at this address.\n",
+    )
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.chat_sessions import MESSAGE_OVERHEAD_TOKENS, estimate_tokens
+
+# Anthropic caches the prompt prefix up to each block carrying this marker
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+class UnknownPromptError(LookupError):
+    """The requested template name or version is not registered."""
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    version: int
+    system: str  # persona and rules
+    context: Optional[str] = None  # stable reference material sent after the system text
+    description: str = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+@dataclass
+class CompiledPrompt:
+    """A template turned into Messages API system blocks, with its size counted once."""
+
+    template: PromptTemplate
+    system_blocks: List[Dict[str, Any]]
+    token_count: int
+    cached: bool  # whether the system blocks end in a cache breakpoint
+
+    @property
+    def key(self) -> str:
+        return self.template.key
+
+
+@dataclass
+class _UsageTotals:
+    calls: int = 0
+    input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class PromptRegistry:
+    """
+    Named, versioned system prompts for the chat endpoints.
+
+    Callers pick a template by name ("finance") or name and version ("finance@1"); a
+    bare name gets the version pinned in `pinned_versions`, else the newest. Templates
+    are compiled once (at start-up, or on first use in serverless mode) into system
+    blocks with their token counts, and the stable blocks end in a cache_control
+    breakpoint when they are long enough for Anthropic to cache (`cache_min_tokens`).
+    `apply_history_breakpoint` does the same for prior conversation turns, so each
+    follow-up re-reads the conversation so far from the prompt cache.
+    """
+
+    default_name: str
+    cache_min_tokens: int
+    pinned_versions: Dict[str, int] = field(default_factory=dict)
+    _templates: Dict[str, Dict[int, PromptTemplate]] = field(default_factory=dict)
+    _compiled: Dict[str, CompiledPrompt] = field(default_factory=dict)
+    _usage: Dict[str, _UsageTotals] = field(default_factory=dict)
+
+    def register(self, template: PromptTemplate) -> None:
+        self._templates.setdefault(template.name, {})[template.version] = template
+        self._compiled.pop(template.key, None)
+
+    def names(self) -> List[str]:
+        return sorted(self._templates)
+
+    def _compile(self, template: PromptTemplate) -> CompiledPrompt:
+        blocks = [{"type": "text", "text": template.system}]
+        if template.context:
+            blocks.append({"type": "text", "text": template.context})
+        token_count = sum(estimate_tokens(block["text"]) for block in blocks)
+        cached = token_count >= self.cache_min_tokens
+        if cached:
+            blocks[-1] = {**blocks[-1], "cache_control": CACHE_CONTROL}
+        return CompiledPrompt(template, blocks, token_count, cached)
+
+    def compile(self) -> int:
+        """Compile every registered version. Returns how many were compiled."""
+        for versions in self._templates.values():
+            for template in versions.values():
+                self._compiled[template.key] = self._compile(template)
+        return len(self._compiled)
+
+    def _select(self, selector: Optional[str]) -> PromptTemplate:
+        name, _, version = (selector or self.default_name).partition("@")
+        versions = self._templates.get(name)
+        if not versions:
+            raise UnknownPromptError(f"Unknown assistant '{name}'. Available: {', '.join(self.names())}")
+        if version:
+            if not version.isdigit() or int(version) not in versions:
+                raise UnknownPromptError(f"Unknown version '{version}' of assistant '{name}'")
+            return versions[int(version)]
+        pinned = self.pinned_versions.get(name)
+        return versions[pinned] if pinned in versions else versions[max(versions)]
+
+    def get(self, selector: Optional[str] = None) -> CompiledPrompt:
+        template = self._select(selector)
+        compiled = self._compiled.get(template.key)
+        if compiled is None:
+            compiled = self._compiled[template.key] = self._compile(template)
+        return compiled
+
+    def apply_history_breakpoint(
+        self, prompt: CompiledPrompt, history: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Return `history` with a cache breakpoint on its last turn when the prefix it
+        closes (system blocks plus history) is long enough to be cached. Turns are
+        copied, never modified, since they may belong to a session store.
+        """
+        if not history:
+            return history
+        prefix_tokens = prompt.token_count + sum(
+            estimate_tokens(str(turn["content"])) + MESSAGE_OVERHEAD_TOKENS for turn in history
+        )
+        if prefix_tokens < self.cache_min_tokens:
+            return history
+        last = history[-1]
+        content = last["content"]
+        blocks = content if isinstance(content, list) else [{"type": "text", "text": content}]
+        marked = [*blocks[:-1], {**blocks[-1], "cache_control": CACHE_CONTROL}]
+        return [*history[:-1], {**last, "content": marked}]
+
+    def record_usage(self, key: str, usage: Any) -> None:
+        """Add one call's usage (an SDK Usage object or a dict) to `key`'s totals."""
+        if usage is None:
+            return
+
+        def read(name: str) -> int:
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            return value or 0
+
+        totals = self._usage.setdefault(key, _UsageTotals())
+        totals.calls += 1
+        counts: Tuple[Tuple[str, str, int], ...] = (
+            ("input_tokens", "uncached", read("input_tokens")),
+            ("cache_read_input_tokens", "cache_read", read("cache_read_input_tokens")),
+            ("cache_creation_input_tokens", "cache_write", read("cache_creation_input_tokens")),
+        )
+        for attribute, kind, tokens in counts:
+            setattr(totals, attribute, getattr(totals, attribute) + tokens)
+            if tokens:
+                metrics.PROMPT_INPUT_TOKENS.labels(key, kind).inc(tokens)
+        totals.output_tokens += read("output_tokens")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        stats: Dict[str, Dict[str, Any]] = {}
+        for key, compiled in self._compiled.items():
+            stats[key] = {"prompt_tokens": compiled.token_count, "cached": compiled.cached}
+        for key, totals in self._usage.items():
+            input_total = totals.input_tokens + totals.cache_read_input_tokens + totals.cache_creation_input_tokens
+            stats.setdefault(key, {}).update(
+                calls=totals.calls,
+                input_tokens=totals.input_tokens,
+                cache_read_input_tokens=totals.cache_read_input_tokens,
+                cache_creation_input_tokens=totals.cache_creation_input_tokens,
+                output_tokens=totals.output_tokens,
+                cache_read_ratio=totals.cache_read_input_tokens / input_total if input_total else 0.0,
+            )
+        return stats
+
+
+def _parse_versions(value: str) -> Dict[str, int]:
+    versions = {}
+    for entry in value.split(","):
+        name, _, version = entry.strip().rpartition(":")
+        if name and version.isdigit():
+            versions[name] = int(version)
+    return versions
+
+
+CHAT_V1 = PromptTemplate(
+    name="chat",
+    version=1,
+    description="Personal branding and career development coach",
+    system="""You are a highly knowledgeable AI assistant focused on personal branding and career development.
+Follow these guidelines in all your responses:
+
+1. Be concise and direct in your communication
+2. Always provide actionable advice
+3. Back up suggestions with real-world examples when possible
+4. Focus on practical, implementable steps
+5. Maintain a professional yet encouraging tone
+6. When discussing personal branding, emphasize authenticity and unique value proposition
+7. Structure longer responses with clear headings and bullet points
+8. If asked about technical topics, provide code examples or specific tools when relevant
+
+Remember to:
+- Never provide harmful or unethical advice
+- Admit when you don't have enough information
+- Ask clarifying questions when needed
+- Keep responses focused on personal branding and career development context
+""",
+)
+
+FINANCE_V1 = PromptTemplate(
+    name="finance",
+    version=1,
+    description="Personal finance assistant for the finance tools page",
+    system="""You are a personal finance assistant for early-career technology professionals.
+Help with budgeting, saving, debt repayment, emergency funds, reading a job offer's
+compensation (salary, bonus, equity, benefits) and planning around irregular income.
+
+Guidelines:
+1. Explain the reasoning and show the arithmetic when you work through numbers
+2. Prefer simple, low-cost, widely applicable approaches
+3. State the assumptions you make (income, location, time horizon) and invite corrections
+4. Structure longer answers with headings and bullet points
+""",
+    context="""Boundaries:
+- You give general education, not individual investment, tax or legal advice; suggest a
+  licensed professional for decisions that depend on personal circumstances
+- Never recommend specific securities, cryptocurrencies or products
+- Tax rules differ by country; say which country's rules you are describing, or ask
+""",
+)
+
+MENTORING_V1 = PromptTemplate(
+    name="mentoring",
+    version=1,
+    description="Helper for the mentoring program's applicants and mentees",
+    system="""You help people get the most out of the Human-Technology Catalyst mentoring program.
+Help applicants describe their goals and focus areas clearly, and help mentees prepare
+for sessions: agendas, questions to ask, and how to follow up afterwards.
+
+Guidelines:
+1. Ask about the person's current role and goals before giving detailed advice
+2. Turn vague goals into specific, measurable ones
+3. Keep suggestions realistic for a few hours a month alongside a full-time job
+4. Be warm and encouraging, and concise
+""",
+    context="""How the program works:
+- Applicants submit their goals and focus areas; the team reviews each application and
+  matches accepted mentees with a mentor
+- Mentors and mentees agree their own meeting cadence, typically every two to four weeks
+- Questions about an application's status go to the program team, not to you
+""",
+)
+
+prompt_registry = PromptRegistry(
+    default_name=settings.PROMPT_DEFAULT_TEMPLATE,
+    cache_min_tokens=settings.PROMPT_CACHE_MIN_TOKENS,
+    pinned_versions=_parse_versions(settings.PROMPT_TEMPLATE_VERSIONS),
+)
+for _template in (CHAT_V1, FINANCE_V1, MENTORING_V1):
+    prompt_registry.register(_template)
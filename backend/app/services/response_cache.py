@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key."""
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+
+def make_cache_key(chat_params: Dict[str, Any]) -> str:
+    """
+    Build a stable cache key from the parameters sent to the Anthropic API.
+    Message contents are normalized; model, max_tokens and temperature are kept verbatim.
+    """
+    material = {
+        "model": chat_params.get("model"),
+        "max_tokens": chat_params.get("max_tokens"),
+        "temperature": chat_params.get("temperature"),
+        "system": chat_params.get("system"),
+        "messages": [
+            (message.get("role"), normalize_message(str(message.get("content", ""))))
+            for message in chat_params.get("messages", [])
+        ],
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+@dataclass
+class _CacheEntry:
+    value: str
+    expires_at: float
+    size: int
+
+
+class ResponseCache:
+    """
+    In-process LRU cache for completed chat responses.
+    Entries expire after `ttl_seconds`; the least recently used entries are evicted
+    once either `max_entries` or `max_bytes` (UTF-8 size of cached text) is exceeded.
+    Safe to use from the event loop without locking since no method awaits.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, max_bytes: int, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled or not value:
+            return
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            # A single oversized response would evict everything else
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _CacheEntry(value=value, expires_at=time.monotonic() + self.ttl_seconds, size=size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    ttl_seconds=settings.CACHE_TTL,
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    enabled=settings.ENABLE_CACHE,
+)
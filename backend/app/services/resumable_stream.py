@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ai_service import STREAM_ERROR_PREFIX
+from app.services.upstream_governor import UpstreamSaturatedError
+
+# Event types sent to the client
+EVENT_START = "start"
+EVENT_DELTA = "delta"
+EVENT_ERROR = "error"
+EVENT_DONE = "done"
+
+# Error codes for the typed error event
+ERROR_UPSTREAM = "upstream_error"
+ERROR_OVERLOADED = "overloaded"
+ERROR_RESUME_UNAVAILABLE = "resume_unavailable"
+
+
+@dataclass
+class StreamEvent:
+    seq: int
+    event: str
+    data: Dict[str, object]
+
+
+def encode_event(generation_id: str, event: StreamEvent) -> str:
+    """Serialize one event in text/event-stream format; data is JSON so newlines are safe."""
+    return (
+        f"id: {generation_id}:{event.seq}\n"
+        f"event: {event.event}\n"
+        f"data: {json.dumps(event.data, separators=(',', ':'))}\n\n"
+    )
+
+
+def encode_heartbeat() -> str:
+    return ": ping\n\n"
+
+
+def encode_error(code: str, message: str) -> str:
+    """Error event for conditions outside any generation, so it carries no id."""
+    payload = json.dumps({"code": code, "message": message}, separators=(",", ":"))
+    return f"event: {EVENT_ERROR}\ndata: {payload}\n\n"
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a `<generation_id>:<seq>` Last-Event-ID header, ignoring malformed values."""
+    if not value or ":" not in value:
+        return None
+    generation_id, _, seq = value.rpartition(":")
+    try:
+        return generation_id, int(seq)
+    except ValueError:
+        return None
+
+
+class Generation:
+    """
+    One in-flight chat generation whose recent events are kept in a ring buffer.
+    The upstream is pumped by a background task that is independent of any client
+    connection, so a client that drops can reconnect and resume.
+    """
+
+    def __init__(self, generation_id: str, buffer_size: int) -> None:
+        self.id = generation_id
+        self.events: Deque[StreamEvent] = deque(maxlen=buffer_size)
+        self.last_seq = -1
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self.abandon_handle: Optional[asyncio.TimerHandle] = None
+
+    def _append(self, event: str, data: Dict[str, object]) -> None:
+        self.last_seq += 1
+        self.events.append(StreamEvent(seq=self.last_seq, event=event, data=data))
+
+
+class ResumableStreamRegistry:
+    """Tracks in-flight and recently finished generations for Last-Event-ID resumption."""
+
+    def __init__(
+        self,
+        buffer_size: int,
+        retention_seconds: float,
+        abandon_after_seconds: float,
+        heartbeat_seconds: float,
+    ) -> None:
+        self.buffer_size = buffer_size
+        self.retention_seconds = retention_seconds
+        self.abandon_after_seconds = abandon_after_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._generations: Dict[str, Generation] = {}
+        self.resumed = 0
+
+    def start(self, source: AsyncIterator[str], start_data: Dict[str, object]) -> Generation:
+        """Begin pumping `source` into a new generation."""
+        self._purge_finished()
+        generation = Generation(uuid.uuid4().hex, self.buffer_size)
+        generation._append(EVENT_START, {"generation_id": generation.id, **start_data})
+        generation.task = asyncio.create_task(self._pump(generation, source))
+        self._generations[generation.id] = generation
+        return generation
+
+    def get(self, generation_id: str) -> Optional[Generation]:
+        self._purge_finished()
+        return self._generations.get(generation_id)
+
+    def _purge_finished(self) -> None:
+        cutoff = time.monotonic() - self.retention_seconds
+        expired = [
+            generation_id
+            for generation_id, generation in self._generations.items()
+            if generation.finished_at is not None and generation.finished_at <= cutoff
+        ]
+        for generation_id in expired:
+            del self._generations[generation_id]
+
+    async def _pump(self, generation: Generation, source: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in source:
+                async with generation.condition:
+                    if chunk.startswith(STREAM_ERROR_PREFIX):
+                        message = chunk[len(STREAM_ERROR_PREFIX):].strip()
+                        generation._append(EVENT_ERROR, {"code": ERROR_UPSTREAM, "message": message})
+                        return
+                    generation._append(EVENT_DELTA, {"text": chunk})
+                    generation.condition.notify_all()
+            async with generation.condition:
+                generation._append(EVENT_DONE, {})
+        except asyncio.CancelledError:
+            pass
+        except UpstreamSaturatedError as error:
+            async with generation.condition:
+                generation._append(
+                    EVENT_ERROR,
+                    {"code": ERROR_OVERLOADED, "message": str(error), "retry_after": error.retry_after},
+                )
+        except Exception as error:
+            async with generation.condition:
+                generation._append(EVENT_ERROR, {"code": ERROR_UPSTREAM, "message": str(error)})
+        finally:
+            async with generation.condition:
+                generation.done = True
+                generation.finished_at = time.monotonic()
+                generation.condition.notify_all()
+
+    async def first_event(self, generation: Generation) -> Optional[StreamEvent]:
+        """Wait for the first event after `start`, i.e. the first token or an error."""
+        async with generation.condition:
+            await generation.condition.wait_for(lambda: generation.last_seq >= 1 or generation.done)
+            return next((event for event in generation.events if event.seq >= 1), None)
+
+    async def iter_events(
+        self, generation: Generation, after_seq: int = -1
+    ) -> AsyncIterator[Optional[StreamEvent]]:
+        """
+        Yield events with seq > `after_seq`, replaying from the ring buffer first.
+        Yields None whenever `heartbeat_seconds` pass without a new event.
+        Raises LookupError if the requested position has already left the buffer.
+        """
+        if after_seq >= 0:
+            self.resumed += 1
+        generation.subscribers += 1
+        if generation.abandon_handle is not None:
+            generation.abandon_handle.cancel()
+            generation.abandon_handle = None
+        cursor = after_seq
+        try:
+            while True:
+                async with generation.condition:
+                    try:
+                        await asyncio.wait_for(
+                            generation.condition.wait_for(
+                                lambda: generation.last_seq > cursor or generation.done
+                            ),
+                            timeout=self.heartbeat_seconds,
+                        )
+                    except asyncio.TimeoutError:
+                        pending = None
+                    else:
+                        if generation.events and generation.events[0].seq > cursor + 1:
+                            raise LookupError("Requested events are no longer buffered")
+                        pending = [event for event in generation.events if event.seq > cursor]
+                    finished = generation.done
+
+                if pending is None:
+                    yield None
+                    continue
+                for event in pending:
+                    cursor = event.seq
+                    yield event
+                if finished and cursor >= generation.last_seq:
+                    return
+        finally:
+            generation.subscribers -= 1
+            if generation.subscribers == 0 and not generation.done:
+                # Give a dropped client time to reconnect before abandoning the upstream call
+                loop = asyncio.get_running_loop()
+                generation.abandon_handle = loop.call_later(
+                    self.abandon_after_seconds, self._abandon_if_idle, generation
+                )
+
+    def _abandon_if_idle(self, generation: Generation) -> None:
+        generation.abandon_handle = None
+        if generation.subscribers == 0 and not generation.done and generation.task is not None:
+            generation.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "generations": len(self._generations),
+            "active": sum(1 for generation in self._generations.values() if not generation.done),
+            "resumed": self.resumed,
+        }
+
+
+resumable_streams = ResumableStreamRegistry(
+    buffer_size=settings.SSE_RESUME_BUFFER_EVENTS,
+    retention_seconds=settings.SSE_RESUME_RETENTION_SECONDS,
+    abandon_after_seconds=settings.SSE_ABANDON_AFTER_SECONDS,
+    heartbeat_seconds=settings.SSE_HEARTBEAT_SECONDS,
+)
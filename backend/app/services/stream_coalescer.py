@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class _InFlightStream:
+    """
+    One upstream stream shared by every identical request that arrives while it runs.
+    Chunks are kept in a replay buffer for the lifetime of the stream so late joiners
+    can catch up; each subscriber keeps its own read cursor into that buffer.
+    """
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class StreamCoalescer:
+    """
+    Coalesces concurrent identical streaming requests onto a single upstream stream.
+
+    The first subscriber for a key starts the producer in a background task; later
+    subscribers replay the chunks emitted so far and then follow live chunks. A slow
+    subscriber only lags behind on its own cursor, so it never stalls the producer or
+    the other subscribers. When the last subscriber goes away before the stream
+    finishes, the upstream stream is cancelled.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._in_flight: Dict[str, _InFlightStream] = {}
+        self.upstream_streams = 0
+        self.coalesced_subscribers = 0
+
+    def in_flight_count(self) -> int:
+        return len(self._in_flight)
+
+    async def subscribe(
+        self,
+        key: str,
+        producer_factory: Callable[[], AsyncIterator[str]],
+    ) -> AsyncIterator[str]:
+        """Yield the chunks of the stream for `key`, starting it if nobody else has."""
+        if not self.enabled:
+            async for chunk in producer_factory():
+                yield chunk
+            return
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = _InFlightStream(key)
+            self._in_flight[key] = in_flight
+            in_flight.task = asyncio.create_task(self._pump(in_flight, producer_factory()))
+            self.upstream_streams += 1
+            metrics.STREAM_SUBSCRIPTIONS.labels("upstream").inc()
+            metrics.STREAM_COALESCER_IN_FLIGHT.set(len(self._in_flight))
+        else:
+            self.coalesced_subscribers += 1
+            metrics.STREAM_SUBSCRIPTIONS.labels("joined").inc()
+
+        in_flight.subscribers += 1
+        cursor = 0
+        try:
+            while True:
+                async with in_flight.condition:
+                    await in_flight.condition.wait_for(
+                        lambda: cursor < len(in_flight.chunks) or in_flight.done
+                    )
+                    pending = in_flight.chunks[cursor:]
+                    finished = in_flight.done
+
+                # Yield outside the lock so this subscriber's pace affects nobody else
+                for chunk in pending:
+                    cursor += 1
+                    yield chunk
+
+                if finished and cursor >= len(in_flight.chunks):
+                    if in_flight.error is not None:
+                        raise in_flight.error
+                    return
+        finally:
+            in_flight.subscribers -= 1
+            if in_flight.subscribers == 0 and not in_flight.done and in_flight.task is not None:
+                in_flight.task.cancel()
+
+    async def _pump(self, in_flight: _InFlightStream, source: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in source:
+                async with in_flight.condition:
+                    in_flight.chunks.append(chunk)
+                    in_flight.condition.notify_all()
+        except asyncio.CancelledError:
+            pass
+        except Exception as error:  # surfaced to every subscriber
+            in_flight.error = error
+        finally:
+            # Unregister first so requests arriving from now on start a fresh stream
+            if self._in_flight.get(in_flight.key) is in_flight:
+                del self._in_flight[in_flight.key]
+                metrics.STREAM_COALESCER_IN_FLIGHT.set(len(self._in_flight))
+            async with in_flight.condition:
+                in_flight.done = True
+                in_flight.condition.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._in_flight),
+            "upstream_streams": self.upstream_streams,
+            "coalesced_subscribers": self.coalesced_subscribers,
+        }
+
+
+stream_coalescer = StreamCoalescer(enabled=settings.ENABLE_STREAM_COALESCING)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.subscriber import Subscriber
+from app.services.notifications import SUBSCRIPTION_CONFIRMATION, email_enabled
+from app.services.task_queue import task_queue
+
+logger = logging.getLogger(__name__)
+
+# Per-caller outcomes
+SUBSCRIBED = "subscribed"
+REACTIVATED = "reactivated"
+ALREADY_SUBSCRIBED = "already_subscribed"
+
+
+class SubscriptionBatcher:
+    """
+    Write-behind pipeline for newsletter signups.
+
+    Callers enqueue an email and await a future. A single flusher task collects
+    signups for up to `max_delay_ms` (or until `max_batch` are waiting) and writes
+    them in one transaction: a SELECT of the batch's current rows to work out each
+    caller's outcome, then one `INSERT ... ON CONFLICT(email) DO UPDATE` that only
+    touches inactive rows. Under a signup spike this turns one write-lock round trip
+    per request into one per batch. Confirmation emails for new and reactivated
+    addresses are staged on the task queue in that same transaction.
+    """
+
+    def __init__(self, max_batch: int, max_delay_ms: int, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_delay_seconds = max_delay_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.batches = 0
+        self.rows = 0
+        self.failed_batches = 0
+
+    async def subscribe(self, email: str) -> str:
+        """Queue `email` and return its outcome once its batch has been committed."""
+        future = asyncio.get_running_loop().create_future()
+        if not self.enabled:
+            await self._write([(email, future)])
+            return future.result()
+
+        self._pending.append((email, future))
+        if self._task is None or self._task.done():
+            # Created here so the event belongs to the running loop
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run(self._ready))
+        if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+            self._ready.set()
+        return await future
+
+    async def _run(self, ready: asyncio.Event) -> None:
+        while self._pending or not self._closing:
+            await ready.wait()
+            ready.clear()
+            if len(self._pending) < self.max_batch and not self._closing:
+                # Give concurrent signups a moment to join; a full batch wakes us early
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout=self.max_delay_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+            batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+            if self._pending:
+                ready.set()
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        emails = list(dict.fromkeys(email for email, _ in batch))
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    rows = await db.execute(
+                        select(Subscriber.email, Subscriber.is_active).where(Subscriber.email.in_(emails))
+                    )
+                    existing: Dict[str, bool] = {email: bool(active) for email, active in rows.all()}
+
+                    dialect = db.get_bind().dialect.name
+                    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+                    statement = insert(Subscriber).values([{"email": email, "is_active": True} for email in emails])
+                    statement = statement.on_conflict_do_update(
+                        index_elements=["email"],
+                        set_={"is_active": True, "updated_at": func.now()},
+                        where=Subscriber.is_active.isnot(True),
+                    )
+                    await db.execute(statement)
+                    # Confirmation emails are queued in the same commit as the signups
+                    for email in emails if email_enabled() else []:
+                        if not existing.get(email):
+                            task_queue.stage(db, SUBSCRIPTION_CONFIRMATION, {"email": email})
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+        except Exception as error:
+            self.failed_batches += 1
+            logger.error("Newsletter batch of %d signups failed: %s", len(batch), error)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        self.batches += 1
+        self.rows += len(emails)
+        seen = set()
+        for email, future in batch:
+            if email in seen or existing.get(email):
+                outcome = ALREADY_SUBSCRIBED
+            elif email in existing:
+                outcome = REACTIVATED
+            else:
+                outcome = SUBSCRIBED
+            seen.add(email)
+            if not future.done():
+                future.set_result(outcome)
+
+    async def close(self) -> None:
+        """Flush whatever is queued and let the flusher task finish."""
+        if self._task is not None:
+            self._closing = True
+            self._ready.set()
+            await self._task
+            self._task = None
+        self._closing = False
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": (self.rows / self.batches) if self.batches else 0.0,
+        }
+
+
+subscription_batcher = SubscriptionBatcher(
+    max_batch=settings.SUBSCRIPTION_BATCH_MAX_ROWS,
+    max_delay_ms=settings.SUBSCRIPTION_BATCH_MAX_DELAY_MS,
+    enabled=settings.ENABLE_SUBSCRIPTION_BATCHING,
+)
@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import case, delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import metrics
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.background_task import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+_STAGED_KEY = "staged_background_tasks"
+_PURGE_BATCH_ROWS = 500
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class PermanentTaskError(Exception):
+    """Raised by a handler when a retry cannot succeed; the task is dead-lettered at once."""
+
+
+class TaskNotFoundError(LookupError):
+    pass
+
+
+class TaskStateError(RuntimeError):
+    """The task is not in a state that allows the requested change."""
+
+
+@dataclass
+class ClaimedTask:
+    id: int
+    name: str
+    payload: Dict[str, Any]
+    attempts: int  # including this one
+    max_attempts: int
+
+
+def _now() -> datetime:
+    # Aware, so Postgres compares it with timestamptz columns as UTC; SQLite stores it as UTC text
+    return datetime.now(timezone.utc)
+
+
+class TaskQueue:
+    """
+    Durable queue for post-request side effects, kept in the app database.
+
+    Request handlers `stage()` a task in the transaction that makes it necessary (the
+    status change, the signup), so it is queued exactly when that commits and costs
+    one more row in a write they already make; `enqueue()` does the same in its own
+    transaction. Neither waits for the work itself.
+
+    `workers` asyncio tasks claim due rows oldest first: a plain read picks a
+    candidate, so idle polls never take the write lock, then a conditional UPDATE
+    leases it for `visibility_timeout_seconds`. A handler gets that long to finish.
+    On failure the task is queued again after full-jitter exponential backoff, and
+    after `max_attempts` (or a PermanentTaskError) it is left `dead` for an admin to
+    inspect and requeue. A lease that runs out, because its worker crashed, is
+    handed back by the sweeper. Delivery is at least once; handlers must tolerate
+    running twice.
+
+    Workers run in the web process (see main.py) or on their own via
+    `python -m app.worker`; any number of processes can share one database.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        poll_seconds: float,
+        visibility_timeout_seconds: float,
+        max_attempts: int,
+        backoff_base_seconds: float,
+        backoff_max_seconds: float,
+        sweep_seconds: float,
+        retention_hours: int,
+        shutdown_grace_seconds: float,
+    ) -> None:
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.visibility_timeout = timedelta(seconds=visibility_timeout_seconds)
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.sweep_seconds = sweep_seconds
+        self.retention = timedelta(hours=retention_hours) if retention_hours > 0 else None
+        self.shutdown_grace_seconds = shutdown_grace_seconds
+        self._handlers: Dict[str, Handler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._inflight: Dict[int, int] = {}  # task id -> attempt it was claimed as
+
+        self.enqueued = 0
+        self.done = 0
+        self.retried = 0
+        self.dead = 0
+        self.expired = 0
+        self.released = 0
+        self.purged = 0
+        self.failed_polls = 0
+
+    def task(self, name: str) -> Callable[[Handler], Handler]:
+        """Register the decorated coroutine as the handler for tasks called `name`."""
+
+        def register(handler: Handler) -> Handler:
+            if name in self._handlers:
+                raise ValueError(f"A handler for task {name!r} is already registered")
+            self._handlers[name] = handler
+            return handler
+
+        return register
+
+    def backoff_seconds(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retrying after the `attempt`-th failure."""
+        ceiling = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def stage(
+        self,
+        db: AsyncSession,
+        name: str,
+        payload: Dict[str, Any],
+        delay_seconds: float = 0.0,
+        max_attempts: Optional[int] = None,
+    ) -> BackgroundTask:
+        """Add a task to `db`'s transaction; it is queued if and only if the caller commits."""
+        row = BackgroundTask(
+            name=name,
+            payload=json.dumps(payload, default=str),
+            status=QUEUED,
+            attempts=0,
+            max_attempts=max_attempts or self.max_attempts,
+            available_at=_now() + timedelta(seconds=delay_seconds),
+        )
+        db.add(row)
+
+        session = db.sync_session
+        staged = session.info.get(_STAGED_KEY)
+        if staged is None:
+            staged = session.info[_STAGED_KEY] = []
+            event.listen(session, "after_commit", self._after_commit)
+            event.listen(session, "after_rollback", self._after_rollback)
+        staged.append(name)
+        return row
+
+    def _after_commit(self, session) -> None:
+        staged = session.info.get(_STAGED_KEY)
+        if not staged:
+            return
+        for name in staged:
+            metrics.BACKGROUND_TASKS.labels(name, "enqueued").inc()
+        self.enqueued += len(staged)
+        staged.clear()
+        # Wake this process's idle workers rather than leave the task to the next poll
+        self.notify()
+
+    def _after_rollback(self, session) -> None:
+        staged = session.info.get(_STAGED_KEY)
+        if staged:
+            staged.clear()
+
+    async def enqueue(
+        self,
+        name: str,
+        payload: Dict[str, Any],
+        delay_seconds: float = 0.0,
+        max_attempts: Optional[int] = None,
+    ) -> int:
+        """Queue a task in its own transaction and return its id."""
+        async with AsyncSessionLocal() as db:
+            row = self.stage(db, name, payload, delay_seconds=delay_seconds, max_attempts=max_attempts)
+            await db.commit()
+        return row.id
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def claim(self) -> Optional[ClaimedTask]:
+        """Lease the oldest due task, or return None when nothing is due."""
+        while True:
+            now = _now()
+            async with AsyncSessionLocal() as db:
+                candidate = await db.scalar(
+                    select(BackgroundTask.id)
+                    .where(BackgroundTask.status == QUEUED, BackgroundTask.available_at <= now)
+                    .order_by(BackgroundTask.available_at, BackgroundTask.id)
+                    .limit(1)
+                )
+                if candidate is None:
+                    return None
+                result = await db.execute(
+                    update(BackgroundTask)
+                    .where(BackgroundTask.id == candidate, BackgroundTask.status == QUEUED)
+                    .values(
+                        status=RUNNING,
+                        attempts=BackgroundTask.attempts + 1,
+                        locked_until=now + self.visibility_timeout,
+                        updated_at=now,
+                    )
+                    .returning(
+                        BackgroundTask.id,
+                        BackgroundTask.name,
+                        BackgroundTask.payload,
+                        BackgroundTask.attempts,
+                        BackgroundTask.max_attempts,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                row = result.first()
+                await db.commit()
+            if row is not None:
+                return ClaimedTask(row.id, row.name, json.loads(row.payload), row.attempts, row.max_attempts)
+            # Another worker claimed it between the read and the update; try the next one
+
+    async def run(self, task: ClaimedTask) -> str:
+        """Run one claimed task and record how it went: done, retried or dead."""
+        handler = self._handlers.get(task.name)
+        self._inflight[task.id] = task.attempts
+        try:
+            if handler is None:
+                raise PermanentTaskError(f"No handler is registered for task {task.name!r}")
+            await asyncio.wait_for(handler(task.payload), timeout=self.visibility_timeout.total_seconds())
+        except asyncio.CancelledError:
+            # Left in _inflight so close() can hand it back to the queue
+            raise
+        except Exception as error:
+            outcome = await self._fail(task, error)
+        else:
+            outcome = await self._settle(task, {"status": DONE, "last_error": None}, DONE)
+        self._inflight.pop(task.id, None)
+        return outcome
+
+    async def _fail(self, task: ClaimedTask, error: Exception) -> str:
+        message = f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+        if isinstance(error, PermanentTaskError) or task.attempts >= task.max_attempts:
+            logger.error("Task %s (%s) dead after %d attempt(s): %s", task.id, task.name, task.attempts, message)
+            return await self._settle(task, {"status": DEAD, "last_error": message}, DEAD)
+
+        delay = self.backoff_seconds(task.attempts)
+        logger.warning(
+            "Task %s (%s) attempt %d/%d failed, retrying in %.1fs: %s",
+            task.id, task.name, task.attempts, task.max_attempts, delay, message,
+        )
+        values = {"status": QUEUED, "last_error": message, "available_at": _now() + timedelta(seconds=delay)}
+        return await self._settle(task, values, "retried")
+
+    async def _settle(self, task: ClaimedTask, values: Dict[str, Any], outcome: str) -> str:
+        # Guarded by the attempt number: if the lease ran out and another worker has the
+        # task now, this run's result is dropped instead of overwriting that one's
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    update(BackgroundTask)
+                    .where(
+                        BackgroundTask.id == task.id,
+                        BackgroundTask.status == RUNNING,
+                        BackgroundTask.attempts == task.attempts,
+                    )
+                    .values(locked_until=None, updated_at=_now(), **values)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception as error:
+            # The lease will run out and the sweeper queues the task again
+            logger.error("Could not record task %s as %s: %s", task.id, outcome, error)
+            return "unrecorded"
+        if not result.rowcount:
+            logger.warning("Task %s (%s) lost its lease before finishing", task.id, task.name)
+            return "lost"
+
+        if outcome == DONE:
+            self.done += 1
+        elif outcome == DEAD:
+            self.dead += 1
+        else:
+            self.retried += 1
+        metrics.BACKGROUND_TASKS.labels(task.name, outcome).inc()
+        return outcome
+
+    async def expire_leases(self) -> int:
+        """Queue tasks whose lease ran out again, or dead-letter them if out of attempts."""
+        now = _now()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(BackgroundTask)
+                .where(BackgroundTask.status == RUNNING, BackgroundTask.locked_until <= now)
+                .values(
+                    status=case((BackgroundTask.attempts >= BackgroundTask.max_attempts, DEAD), else_=QUEUED),
+                    available_at=now,
+                    locked_until=None,
+                    last_error="Visibility timeout expired",
+                    updated_at=now,
+                )
+                .returning(BackgroundTask.name, BackgroundTask.status)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            await db.commit()
+        for name, status in rows:
+            metrics.BACKGROUND_TASKS.labels(name, "expired").inc()
+            if status == DEAD:
+                metrics.BACKGROUND_TASKS.labels(name, DEAD).inc()
+        self.expired += len(rows)
+        if rows:
+            logger.warning("Requeued %d background task(s) whose lease expired", len(rows))
+            self.notify()
+        return len(rows)
+
+    async def purge(self, now: Optional[datetime] = None) -> int:
+        """Delete done tasks past the retention period; dead ones are kept. Returns how many went."""
+        if self.retention is None:
+            return 0
+        cutoff = (now or _now()) - self.retention
+        deleted = 0
+        while True:
+            expired = (
+                select(BackgroundTask.id)
+                .where(BackgroundTask.status == DONE, BackgroundTask.updated_at < cutoff)
+                .limit(_PURGE_BATCH_ROWS)
+            )
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    delete(BackgroundTask)
+                    .where(BackgroundTask.id.in_(expired))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            deleted += result.rowcount or 0
+            if (result.rowcount or 0) < _PURGE_BATCH_ROWS:
+                break
+        self.purged += deleted
+        return deleted
+
+    async def requeue(self, task_id: int) -> BackgroundTask:
+        """Give a dead task a fresh set of attempts."""
+        async with AsyncSessionLocal() as db:
+            task = await db.get(BackgroundTask, task_id)
+            if task is None:
+                raise TaskNotFoundError(task_id)
+            if task.status != DEAD:
+                raise TaskStateError(f"Task {task_id} is {task.status}, only dead tasks can be requeued")
+            task.status = QUEUED
+            task.attempts = 0
+            task.available_at = task.updated_at = _now()
+            await db.commit()
+        self.notify()
+        return task
+
+    async def counts(self) -> Dict[str, int]:
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(BackgroundTask.status, func.count()).group_by(BackgroundTask.status)
+            )
+            return {status: count for status, count in rows.all()}
+
+    async def drain(self, max_seconds: float) -> Dict[str, int]:
+        """
+        Run due tasks one after another until none are left or `max_seconds` have
+        passed, and return how they went. For deployments without worker processes,
+        such as serverless, where a cron calls this instead.
+        """
+        deadline = time.monotonic() + max_seconds
+        outcomes: Dict[str, int] = {}
+        await self.expire_leases()
+        while time.monotonic() < deadline:
+            task = await self.claim()
+            if task is None:
+                break
+            outcome = await self.run(task)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        return outcomes
+
+    def start(self, workers: Optional[int] = None) -> int:
+        """Start the worker pool and the lease sweeper in the running loop. Returns the pool size."""
+        count = self.workers if workers is None else workers
+        if self._workers or count <= 0:
+            return len(self._workers)
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work(self._wake)) for _ in range(count)]
+        self._sweeper = asyncio.create_task(self._sweep())
+        return count
+
+    async def _work(self, wake: asyncio.Event) -> None:
+        while not self._stopping:
+            try:
+                task = await self.claim()
+            except Exception as error:
+                self.failed_polls += 1
+                logger.warning("Background task poll failed: %s", error)
+                task = None
+            if task is not None:
+                await self.run(task)
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                await self.expire_leases()
+                await self.purge()
+            except Exception as error:
+                logger.warning("Background task sweep failed: %s", error)
+            await asyncio.sleep(self.sweep_seconds)
+
+    async def close(self) -> None:
+        """
+        Stop the workers. Running handlers get `shutdown_grace_seconds` to finish; those
+        still running then are cancelled and their tasks queued again without using up
+        an attempt.
+        """
+        if not self._workers:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._sweeper.cancel()
+        workers, self._workers = self._workers, []
+        _, unfinished = await asyncio.wait(workers, timeout=self.shutdown_grace_seconds)
+        for worker in unfinished:
+            worker.cancel()
+        await asyncio.gather(*workers, self._sweeper, return_exceptions=True)
+        self._sweeper = None
+
+        inflight, self._inflight = self._inflight, {}
+        for task_id, attempt in inflight.items():
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(BackgroundTask)
+                        .where(
+                            BackgroundTask.id == task_id,
+                            BackgroundTask.status == RUNNING,
+                            BackgroundTask.attempts == attempt,
+                        )
+                        .values(
+                            status=QUEUED,
+                            attempts=BackgroundTask.attempts - 1,
+                            available_at=_now(),
+                            locked_until=None,
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+                self.released += 1
+            except Exception as error:
+                logger.warning("Could not release background task %s: %s", task_id, error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "inflight": len(self._inflight),
+            "handlers": sorted(self._handlers),
+            "enqueued": self.enqueued,
+            "done": self.done,
+            "retried": self.retried,
+            "dead": self.dead,
+            "expired": self.expired,
+            "released": self.released,
+            "purged": self.purged,
+            "failed_polls": self.failed_polls,
+        }
+
+
+task_queue = TaskQueue(
+    workers=settings.TASK_QUEUE_WORKERS,
+    poll_seconds=settings.TASK_QUEUE_POLL_SECONDS,
+    visibility_timeout_seconds=settings.TASK_QUEUE_VISIBILITY_TIMEOUT_SECONDS,
+    max_attempts=settings.TASK_QUEUE_MAX_ATTEMPTS,
+    backoff_base_seconds=settings.TASK_QUEUE_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.TASK_QUEUE_BACKOFF_MAX_SECONDS,
+    sweep_seconds=settings.TASK_QUEUE_SWEEP_SECONDS,
+    retention_hours=settings.TASK_QUEUE_RETENTION_HOURS,
+    shutdown_grace_seconds=settings.TASK_QUEUE_SHUTDOWN_GRACE_SECONDS,
+)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.core.metrics import RATE_LIMIT_REJECTIONS
+from app.database import AsyncSessionLocal
+from app.models.token_usage import TokenUsage
+from app.utils.auth import verify_bearer_token_async
+
+logger = logging.getLogger(__name__)
+
+
+class _RollingUsage:
+    """Token totals for one subject in a ring of fixed-size time buckets."""
+
+    __slots__ = ("buckets", "head", "head_start", "total")
+
+    def __init__(self, bucket_count: int, head_start: int) -> None:
+        self.buckets = [0] * bucket_count
+        self.head = 0
+        self.head_start = head_start
+        self.total = 0
+
+
+class TokenQuotaTracker:
+    """
+    Rolling-window token usage per subject (authenticated user or client IP).
+
+    The window is split into `bucket_count` buckets; recording and checking advance
+    the ring past expired buckets, so both are O(1) amortized. Deltas are buffered and
+    written to the `token_usage` table in batches by `flush`, and `load` seeds the
+    counters from that table so a restart does not reset everyone's quota.
+    """
+
+    def __init__(self, budget: int, window_seconds: int, bucket_count: int, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.budget = budget
+        self.window_seconds = window_seconds
+        self.bucket_count = bucket_count
+        self.bucket_seconds = max(1, window_seconds // bucket_count)
+        self._usage: Dict[str, _RollingUsage] = {}
+        self._pending: Dict[Tuple[str, int], List[int]] = {}
+
+    def _bucket_start(self, now: float) -> int:
+        return int(now // self.bucket_seconds) * self.bucket_seconds
+
+    def _advance(self, usage: _RollingUsage, bucket_start: int) -> None:
+        steps = (bucket_start - usage.head_start) // self.bucket_seconds
+        if steps <= 0:
+            return
+        if steps >= self.bucket_count:
+            usage.buckets = [0] * self.bucket_count
+            usage.total = 0
+        else:
+            for _ in range(steps):
+                usage.head = (usage.head + 1) % self.bucket_count
+                usage.total -= usage.buckets[usage.head]
+                usage.buckets[usage.head] = 0
+        usage.head_start = bucket_start
+
+    def _add(self, subject: str, tokens: int, bucket_start: int) -> None:
+        usage = self._usage.get(subject)
+        if usage is None:
+            usage = _RollingUsage(self.bucket_count, bucket_start)
+            self._usage[subject] = usage
+        self._advance(usage, bucket_start)
+        # Late-arriving usage (e.g. loaded from the database) lands in its own bucket
+        offset = (usage.head_start - bucket_start) // self.bucket_seconds
+        if offset >= self.bucket_count:
+            return
+        usage.buckets[(usage.head - offset) % self.bucket_count] += tokens
+        usage.total += tokens
+
+    def record(self, subject: Optional[str], input_tokens: int, output_tokens: int) -> None:
+        if not self.enabled or not subject:
+            return
+        bucket_start = self._bucket_start(time.time())
+        self._add(subject, input_tokens + output_tokens, bucket_start)
+        pending = self._pending.setdefault((subject, bucket_start), [0, 0])
+        pending[0] += input_tokens
+        pending[1] += output_tokens
+
+    def used(self, subject: str) -> int:
+        usage = self._usage.get(subject)
+        if usage is None:
+            return 0
+        self._advance(usage, self._bucket_start(time.time()))
+        return usage.total
+
+    def is_exhausted(self, subject: str) -> bool:
+        return self.enabled and self.used(subject) >= self.budget
+
+    def retry_after(self, subject: str) -> int:
+        """Seconds until the oldest non-empty bucket leaves the window."""
+        usage = self._usage.get(subject)
+        if usage is None:
+            return 1
+        now = time.time()
+        self._advance(usage, self._bucket_start(now))
+        for age in range(self.bucket_count - 1, -1, -1):
+            if usage.buckets[(usage.head - age) % self.bucket_count]:
+                expires_at = usage.head_start - age * self.bucket_seconds + self.window_seconds
+                return max(1, math.ceil(expires_at - now))
+        return 1
+
+    def _evict_idle(self) -> None:
+        now_bucket = self._bucket_start(time.time())
+        idle = []
+        for subject, usage in self._usage.items():
+            self._advance(usage, now_bucket)
+            if usage.total <= 0:
+                idle.append(subject)
+        for subject in idle:
+            del self._usage[subject]
+
+    async def flush(self) -> int:
+        """Write buffered usage deltas in one batch. Returns the number of rows upserted."""
+        self._evict_idle()
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        rows = [
+            {"subject": subject, "bucket_start": bucket_start, "input_tokens": tokens[0], "output_tokens": tokens[1]}
+            for (subject, bucket_start), tokens in pending.items()
+        ]
+        cutoff = self._bucket_start(time.time()) - 2 * self.window_seconds
+
+        try:
+            async with AsyncSessionLocal() as db:
+                dialect = db.get_bind().dialect.name
+                insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+                statement = insert(TokenUsage).values(rows)
+                statement = statement.on_conflict_do_update(
+                    index_elements=["subject", "bucket_start"],
+                    set_={
+                        "input_tokens": TokenUsage.input_tokens + statement.excluded.input_tokens,
+                        "output_tokens": TokenUsage.output_tokens + statement.excluded.output_tokens,
+                    },
+                )
+                await db.execute(statement)
+                await db.execute(delete(TokenUsage).where(TokenUsage.bucket_start < cutoff))
+                await db.commit()
+        except Exception:
+            # Put the deltas back so the next flush retries them
+            for key, tokens in pending.items():
+                merged = self._pending.setdefault(key, [0, 0])
+                merged[0] += tokens[0]
+                merged[1] += tokens[1]
+            raise
+        return len(rows)
+
+    async def load(self) -> int:
+        """Seed counters with usage persisted inside the current window."""
+        if not self.enabled:
+            return 0
+        since = self._bucket_start(time.time()) - self.window_seconds + self.bucket_seconds
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    TokenUsage.subject,
+                    TokenUsage.bucket_start,
+                    TokenUsage.input_tokens,
+                    TokenUsage.output_tokens,
+                )
+                .where(TokenUsage.bucket_start >= since)
+                .order_by(TokenUsage.bucket_start)
+            )
+            rows = result.all()
+        for subject, bucket_start, input_tokens, output_tokens in rows:
+            self._add(subject, input_tokens + output_tokens, bucket_start)
+        return len(rows)
+
+
+token_quota = TokenQuotaTracker(
+    budget=settings.TOKEN_QUOTA_BUDGET,
+    window_seconds=settings.TOKEN_QUOTA_WINDOW_SECONDS,
+    bucket_count=settings.TOKEN_QUOTA_BUCKETS,
+    enabled=settings.ENABLE_TOKEN_QUOTA,
+)
+
+
+@dataclass
+class QuotaDecision:
+    subject: str
+    downgrade: bool = False
+
+
+async def enforce_token_quota(request: Request) -> QuotaDecision:
+    """
+    Resolve who pays for this request and check their remaining token budget.
+    Exhausted subjects are rejected with 429 or flagged for a cheaper model,
+    depending on TOKEN_QUOTA_ACTION.
+    """
+    subject = f"ip:{request.client.host if request.client else 'unknown'}"
+    authorization = request.headers.get("Authorization")
+    if authorization:
+        try:
+            email = await verify_bearer_token_async(authorization)
+            subject = f"user:{email}"
+        except HTTPException:
+            pass
+
+    if not token_quota.is_exhausted(subject):
+        return QuotaDecision(subject=subject)
+    if settings.TOKEN_QUOTA_ACTION == "downgrade":
+        return QuotaDecision(subject=subject, downgrade=True)
+    RATE_LIMIT_REJECTIONS.labels("token_quota").inc()
+    raise HTTPException(
+        status_code=429,
+        detail="Token quota exceeded. Please try again later.",
+        headers={"Retry-After": str(token_quota.retry_after(subject))},
+    )
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+
+from app.core import metrics
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat_transcript import ChatTranscript
+from app.utils.datetimes import utc_naive
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Transcript:
+    """One completed exchange, as queued by the request path."""
+
+    prompt: str
+    response: str
+    mode: str  # create | stream
+    session_id: Optional[str] = None
+    subject: Optional[str] = None
+    assistant: Optional[str] = None
+    model: Optional[str] = None
+    cached: bool = False
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+def compress(text: str, level: int) -> bytes:
+    return zlib.compress(text.encode("utf-8"), level)
+
+
+def decompress(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+class TranscriptStore:
+    """
+    Write-behind persistence for chat exchanges.
+
+    `record()` is all the request path does: it appends to an in-memory queue and
+    returns. One flusher task collects up to `max_batch` exchanges (or whatever
+    arrived within `max_delay_ms`), compresses their bodies at the cheap `zlib_level`
+    and inserts them in one transaction. If the database falls behind, the queue stops
+    at `max_queue` and newer exchanges are dropped and counted rather than slowing
+    responses down. A failed batch is logged and dropped the same way.
+
+    `maintain()` is the retention job: it deletes rows older than `retention_days`
+    and recompresses rows older than `compact_after_hours` at `compact_level`, in
+    transactions of `maintenance_batch` rows so neither holds the write lock for long.
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        max_delay_ms: int,
+        max_queue: int,
+        zlib_level: int,
+        compact_level: int,
+        compact_after_hours: int,
+        retention_days: int,
+        maintenance_batch: int,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_delay_seconds = max_delay_ms / 1000
+        self.max_queue = max_queue
+        self.zlib_level = zlib_level
+        self.compact_level = compact_level
+        self.compact_after = timedelta(hours=compact_after_hours)
+        self.retention = timedelta(days=retention_days) if retention_days > 0 else None
+        self.maintenance_batch = maintenance_batch
+        self._pending: List[Transcript] = []
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.batches = 0
+        self.rows = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.purged = 0
+        self.compacted = 0
+
+    def record(self, transcript: Transcript) -> None:
+        """Queue `transcript` for the next batch. Never waits; drops it if the queue is full."""
+        if not self.enabled:
+            return
+        if len(self._pending) >= self.max_queue:
+            self.dropped += 1
+            metrics.CHAT_TRANSCRIPTS.labels("dropped").inc()
+            return
+
+        self._pending.append(transcript)
+        if self._task is None or self._task.done():
+            # Created here so the event belongs to the running loop
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run(self._ready))
+        if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+            self._ready.set()
+
+    async def _run(self, ready: asyncio.Event) -> None:
+        while self._pending or not self._closing:
+            await ready.wait()
+            ready.clear()
+            if len(self._pending) < self.max_batch and not self._closing:
+                # Let more exchanges join; a full batch wakes us early
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout=self.max_delay_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+            batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+            if self._pending:
+                ready.set()
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch: List[Transcript]) -> None:
+        rows = []
+        raw_bytes = stored_bytes = 0
+        for transcript in batch:
+            prompt = compress(transcript.prompt, self.zlib_level)
+            response = compress(transcript.response, self.zlib_level)
+            raw_bytes += len(transcript.prompt.encode("utf-8")) + len(transcript.response.encode("utf-8"))
+            stored_bytes += len(prompt) + len(response)
+            rows.append(
+                {
+                    "session_id": transcript.session_id,
+                    "subject": transcript.subject,
+                    "assistant": transcript.assistant,
+                    "model": transcript.model,
+                    "mode": transcript.mode,
+                    "cached": transcript.cached,
+                    "prompt": prompt,
+                    "response": response,
+                    "prompt_chars": len(transcript.prompt),
+                    "response_chars": len(transcript.response),
+                    "compacted": False,
+                    "created_at": transcript.created_at,
+                }
+            )
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    await db.execute(insert(ChatTranscript), rows)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+        except Exception as error:
+            self.failed_batches += 1
+            metrics.CHAT_TRANSCRIPTS.labels("failed").inc(len(batch))
+            logger.error("Transcript batch of %d exchanges failed: %s", len(batch), error)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        self.raw_bytes += raw_bytes
+        self.stored_bytes += stored_bytes
+        metrics.CHAT_TRANSCRIPTS.labels("written").inc(len(batch))
+
+    async def close(self) -> None:
+        """Flush whatever is queued and let the flusher task finish."""
+        if self._task is not None:
+            self._closing = True
+            self._ready.set()
+            await self._task
+            self._task = None
+        self._closing = False
+
+    async def purge(self, now: Optional[datetime] = None) -> int:
+        """Delete transcripts past the retention period. Returns how many were deleted."""
+        if self.retention is None:
+            return 0
+        cutoff = utc_naive((now or datetime.now(timezone.utc)) - self.retention)
+        deleted = 0
+        while True:
+            expired = (
+                select(ChatTranscript.id).where(ChatTranscript.created_at < cutoff).limit(self.maintenance_batch)
+            )
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    delete(ChatTranscript)
+                    .where(ChatTranscript.id.in_(expired))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            deleted += result.rowcount or 0
+            if (result.rowcount or 0) < self.maintenance_batch:
+                break
+        self.purged += deleted
+        return deleted
+
+    async def compact(self, now: Optional[datetime] = None) -> int:
+        """Recompress settled transcripts at `compact_level`. Returns how many rows were rewritten."""
+        if self.compact_level <= self.zlib_level:
+            return 0
+        cutoff = utc_naive((now or datetime.now(timezone.utc)) - self.compact_after)
+        rewritten = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(ChatTranscript.id, ChatTranscript.prompt, ChatTranscript.response)
+                    .where(ChatTranscript.compacted.is_(False), ChatTranscript.created_at < cutoff)
+                    .order_by(ChatTranscript.id)
+                    .limit(self.maintenance_batch)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                # Level 9 is slow enough to keep off the event loop
+                recompressed = await asyncio.to_thread(self._recompress, rows)
+                await db.execute(update(ChatTranscript), recompressed)
+                await db.commit()
+            rewritten += len(rows)
+            if len(rows) < self.maintenance_batch:
+                break
+        self.compacted += rewritten
+        return rewritten
+
+    def _recompress(self, rows: List[Tuple[int, bytes, bytes]]) -> List[Dict[str, object]]:
+        return [
+            {
+                "id": row_id,
+                "prompt": compress(decompress(prompt), self.compact_level),
+                "response": compress(decompress(response), self.compact_level),
+                "compacted": True,
+            }
+            for row_id, prompt, response in rows
+        ]
+
+    async def maintain(self) -> Tuple[int, int]:
+        """One retention pass: (rows deleted, rows recompressed)."""
+        return await self.purge(), await self.compact()
+
+    async def run_maintenance(self, interval_seconds: float) -> None:
+        """Run `maintain()` every `interval_seconds` until cancelled."""
+        while True:
+            try:
+                deleted, rewritten = await self.maintain()
+                if deleted or rewritten:
+                    logger.info("Transcript maintenance: %d deleted, %d recompressed", deleted, rewritten)
+            except Exception as error:
+                logger.warning("Transcript maintenance failed: %s", error)
+            await asyncio.sleep(interval_seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "rows": self.rows,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": (self.rows / self.batches) if self.batches else 0.0,
+            "compression_ratio": (self.stored_bytes / self.raw_bytes) if self.raw_bytes else 0.0,
+            "purged": self.purged,
+            "compacted": self.compacted,
+        }
+
+
+transcript_store = TranscriptStore(
+    max_batch=settings.TRANSCRIPT_BATCH_MAX_ROWS,
+    max_delay_ms=settings.TRANSCRIPT_BATCH_MAX_DELAY_MS,
+    max_queue=settings.TRANSCRIPT_QUEUE_MAX,
+    zlib_level=settings.TRANSCRIPT_ZLIB_LEVEL,
+    compact_level=settings.TRANSCRIPT_COMPACT_ZLIB_LEVEL,
+    compact_after_hours=settings.TRANSCRIPT_COMPACT_AFTER_HOURS,
+    retention_days=settings.TRANSCRIPT_RETENTION_DAYS,
+    maintenance_batch=settings.TRANSCRIPT_MAINTENANCE_BATCH_ROWS,
+    # Write-behind needs a process that outlives the request; serverless may be frozen first
+    enabled=settings.ENABLE_CHAT_TRANSCRIPTS and not settings.SERVERLESS,
+)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from app.core import metrics
+from app.core.config import settings
+
+# Smoothing factor for the moving average of how long a slot is held
+_HOLD_TIME_ALPHA = 0.2
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class UpstreamSaturatedError(Exception):
+    """Raised when an upstream call cannot be admitted; maps to 503 with Retry-After."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamGovernor:
+    """
+    Bounds concurrent Anthropic calls.
+
+    Up to `max_concurrency` calls run at once; further callers wait in a FIFO queue of
+    at most `max_queue` entries for no longer than `max_queue_wait_seconds`. Callers
+    that find the queue full, or that time out in it, get UpstreamSaturatedError
+    immediately instead of piling more load onto a struggling upstream.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        max_queue_wait_seconds: float,
+        enabled: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_hold_seconds = 1.0
+
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.queued = 0
+        self.max_queue_depth_seen = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _publish(self) -> None:
+        metrics.GOVERNOR_IN_FLIGHT.set(self._in_flight)
+        metrics.GOVERNOR_QUEUE_DEPTH.set(self.queue_depth)
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up, for the Retry-After header."""
+        estimate = self._avg_hold_seconds * (self.queue_depth + 1) / max(self.max_concurrency, 1)
+        return min(max(1, math.ceil(estimate)), MAX_RETRY_AFTER_SECONDS)
+
+    async def acquire(self) -> None:
+        if not self.enabled:
+            return
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._in_flight += 1
+            self.admitted += 1
+            metrics.GOVERNOR_IN_FLIGHT.set(self._in_flight)
+            return
+        if self.queue_depth >= self.max_queue:
+            self.shed += 1
+            metrics.GOVERNOR_SHED.labels("queue_full").inc()
+            raise UpstreamSaturatedError("AI service is at capacity. Please try again shortly.", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self.queue_depth)
+        metrics.GOVERNOR_QUEUE_DEPTH.set(self.queue_depth)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_queue_wait_seconds)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            metrics.GOVERNOR_SHED.labels("timeout").inc()
+            raise UpstreamSaturatedError("AI service is busy. Please try again shortly.", self.retry_after())
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the caller went away
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            waited = time.monotonic() - started
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            metrics.GOVERNOR_QUEUE_WAIT.observe(waited)
+            self._publish()
+        self.admitted += 1
+
+    def release(self) -> None:
+        if not self.enabled:
+            return
+        # Hand the slot straight to the next live waiter so nobody can cut in line
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                metrics.GOVERNOR_QUEUE_DEPTH.set(self.queue_depth)
+                return
+        self._in_flight -= 1
+        metrics.GOVERNOR_IN_FLIGHT.set(self._in_flight)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            self._avg_hold_seconds += _HOLD_TIME_ALPHA * (held - self._avg_hold_seconds)
+            self.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": (self.total_wait_seconds / self.queued) if self.queued else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "avg_hold_seconds": self._avg_hold_seconds,
+        }
+
+
+upstream_governor = UpstreamGovernor(
+    max_concurrency=settings.UPSTREAM_MAX_CONCURRENCY,
+    max_queue=settings.UPSTREAM_MAX_QUEUE,
+    max_queue_wait_seconds=settings.UPSTREAM_MAX_QUEUE_WAIT_SECONDS,
+    enabled=settings.ENABLE_UPSTREAM_GOVERNOR,
+)
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.anthropic.com"
+# Any response proves the connection is alive; HEAD / is unauthenticated and bills nothing
+PING_METHOD = "HEAD"
+PING_PATH = "/"
+
+
+class UpstreamHttpClient:
+    """
+    The pooled httpx client AsyncAnthropic sends through.
+
+    `warm()` opens `prewarm_connections` connections up front (DNS, TCP and TLS paid at
+    start-up instead of by the first chat), and `run_keepalive()` pings the host every
+    `ping_interval` seconds while no real request has, so pooled connections neither
+    reach `keepalive_expiry` nor the server's idle timeout. An httpcore trace hook
+    counts new connections against requests sent, which gives the reuse ratio.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int,
+        max_keepalive: int,
+        keepalive_expiry: float,
+        http2: bool,
+        connect_timeout: float,
+        read_timeout: float,
+        write_timeout: float,
+        pool_timeout: float,
+        prewarm_connections: int,
+        ping_interval: float,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+        self.prewarm_connections = prewarm_connections
+        self.ping_interval = ping_interval
+        self._client: Optional[httpx.AsyncClient] = None
+        self._last_request = 0.0
+        self.requests = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.connections_opened = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = self._build()
+        return self._client
+
+    def _build(self) -> httpx.AsyncClient:
+        import httpx
+
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("UPSTREAM_HTTP2 is set but the h2 package is missing; using HTTP/1.1")
+                self.http2 = False
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                self.read_timeout, connect=self.connect_timeout, write=self.write_timeout, pool=self.pool_timeout
+            ),
+            event_hooks={"request": [self._on_request]},
+        )
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._trace
+        self._last_request = time.monotonic()
+        self.requests += 1
+        metrics.UPSTREAM_HTTP_REQUESTS.inc()
+
+    async def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        # httpcore reports each phase of a new connection; reused ones skip connect_tcp
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+            metrics.UPSTREAM_CONNECTIONS_OPENED.inc()
+
+    async def _ping(self) -> bool:
+        self.pings += 1
+        try:
+            await self.client.request(PING_METHOD, f"{self.base_url}{PING_PATH}", timeout=self.connect_timeout * 2)
+            return True
+        except Exception as error:
+            self.ping_failures += 1
+            logger.debug("Upstream keep-alive ping failed: %s", error)
+            return False
+
+    async def _ping_pool(self) -> int:
+        # Concurrent pings each need their own connection; HTTP/2 multiplexes them on one
+        count = 1 if self.http2 else max(self.prewarm_connections, 1)
+        results = await asyncio.gather(*(self._ping() for _ in range(count)))
+        return sum(results)
+
+    async def warm(self) -> int:
+        """Open up to `prewarm_connections` pooled connections. Returns how many pings succeeded."""
+        if self.prewarm_connections <= 0:
+            return 0
+        self.client  # build it first, so an h2 fallback is settled before counting
+        started = time.perf_counter()
+        warmed = await self._ping_pool()
+        logger.info(
+            "Pre-warmed %d upstream connection(s) to %s in %.0f ms",
+            warmed, self.base_url, (time.perf_counter() - started) * 1000,
+        )
+        return warmed
+
+    async def run_keepalive(self) -> None:
+        """Ping whenever the pool has sat idle for `ping_interval`; runs until cancelled."""
+        while True:
+            idle = time.monotonic() - self._last_request
+            if idle < self.ping_interval:
+                await asyncio.sleep(self.ping_interval - idle)
+                continue
+            await self._ping_pool()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "pings": self.pings,
+            "ping_failures": self.ping_failures,
+            "connections_opened": self.connections_opened,
+            "reuse_ratio": 1 - self.connections_opened / self.requests if self.requests else 0.0,
+        }
+
+
+upstream_http = UpstreamHttpClient(
+    base_url=settings.ANTHROPIC_BASE_URL or DEFAULT_BASE_URL,
+    max_connections=settings.UPSTREAM_POOL_MAX_CONNECTIONS,
+    max_keepalive=settings.UPSTREAM_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+    http2=settings.UPSTREAM_HTTP2,
+    connect_timeout=settings.UPSTREAM_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=settings.UPSTREAM_READ_TIMEOUT_SECONDS,
+    write_timeout=settings.UPSTREAM_WRITE_TIMEOUT_SECONDS,
+    pool_timeout=settings.UPSTREAM_POOL_TIMEOUT_SECONDS,
+    prewarm_connections=settings.UPSTREAM_PREWARM_CONNECTIONS,
+    ping_interval=settings.UPSTREAM_KEEPALIVE_PING_SECONDS,
+)
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, List, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.upstream_governor import MAX_RETRY_AFTER_SECONDS, UpstreamSaturatedError
+
+# Statuses worth another attempt: timeouts, conflicts, rate limits, server errors and
+# Anthropic's 529 "overloaded". Other 4xx mean the request itself is wrong.
+RETRYABLE_STATUSES = {408, 409, 429}
+RETRY_BUDGET_WINDOW_SECONDS = 10
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailableError(UpstreamSaturatedError):
+    """Anthropic is failing or rate limiting us; maps to 503 with Retry-After."""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Raised without calling Anthropic while the model's circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    import anthropic  # already loaded by the client that raised `error`
+
+    if isinstance(error, (anthropic.APIConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUSES or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The delay requested by the upstream's retry-after(-ms) header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    millis = headers.get("retry-after-ms")
+    if millis:
+        try:
+            return max(0.0, float(millis) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Full-jitter exponential backoff for the `attempt`-th retry (1-based), never
+    shorter than what the upstream asked for.
+    """
+    ceiling = min(settings.UPSTREAM_BACKOFF_MAX_SECONDS, settings.UPSTREAM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class RetryBudget:
+    """
+    Caps retries at `ratio` of the requests seen in the last few seconds (with a small
+    floor for quiet periods), so a brownout can't multiply upstream load by the
+    per-request attempt count.
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window_seconds: int = RETRY_BUDGET_WINDOW_SECONDS) -> None:
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._buckets: Deque[List[int]] = deque()  # [second, requests, retries]
+        self.denied = 0
+
+    def _current(self) -> List[int]:
+        now = int(time.monotonic())
+        while self._buckets and self._buckets[0][0] <= now - self.window_seconds:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+        return self._buckets[-1]
+
+    def record_request(self) -> None:
+        self._current()[1] += 1
+
+    def try_acquire(self) -> bool:
+        """Spend one retry if the budget allows it."""
+        bucket = self._current()
+        requests = sum(entry[1] for entry in self._buckets)
+        retries = sum(entry[2] for entry in self._buckets)
+        if retries >= max(self.min_retries, self.ratio * requests):
+            self.denied += 1
+            metrics.UPSTREAM_RETRIES_DENIED.inc()
+            return False
+        bucket[2] += 1
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        self._current()
+        return {
+            "requests": sum(entry[1] for entry in self._buckets),
+            "retries": sum(entry[2] for entry in self._buckets),
+            "denied": self.denied,
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures; while open, calls
+    fail fast with CircuitOpenError. After `reset_seconds` up to `half_open_probes`
+    calls are let through per interval: one success closes the circuit, a failure
+    re-opens it. A probe that never reports back just lets the next interval probe again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float, half_open_probes: int = 1) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_window_started = 0.0
+        self._probes_left = 0
+        self.short_circuited = 0
+        self.opened = 0
+        metrics.UPSTREAM_CIRCUIT_STATE.labels(name).set(0)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.UPSTREAM_CIRCUIT_STATE.labels(self.name).set(metrics.CIRCUIT_STATES.index(state))
+
+    def retry_after(self) -> int:
+        remaining = self._opened_at + self.reset_seconds - time.monotonic()
+        return min(max(1, math.ceil(remaining)), MAX_RETRY_AFTER_SECONDS)
+
+    def before_call(self) -> None:
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.reset_seconds:
+            self._set_state(HALF_OPEN)
+            self._probe_window_started = now
+            self._probes_left = self.half_open_probes
+        if self.state == HALF_OPEN:
+            if now - self._probe_window_started >= self.reset_seconds:
+                self._probe_window_started = now
+                self._probes_left = self.half_open_probes
+            if self._probes_left > 0:
+                self._probes_left -= 1
+                return
+        self.short_circuited += 1
+        metrics.UPSTREAM_SHORT_CIRCUITS.labels(self.name).inc()
+        raise CircuitOpenError("AI service is temporarily unavailable. Please try again shortly.", self.retry_after())
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+                metrics.UPSTREAM_CIRCUIT_OPENS.labels(self.name).inc()
+                self._set_state(OPEN)
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+def unavailable_error(error: BaseException, breaker: Optional[CircuitBreaker]) -> UpstreamUnavailableError:
+    """The 503 to surface once retryable failures have used up their attempts."""
+    if breaker is not None and breaker.state == OPEN:
+        retry_after = breaker.retry_after()
+    else:
+        retry_after = min(max(1, math.ceil(retry_after_seconds(error) or 1)), MAX_RETRY_AFTER_SECONDS)
+    return UpstreamUnavailableError("AI service is temporarily unavailable. Please try again shortly.", retry_after)
+
+
+class CircuitBreakers:
+    """One breaker per model, so a failing model doesn't block the others."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, half_open_probes: int, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, model: str) -> Optional[CircuitBreaker]:
+        if not self.enabled:
+            return None
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers[model] = CircuitBreaker(
+                model, self.failure_threshold, self.reset_seconds, self.half_open_probes
+            )
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {model: breaker.stats() for model, breaker in self._breakers.items()}
+
+
+retry_budget = RetryBudget(
+    ratio=settings.UPSTREAM_RETRY_BUDGET_RATIO,
+    min_retries=settings.UPSTREAM_RETRY_BUDGET_MIN_RETRIES,
+)
+
+circuit_breakers = CircuitBreakers(
+    failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    reset_seconds=settings.CIRCUIT_BREAKER_RESET_SECONDS,
+    half_open_probes=settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+    enabled=settings.ENABLE_CIRCUIT_BREAKER,
+)
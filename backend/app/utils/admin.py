@@ -0,0 +1,14 @@
+import hmac
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+def require_admin(x_admin_token: Optional[str]) -> None:
+    """Reject the request unless it carries the admin token (BACKUP_API_KEY) in X-Admin-Token."""
+    if not settings.BACKUP_API_KEY or not x_admin_token or not hmac.compare_digest(
+        x_admin_token.encode("utf-8"), settings.BACKUP_API_KEY.encode("utf-8")
+    ):
+        raise HTTPException(status_code=401, detail="Unauthorized")
@@ -1,16 +1,20 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 from fastapi import Depends, HTTPException, Header
-import firebase_admin
-from firebase_admin import auth as fb_auth, credentials
+from starlette.concurrency import run_in_threadpool
+import jwt
 import os
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+from app.core.config import settings
+from app.utils.token_verifier import ClaimsCache, firebase_token_verifier
+
 logger = logging.getLogger(__name__)
 
 _initialized = False
 
+# Verified claims by token digest, valid until each token's own exp
+claims_cache = ClaimsCache(max_entries=settings.AUTH_CLAIMS_CACHE_MAX_ENTRIES)
+
 
 def _ensure_initialized() -> None:
     """
@@ -32,6 +36,10 @@ def _ensure_initialized() -> None:
         _initialized = True
         return
     
+    # Imported here: the Admin SDK is slow to import and many deployments never need it
+    import firebase_admin
+    from firebase_admin import credentials
+
     try:
         if not firebase_admin._apps:
             cred: Optional[credentials.Base] = None
@@ -43,9 +51,9 @@ def _ensure_initialized() -> None:
                 if os.path.exists(credentials_path):
                     cred = credentials.Certificate(credentials_path)
                     cred_source = f"Service Account Key: {credentials_path}"
-                    logger.info(f"🔥 Using Firebase service account key: {credentials_path}")
+                    logger.info("🔥 Using Firebase service account key: %s", credentials_path)
                 else:
-                    logger.error(f"🔥 Firebase service account key file not found: {credentials_path}")
+                    logger.error("🔥 Firebase service account key file not found: %s", credentials_path)
                     raise FileNotFoundError(f"Service account key file not found: {credentials_path}")
             else:
                 # Fall back to Application Default Credentials
@@ -54,18 +62,18 @@ def _ensure_initialized() -> None:
                     cred_source = "Application Default Credentials"
                     logger.info("🔥 Using Firebase Application Default Credentials")
                 except Exception as adc_error:
-                    logger.error(f"🔥 Failed to initialize Application Default Credentials: {adc_error}")
+                    logger.error("🔥 Failed to initialize Application Default Credentials: %s", adc_error)
                     raise adc_error
             
             # Initialize Firebase Admin SDK
             firebase_admin.initialize_app(cred)
-            logger.info(f"🔥 Firebase Admin SDK initialized successfully")
-            logger.info(f"   Credential source: {cred_source}")
+            logger.info("🔥 Firebase Admin SDK initialized successfully")
+            logger.info("   Credential source: %s", cred_source)
             
         _initialized = True
         
     except Exception as exc:
-        logger.error(f"🔥 Critical Firebase Admin SDK initialization error: {exc}")
+        logger.error("🔥 Critical Firebase Admin SDK initialization error: %s", exc)
         logger.error("   This will prevent backend authentication from working")
         logger.error("   Troubleshooting steps:")
         logger.error("   1. Verify GOOGLE_APPLICATION_CREDENTIALS path is correct")
@@ -81,29 +89,36 @@ def _ensure_initialized() -> None:
             )
 
 
-def verify_bearer_token(authorization: Optional[str] = Header(default=None, alias="Authorization")) -> str:
+def _auth_disabled() -> bool:
+    return os.getenv("DISABLE_FIREBASE_AUTH", "false").lower() == "true"
+
+
+def firebase_auth_enabled() -> bool:
     """
-    Verify Firebase ID token from Authorization header.
-    Returns the user email if valid, else raises 401.
-    
-    Args:
-        authorization: The Authorization header containing "Bearer <token>"
-        
-    Returns:
-        str: The verified user's email address
-        
-    Raises:
-        HTTPException: 401 if token is missing, invalid, or verification fails
+    Auth is on and a project is configured, so pre-fetching signing keys is worth it.
+    With Application Default Credentials alone, keys are fetched on the first token.
     """
-    _ensure_initialized()
-    
-    # Development mode bypass
-    if os.getenv("DISABLE_FIREBASE_AUTH", "false").lower() == "true":
-        fake_email = os.getenv("DEV_FAKE_USER_EMAIL", "dev@example.com")
-        logger.info(f"🔥 Using fake user for development: {fake_email}")
-        return fake_email
+    return not _auth_disabled() and bool(settings.FIREBASE_PROJECT_ID or os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+
+
+def _dev_user_email() -> str:
+    return os.getenv("DEV_FAKE_USER_EMAIL", "dev@example.com")
+
+
+def firebase_project_id() -> Optional[str]:
+    """Project whose ID tokens we accept: explicit setting first, else the Admin SDK app's."""
+    if settings.FIREBASE_PROJECT_ID:
+        return settings.FIREBASE_PROJECT_ID
+    import firebase_admin
 
-    # Validate Authorization header format
+    try:
+        return firebase_admin.get_app().project_id
+    except (ValueError, AttributeError):
+        return None
+
+
+def _extract_token(authorization: Optional[str]) -> str:
+    """Validate the Authorization header format and return the bearer token."""
     if not authorization:
         logger.warning("🔥 Authentication failed: Missing Authorization header")
         raise HTTPException(
@@ -112,37 +127,64 @@ def verify_bearer_token(authorization: Optional[str] = Header(default=None, alia
         )
     
     if not authorization.startswith("Bearer "):
-        logger.warning(f"🔥 Authentication failed: Invalid Authorization header format")
+        logger.warning("🔥 Authentication failed: Invalid Authorization header format")
         raise HTTPException(
             status_code=401, 
             detail="Invalid Authorization header format. Expected: 'Bearer <firebase_id_token>'"
         )
     
-    # Extract token
     token = authorization.split(" ", 1)[1]
     if not token:
         logger.warning("🔥 Authentication failed: Empty token")
         raise HTTPException(status_code=401, detail="Empty token")
+    return token
+
+
+def _email_from_claims(decoded: Dict[str, Any]) -> str:
+    email = decoded.get("email")
+    if not email:
+        logger.warning("🔥 Authentication failed: Token missing email (uid: %s)", decoded.get("uid"))
+        raise HTTPException(
+            status_code=401, 
+            detail="Token is valid but missing email. Ensure email is verified in Firebase."
+        )
+    logger.debug("🔥 Authentication successful: %s", email)
+    return email
+
+
+def verify_bearer_token(authorization: Optional[str] = Header(default=None, alias="Authorization")) -> str:
+    """
+    Verify Firebase ID token from Authorization header.
+    Returns the user email if valid, else raises 401.
+    Previously verified tokens are served from `claims_cache` until they expire.
     
+    Args:
+        authorization: The Authorization header containing "Bearer <token>"
+        
+    Returns:
+        str: The verified user's email address
+        
+    Raises:
+        HTTPException: 401 if token is missing, invalid, or verification fails
+    """
+    _ensure_initialized()
+    
+    # Development mode bypass
+    if _auth_disabled():
+        return _dev_user_email()
+
+    token = _extract_token(authorization)
+    cached = claims_cache.get(token)
+    if cached is not None:
+        return _email_from_claims(cached)
+    
+    from firebase_admin import auth as fb_auth
+
     # Verify Firebase ID token
     try:
         logger.debug("🔥 Verifying Firebase ID token...")
         decoded = fb_auth.verify_id_token(token)
         
-        # Extract user information
-        email = decoded.get("email")
-        uid = decoded.get("uid")
-        
-        if not email:
-            logger.warning(f"🔥 Authentication failed: Token missing email (uid: {uid})")
-            raise HTTPException(
-                status_code=401, 
-                detail="Token is valid but missing email. Ensure email is verified in Firebase."
-            )
-        
-        logger.info(f"🔥 Authentication successful: {email}")
-        return email
-        
     except fb_auth.ExpiredIdTokenError:
         logger.warning("🔥 Authentication failed: Token expired")
         raise HTTPException(status_code=401, detail="Token has expired. Please sign in again.")
@@ -152,11 +194,51 @@ def verify_bearer_token(authorization: Optional[str] = Header(default=None, alia
         raise HTTPException(status_code=401, detail="Token has been revoked. Please sign in again.")
         
     except fb_auth.InvalidIdTokenError as e:
-        logger.warning(f"🔥 Authentication failed: Invalid token - {str(e)}")
+        logger.warning("🔥 Authentication failed: Invalid token - %s", e)
         raise HTTPException(status_code=401, detail="Invalid token format or signature.")
         
     except Exception as e:
-        logger.error(f"🔥 Authentication error: Unexpected error during token verification - {str(e)}")
+        logger.error("🔥 Authentication error: Unexpected error during token verification - %s", e)
         raise HTTPException(status_code=401, detail="Token verification failed.")
 
+    claims_cache.set(token, decoded)
+    return _email_from_claims(decoded)
+
+
+async def verify_bearer_token_async(authorization: Optional[str] = Header(default=None, alias="Authorization")) -> str:
+    """
+    Async variant of `verify_bearer_token` that does not occupy a threadpool slot.
+    Tokens are verified locally against background-refreshed signing certificates;
+    if the Firebase project id is unknown it falls back to the Admin SDK in a thread.
+    """
+    _ensure_initialized()
+
+    if _auth_disabled():
+        return _dev_user_email()
+
+    token = _extract_token(authorization)
+    cached = claims_cache.get(token)
+    if cached is not None:
+        return _email_from_claims(cached)
+
+    project_id = firebase_project_id()
+    if project_id is None:
+        return await run_in_threadpool(verify_bearer_token, authorization)
+
+    try:
+        decoded = await firebase_token_verifier.verify(token, project_id)
+
+    except jwt.ExpiredSignatureError:
+        logger.warning("🔥 Authentication failed: Token expired")
+        raise HTTPException(status_code=401, detail="Token has expired. Please sign in again.")
+
+    except jwt.InvalidTokenError as e:
+        logger.warning("🔥 Authentication failed: Invalid token - %s", e)
+        raise HTTPException(status_code=401, detail="Invalid token format or signature.")
+
+    except Exception as e:
+        logger.error("🔥 Authentication error: Unexpected error during token verification - %s", e)
+        raise HTTPException(status_code=401, detail="Token verification failed.")
 
+    claims_cache.set(token, decoded)
+    return _email_from_claims(decoded)
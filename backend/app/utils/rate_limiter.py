@@ -1,50 +1,225 @@
-from __future__ import annotations
-
-import time
 import asyncio
-from typing import Dict, Tuple
+import math
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException, Request
 from app.core.config import settings
+from app.core.metrics import RATE_LIMIT_REJECTIONS
 
 
-class InMemoryRateLimiter:
+def _sliding_window_check(
+    now: float,
+    window_seconds: int,
+    limit: int,
+    window_start: float,
+    current: int,
+    previous: int,
+) -> Tuple[bool, float, float, int, int]:
     """
-    Extremely simple per-IP fixed-window rate limiter.
-    Not suitable for multi-process or multi-instance deployments.
-    Replace with Redis-backed limiter for production.
+    Sliding window counter: the previous fixed window's count is weighted by how much
+    of it still overlaps the sliding window, which removes the 2x burst a fixed window
+    allows at its edges while keeping O(1) state per key.
+
+    Returns (allowed, retry_after_seconds, window_start, current, previous) with the
+    counters already advanced for this hit when it is allowed.
     """
+    current_start = now - (now % window_seconds)
+    if window_start != current_start:
+        previous = current if window_start == current_start - window_seconds else 0
+        current = 0
+        window_start = current_start
 
-    def __init__(self, max_requests_per_minute: int) -> None:
-        self.max_requests = max_requests_per_minute
-        self.window_seconds = 60
-        self.ip_to_window: Dict[str, Tuple[int, int]] = {}
-        self._lock = asyncio.Lock()
+    elapsed = now - current_start
+    overlap = 1.0 - elapsed / window_seconds
+    estimated = previous * overlap + current
+    if estimated + 1 <= limit:
+        return True, 0.0, window_start, current + 1, previous
+
+    if current + 1 > limit or previous == 0:
+        retry_after = window_seconds - elapsed
+    else:
+        # Time until the weighted previous window has decayed enough for one more hit
+        needed_overlap = (limit - current - 1) / previous
+        retry_after = (1.0 - needed_overlap) * window_seconds - elapsed
+    return False, max(retry_after, 0.0), window_start, current, previous
+
+
+class RateLimitBackend:
+    """Storage for sliding-window counters. `hit` records one request if allowed."""
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, float]:
+        raise NotImplementedError
+
+
+@dataclass
+class _WindowState:
+    window_start: float
+    current: int
+    previous: int
+
+
+class _Shard:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.states: Dict[str, _WindowState] = {}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process counters split across shards, each with its own lock and dict, so
+    unrelated keys never contend. Keys idle for two windows are evicted by a sweep
+    that visits one shard at a time every `sweep_interval_seconds`.
+    Limits are per worker process; use the SQLite backend for `--workers N`.
+    """
+
+    def __init__(self, shards: int = 16, sweep_interval_seconds: float = 10.0) -> None:
+        self._shards: List[_Shard] = [_Shard() for _ in range(shards)]
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._next_sweep = time.monotonic() + sweep_interval_seconds
+        self._sweep_cursor = 0
+        self.evicted = 0
+
+    def _shard_for(self, key: str) -> _Shard:
+        return self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, float]:
+        now = time.time()
+        shard = self._shard_for(key)
+        with shard.lock:
+            state = shard.states.get(key)
+            if state is None:
+                state = _WindowState(window_start=0.0, current=0, previous=0)
+            allowed, retry_after, window_start, current, previous = _sliding_window_check(
+                now, window_seconds, limit, state.window_start, state.current, state.previous
+            )
+            state.window_start, state.current, state.previous = window_start, current, previous
+            shard.states[key] = state
+        self._maybe_sweep(now, window_seconds)
+        return allowed, retry_after
+
+    def _maybe_sweep(self, now: float, window_seconds: int) -> None:
+        if time.monotonic() < self._next_sweep:
+            return
+        self._next_sweep = time.monotonic() + self.sweep_interval_seconds
+        shard = self._shards[self._sweep_cursor]
+        self._sweep_cursor = (self._sweep_cursor + 1) % len(self._shards)
+        cutoff = now - 2 * window_seconds
+        with shard.lock:
+            idle = [key for key, state in shard.states.items() if state.window_start < cutoff]
+            for key in idle:
+                del shard.states[key]
+        self.evicted += len(idle)
+
+    def __len__(self) -> int:
+        return sum(len(shard.states) for shard in self._shards)
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Counters in a small SQLite database in WAL mode that every worker process opens,
+    so limits hold across `uvicorn --workers N` on one host. Each hit is one
+    `BEGIN IMMEDIATE` transaction run off the event loop; idle rows are deleted every
+    `sweep_interval_seconds`.
+    """
+
+    def __init__(self, path: str, sweep_interval_seconds: float = 60.0) -> None:
+        self.path = path
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._next_sweep = time.monotonic() + sweep_interval_seconds
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " key TEXT PRIMARY KEY,"
+                " window_start REAL NOT NULL,"
+                " current INTEGER NOT NULL,"
+                " previous INTEGER NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
 
-    async def allow(self, ip: str) -> bool:
-        now = int(time.time())
-        window_start = now - (now % self.window_seconds)
+    def _hit_sync(self, key: str, limit: int, window_seconds: int, sweep: bool) -> Tuple[bool, float]:
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT window_start, current, previous FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            window_start, current, previous = row if row else (0.0, 0, 0)
+            allowed, retry_after, window_start, current, previous = _sliding_window_check(
+                now, window_seconds, limit, window_start, current, previous
+            )
+            connection.execute(
+                "INSERT INTO rate_limits (key, window_start, current, previous) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET window_start = excluded.window_start, "
+                "current = excluded.current, previous = excluded.previous",
+                (key, window_start, current, previous),
+            )
+            if sweep:
+                connection.execute(
+                    "DELETE FROM rate_limits WHERE window_start < ?", (now - 2 * window_seconds,)
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
 
-        async with self._lock:
-            count, start = self.ip_to_window.get(ip, (0, window_start))
+    async def hit(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, float]:
+        sweep = time.monotonic() >= self._next_sweep
+        if sweep:
+            self._next_sweep = time.monotonic() + self.sweep_interval_seconds
+        return await asyncio.to_thread(self._hit_sync, key, limit, window_seconds, sweep)
 
-            if start != window_start:
-                # new window
-                count, start = 0, window_start
 
-            if count >= self.max_requests:
-                return False
+def _create_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimitBackend(settings.RATE_LIMIT_SQLITE_PATH)
+    return MemoryRateLimitBackend(shards=settings.RATE_LIMIT_SHARDS)
 
-            self.ip_to_window[ip] = (count + 1, start)
-            return True
 
+backend = _create_backend()
 
-limiter = InMemoryRateLimiter(settings.RATE_LIMIT_PER_MINUTE)
 
+class RateLimit:
+    """
+    Per-route, per-IP rate limit dependency, e.g. `Depends(RateLimit("chat", 30))`.
+    Each scope has its own counters, so a busy chat user does not exhaust their
+    newsletter or mentoring allowance.
+    """
+
+    def __init__(self, scope: str, max_requests_per_minute: Optional[int] = None) -> None:
+        self.scope = scope
+        self.max_requests = max_requests_per_minute or settings.RATE_LIMIT_PER_MINUTE
+        self.window_seconds = 60
 
-async def rate_limit(request: Request) -> None:
-    client_ip = request.client.host if request.client else "unknown"
-    allowed = await limiter.allow(client_ip)
-    if not allowed:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded. Please try again later.")
+    async def __call__(self, request: Request) -> None:
+        client_ip = request.client.host if request.client else "unknown"
+        allowed, retry_after = await backend.hit(
+            f"{self.scope}:{client_ip}", self.max_requests, self.window_seconds
+        )
+        if not allowed:
+            RATE_LIMIT_REJECTIONS.labels(self.scope).inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
 
 
+rate_limit = RateLimit("default")
+chat_rate_limit = RateLimit("chat", settings.RATE_LIMIT_CHAT_PER_MINUTE)
+mentoring_rate_limit = RateLimit("mentoring", settings.RATE_LIMIT_MENTORING_PER_MINUTE)
+newsletter_rate_limit = RateLimit("newsletter", settings.RATE_LIMIT_NEWSLETTER_PER_MINUTE)
+chat_batch_rate_limit = RateLimit("chat_batch", settings.RATE_LIMIT_CHAT_BATCH_PER_MINUTE)
@@ -0,0 +1,9 @@
+def is_permanent(error: Exception) -> bool:
+    """5xx replies (bad mailbox, rejected content) won't succeed on retry; 4xx and disconnects might."""
+    import aiosmtplib
+
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(refused.code >= 500 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code >= 500
+    return False
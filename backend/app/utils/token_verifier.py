@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+)
+DEFAULT_CERT_MAX_AGE_SECONDS = 3600
+# Refresh this long before the certificates' max-age runs out
+CERT_REFRESH_MARGIN_SECONDS = 300
+CLOCK_SKEW_SECONDS = 60
+MAX_UID_LENGTH = 128
+# The refresher retries a failed fetch after this long, doubling up to the maximum
+REFRESH_RETRY_SECONDS = 30
+REFRESH_RETRY_MAX_SECONDS = 900
+# Unknown key ids trigger a refresh at most this often, so forged headers can't hammer Google
+MIN_REFRESH_INTERVAL_SECONDS = 60
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def token_cache_key(token: str) -> str:
+    """Cache tokens by digest so raw bearer tokens never sit in memory as dict keys."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class ClaimsCache:
+    """
+    Bounded LRU cache of verified token claims, keyed by token digest.
+    An entry is only served until the token's own `exp`, so caching never extends
+    a token's lifetime.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = token_cache_key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+        key = token_cache_key(token)
+        self._entries[key] = (claims, float(expires_at))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def _parse_max_age(cache_control: Optional[str]) -> int:
+    match = _MAX_AGE_RE.search(cache_control or "")
+    return int(match.group(1)) if match else DEFAULT_CERT_MAX_AGE_SECONDS
+
+
+class PublicKeyCache:
+    """
+    Google's Firebase ID token signing keys, cached for the max-age the endpoint
+    advertises. `run_refresher` keeps them fresh in the background so verification
+    never waits on a certificate fetch in the common case.
+    """
+
+    def __init__(self, url: str = FIREBASE_CERTS_URL) -> None:
+        self.url = url
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._refreshed_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.refreshes = 0
+
+    @property
+    def fresh(self) -> bool:
+        return bool(self._keys) and time.time() < self._expires_at
+
+    def _needs_refresh(self, kid: str) -> bool:
+        if not self.fresh:
+            return True
+        return kid not in self._keys and time.time() - self._refreshed_at >= MIN_REFRESH_INTERVAL_SECONDS
+
+    def _install(self, response: httpx.Response) -> None:
+        response.raise_for_status()
+        keys = {
+            kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in response.json().items()
+        }
+        self._keys = keys
+        self._refreshed_at = time.time()
+        self._expires_at = self._refreshed_at + _parse_max_age(response.headers.get("Cache-Control"))
+        self.refreshes += 1
+
+    async def refresh(self) -> None:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            self._install(await client.get(self.url))
+
+    def refresh_sync(self) -> None:
+        with httpx.Client(timeout=10.0) as client:
+            self._install(client.get(self.url))
+
+    async def get_key(self, kid: str) -> Any:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if self._needs_refresh(kid):
+            async with self._lock:
+                # Another request may have refreshed while we waited
+                if self._needs_refresh(kid):
+                    await self.refresh()
+        return self._keys.get(kid)
+
+    def get_key_sync(self, kid: str) -> Any:
+        if self._needs_refresh(kid):
+            self.refresh_sync()
+        return self._keys.get(kid)
+
+    async def run_refresher(self) -> None:
+        """Background loop that refreshes the keys shortly before they expire."""
+        retry = REFRESH_RETRY_SECONDS
+        while True:
+            delay = max(self._expires_at - time.time() - CERT_REFRESH_MARGIN_SECONDS, 0)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+                retry = REFRESH_RETRY_SECONDS
+            except Exception as error:
+                logger.warning("Refreshing Firebase signing certificates failed, retrying in %ds: %s", retry, error)
+                await asyncio.sleep(retry)
+                retry = min(retry * 2, REFRESH_RETRY_MAX_SECONDS)
+
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens locally with PyJWT using cached signing keys,
+    applying the same checks as firebase_admin.auth.verify_id_token.
+    """
+
+    def __init__(self, keys: PublicKeyCache) -> None:
+        self.keys = keys
+
+    def _decode(self, token: str, key: Any, project_id: str) -> Dict[str, Any]:
+        if key is None:
+            raise jwt.InvalidTokenError("Token was signed with an unknown key")
+        claims = jwt.decode(
+            token,
+            key=key,
+            algorithms=["RS256"],
+            audience=project_id,
+            issuer=f"https://securetoken.google.com/{project_id}",
+            leeway=CLOCK_SKEW_SECONDS,
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        # PyJWT does not check these against the clock; Firebase's verifier does
+        now = time.time()
+        for claim in ("iat", "auth_time"):
+            if claim not in claims:
+                continue  # iat is required above; auth_time is optional
+            value = claims[claim]
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise jwt.InvalidTokenError(f"Token has an invalid {claim}")
+            if value > now + CLOCK_SKEW_SECONDS:
+                raise jwt.ImmatureSignatureError(f"Token {claim} is in the future")
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject:
+            raise jwt.InvalidTokenError("Token has an empty subject")
+        if len(subject) > MAX_UID_LENGTH:
+            raise jwt.InvalidTokenError("Token subject is longer than 128 characters")
+        claims.setdefault("uid", claims["sub"])
+        return claims
+
+    @staticmethod
+    def _kid(token: str) -> str:
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise jwt.InvalidTokenError("Token header is not a Firebase ID token header")
+        return header["kid"]
+
+    async def verify(self, token: str, project_id: str) -> Dict[str, Any]:
+        kid = self._kid(token)
+        return self._decode(token, await self.keys.get_key(kid), project_id)
+
+    def verify_sync(self, token: str, project_id: str) -> Dict[str, Any]:
+        kid = self._kid(token)
+        return self._decode(token, self.keys.get_key_sync(kid), project_id)
+
+
+firebase_public_keys = PublicKeyCache()
+firebase_token_verifier = FirebaseTokenVerifier(firebase_public_keys)
@@ -0,0 +1,66 @@
+"""
+Run background task workers apart from the web process:
+
+    cd backend
+    python -m app.worker --workers 4
+
+Point it at the same DATABASE_URL as the API and set TASK_QUEUE_WORKERS=0 there if the
+web process should only enqueue. Several worker processes can share one database.
+Stops on SIGINT/SIGTERM, giving running tasks TASK_QUEUE_SHUTDOWN_GRACE_SECONDS.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+
+from app.core.config import settings
+from app.core.logging_config import configure_logging
+
+logger = logging.getLogger("app.worker")
+
+
+async def serve(workers: int) -> None:
+    from app.database import async_engine
+    from app.services import notifications  # noqa: F401 - registers the task handlers
+    from app.services.task_queue import task_queue
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C cancels the run instead
+
+    task_queue.start(workers)
+    logger.info("Running %d background task worker(s) for: %s", workers, ", ".join(task_queue.stats()["handlers"]))
+    try:
+        await stop.wait()
+    finally:
+        await task_queue.close()
+        await async_engine.dispose()
+        logger.info("Background task workers stopped: %s", task_queue.stats())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.TASK_QUEUE_WORKERS or 2)
+    parser.add_argument("--poll-seconds", type=float, default=settings.TASK_QUEUE_POLL_SECONDS)
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLE_PER_SECOND)
+    from app.services.task_queue import task_queue
+
+    task_queue.poll_seconds = args.poll_seconds
+    try:
+        asyncio.run(serve(args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Full-text search latency over mentee applications (SQLite FTS5, bm25 ranking).
+
+Seeds a throwaway SQLite file with synthetic applications, then times the search
+used by GET /mentoring/admin/applications/search:
+
+    cd backend
+    python -m benchmarks.application_search --rows 100000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+_workdir = tempfile.mkdtemp(prefix="search-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, update  # noqa: E402
+
+from app.database import AsyncSessionLocal, Base, async_engine, engine  # noqa: E402
+from app.models.mentee_application import MenteeApplication  # noqa: E402
+from app.services import application_search  # noqa: E402
+
+_TOPICS = (
+    "python machine learning frontend backend react career product design data engineering "
+    "leadership startup cloud kubernetes security mobile android ios research writing public "
+    "speaking interviews portfolio open source distributed systems databases analytics growth "
+    "mentorship transition bootcamp university graduate manager architecture testing devops"
+).split()
+# The last two end on a partially typed word, which takes the prefix snippet path
+QUERIES = ["machine learning", "kubernetes", "career transition", "react front", "distributed systems datab"]
+
+
+def _vocabulary(rng: random.Random, size: int = 20000) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def _paragraph(rng: random.Random, vocabulary: list, cum_weights: list, words: int) -> str:
+    # Zipf-distributed filler so term frequencies look like real prose; topic words are
+    # rarer, so a topic query matches a minority of rows like a real one would
+    text = rng.choices(vocabulary, cum_weights=cum_weights, k=words)
+    for _ in range(max(1, words // 15)):
+        text[rng.randrange(words)] = rng.choice(_TOPICS)
+    return " ".join(text)
+
+
+def _seed(rows: int) -> float:
+    rng = random.Random(7)
+    vocabulary = _vocabulary(rng)
+    cum_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        batch = []
+        for i in range(rows):
+            batch.append(
+                {
+                    "user_email": f"applicant{i}@example.com",
+                    "full_name": f"Applicant {i}",
+                    "goals": _paragraph(rng, vocabulary, cum_weights, 30),
+                    "background": _paragraph(rng, vocabulary, cum_weights, 40),
+                    "areas": _paragraph(rng, vocabulary, cum_weights, 6),
+                    "expectations": _paragraph(rng, vocabulary, cum_weights, 20),
+                    "status": rng.choice(["pending", "accepted", "rejected"]),
+                }
+            )
+            if len(batch) == 5000:
+                connection.execute(insert(MenteeApplication), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(MenteeApplication), batch)
+    return time.perf_counter() - started
+
+
+async def _time_query(query: str, repeats: int, status=None):
+    terms = application_search.parse_terms(query)
+    first_page, second_page = [], []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            hits, cursor = await application_search.search_applications(db, terms, 20, status=status)
+            first_page.append((time.perf_counter() - started) * 1000)
+            if cursor:
+                started = time.perf_counter()
+                await application_search.search_applications(
+                    db, terms, 20, status=status, cursor=application_search.decode_cursor(cursor)
+                )
+                second_page.append((time.perf_counter() - started) * 1000)
+    return first_page, second_page
+
+
+def _summary(samples) -> str:
+    if not samples:
+        return "      n/a"
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"p50 {statistics.median(ordered):6.1f}ms  p95 {p95:6.1f}ms"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    await application_search.ensure_search_index(async_engine)
+    seconds = _seed(args.rows)
+    print(f"seeded {args.rows} rows (FTS kept in sync by triggers) in {seconds:.1f}s")
+
+    for query in QUERIES:
+        first, second = await _time_query(query, args.repeats)
+        print(f"{query!r:34} page 1: {_summary(first)}   page 2: {_summary(second)}")
+    first, _ = await _time_query("python", args.repeats, status="accepted")
+    print(f"{'python [status=accepted]':34} page 1: {_summary(first)}")
+
+    # Status changes re-index through the update trigger
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(MenteeApplication).where(MenteeApplication.id <= 1000).values(status="accepted"))
+        await db.commit()
+    print(f"1000 status updates with trigger re-index: {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    await async_engine.dispose()
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
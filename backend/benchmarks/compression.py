@@ -0,0 +1,161 @@
+"""
+Compression benchmark: time to first token and bytes on the wire per encoding.
+
+Runs the app under uvicorn against the local fake Anthropic upstream, then, for each
+Accept-Encoding, sends sequential requests to the plain-text chat stream, the NDJSON
+batch endpoint and the OpenAPI document (static JSON). Bodies are read raw and
+decoded here, so "ttft" is when the first decoded byte of the answer arrived, not
+the first compressed byte. Route policies are cleared, so the chat stream (sent
+uncompressed by default) is compressed too. A "legacy" row runs the same app with
+Starlette's GZipMiddleware(minimum_size=1024) in place of CompressionMiddleware:
+
+    cd backend
+    python -m benchmarks.compression
+    python -m benchmarks.compression --requests 50 --tokens-per-second 40
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fake_anthropic import add_profile_arguments, profile_from_arguments, profile_to_arguments
+from benchmarks.load_test import _app_environment, _free_port, _start, _stop, _wait_ready
+from app.core.compression import brotli, zstandard
+
+SCENARIOS = ("stream", "batch", "openapi")
+
+
+def legacy_app():
+    """uvicorn --factory target: the app with the GZipMiddleware it used to have."""
+    from fastapi.middleware.gzip import GZipMiddleware
+    from app.main import create_application
+
+    app = create_application()
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+    return app
+
+
+def _decoder(encoding: Optional[str]) -> Callable[[bytes], bytes]:
+    if encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    if encoding == "br":
+        return brotli.Decompressor().process
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj().decompress
+    return lambda data: data
+
+
+async def _measure(client: httpx.AsyncClient, method: str, url: str, accept: str, **kwargs) -> Tuple[float, float, int, int]:
+    """One request: (seconds to first decoded byte, total seconds, wire bytes, decoded bytes)."""
+    started = time.perf_counter()
+    first_byte = None
+    wire = decoded = 0
+    async with client.stream(method, url, headers={"Accept-Encoding": accept}, **kwargs) as response:
+        response.raise_for_status()
+        decode = _decoder(response.headers.get("content-encoding"))
+        async for raw in response.aiter_raw():
+            wire += len(raw)
+            text = decode(raw)
+            if text and first_byte is None:
+                first_byte = time.perf_counter() - started
+            decoded += len(text)
+    total = time.perf_counter() - started
+    return first_byte if first_byte is not None else total, total, wire, decoded
+
+
+async def _run_case(base_url: str, accept: str, scenario: str, requests: int, run_id: str) -> Dict[str, float]:
+    samples = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for i in range(requests):
+            # Distinct prompts, so response caches and stream coalescing stay out of it
+            if scenario == "stream":
+                sample = await _measure(
+                    client, "POST", "/api/v1/chat/stream", accept, json={"message": f"Plan my week ({run_id}-{i})"}
+                )
+            elif scenario == "batch":
+                prompts = [f"Tip {n} for a first mentoring call ({run_id}-{i})" for n in range(8)]
+                sample = await _measure(client, "POST", "/api/v1/chat/batch", accept, json={"prompts": prompts})
+            else:
+                sample = await _measure(client, "GET", "/api/v1/openapi.json", accept)
+            samples.append(sample)
+    return {
+        "ttft_ms": statistics.median(sample[0] for sample in samples) * 1000,
+        "total_ms": statistics.median(sample[1] for sample in samples) * 1000,
+        "wire_bytes": statistics.mean(sample[2] for sample in samples),
+        "body_bytes": statistics.mean(sample[3] for sample in samples),
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="sequential requests per encoding and scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+async def main() -> int:
+    args = _parse_args()
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    profile = profile_from_arguments(args)
+    encodings = ["identity", "gzip"] + (["br"] if brotli else []) + (["zstd"] if zstandard else [])
+    # (label, Accept-Encoding, uvicorn target, extra app settings)
+    cases: List[Tuple[str, str, List[str], List[str]]] = [
+        (encoding, encoding, ["app.main:app"], ["COMPRESSION_ROUTE_POLICIES="]) for encoding in encodings
+    ]
+    cases.append(("legacy gzip", "gzip", ["--factory", "benchmarks.compression:legacy_app"], ["ENABLE_COMPRESSION=false"]))
+
+    workdir = tempfile.mkdtemp(prefix="compression-")
+    upstream_port = _free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    upstream_log = os.path.join(workdir, "upstream.log")
+    upstream = _start(
+        [sys.executable, "-m", "benchmarks.fake_anthropic", "--port", str(upstream_port), *profile_to_arguments(profile)],
+        dict(os.environ), upstream_log,
+    )
+    results: Dict[Tuple[str, str], Dict[str, float]] = {}
+    try:
+        await _wait_ready(f"{upstream_url}/health", upstream, upstream_log)
+        for label, accept, target, overrides in cases:
+            app_port = _free_port()
+            app_log = os.path.join(workdir, "app.log")
+            app = _start(
+                [sys.executable, "-m", "uvicorn", *target, "--port", str(app_port), "--log-level", "warning", "--no-access-log"],
+                _app_environment(workdir, upstream_url, overrides), app_log,
+            )
+            try:
+                await _wait_ready(f"http://127.0.0.1:{app_port}/", app, app_log)
+                for scenario in names:
+                    run_id = f"{int(time.time())}{label[0]}"
+                    results[(label, scenario)] = await _run_case(
+                        f"http://127.0.0.1:{app_port}", accept, scenario, args.requests, run_id
+                    )
+            finally:
+                _stop(app)
+    finally:
+        _stop(upstream)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.requests} sequential requests per row; ttft/total are medians, bytes are means")
+    print(f"{'scenario':10} {'encoding':12} {'ttft':>10} {'total':>10} {'wire bytes':>11} {'body bytes':>11} {'ratio':>6}")
+    for scenario in names:
+        for label, *_ in cases:
+            result = results[(label, scenario)]
+            ratio = result["wire_bytes"] / result["body_bytes"] if result["body_bytes"] else 1.0
+            print(
+                f"{scenario:10} {label:12} {result['ttft_ms']:8.1f}ms {result['total_ms']:8.1f}ms "
+                f"{result['wire_bytes']:11.0f} {result['body_bytes']:11.0f} {ratio:6.2f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
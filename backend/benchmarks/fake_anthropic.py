@@ -0,0 +1,234 @@
+"""
+Local stand-in for the Anthropic Messages API, for load tests and benchmarks.
+
+Answers POST /v1/messages (plain and `stream: true`) with filler text after a
+configurable delay, at a configurable token rate and streaming chunk size, and fails
+a configurable share of requests with 529 "overloaded" (with retry-after). Prompt
+caching is emulated: prefixes ending at a `cache_control` block are remembered, and
+usage reports cache_read_input_tokens/cache_creation_input_tokens the way the real
+API does (no minimum prefix length, no TTL). Point the app at it with
+ANTHROPIC_BASE_URL:
+
+    cd backend
+    python -m benchmarks.fake_anthropic --port 9100 --latency-ms 300 --tokens-per-second 80
+    ANTHROPIC_BASE_URL=http://127.0.0.1:9100 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+@dataclass
+class UpstreamProfile:
+    latency_ms: float = 300.0  # before the response starts (time to first token)
+    tokens_per_second: float = 80.0  # 0 sends everything at once
+    chunk_tokens: int = 1  # tokens per content_block_delta
+    output_tokens: int = 120
+    error_rate: float = 0.0
+    error_status: int = 529
+    retry_after_seconds: float = 1.0
+
+
+_WORDS = "the quick mentor reviews your plan and suggests a clear next step for growth".split()
+
+
+def _tokens(count: int):
+    return [_WORDS[index % len(_WORDS)] + " " for index in range(count)]
+
+
+def _prompt_blocks(body: dict) -> List[Tuple[str, bool]]:
+    """The prompt as (serialized block, ends a cache breakpoint) pairs: system blocks, then messages."""
+    system = body.get("system") or []
+    blocks = [{"type": "text", "text": system}] if isinstance(system, str) else list(system)
+    pieces = [(block, None) for block in blocks]
+    for message in body.get("messages", []):
+        content = message.get("content")
+        content = [{"type": "text", "text": content}] if isinstance(content, str) else content or []
+        pieces.extend((block, message.get("role")) for block in content)
+    serialized = []
+    for block, role in pieces:
+        plain = {key: value for key, value in block.items() if key != "cache_control"}
+        serialized.append((json.dumps([role, plain]), "cache_control" in block))
+    return serialized
+
+
+def _input_usage(body: dict, cache: Set[bytes]) -> Dict[str, int]:
+    """
+    Input token usage for `body`, split like the API does: the longest remembered
+    breakpoint prefix is read from cache, everything up to the last breakpoint after it
+    is written, and the rest is uncached. Four characters count as a token.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    tokens = 0
+    breakpoints: List[Tuple[bytes, int]] = []
+    for text, breakpoint in _prompt_blocks(body):
+        digest.update(text.encode())
+        tokens += len(text) // 4
+        if breakpoint:
+            breakpoints.append((digest.copy().digest(), tokens))
+    total = max(1, tokens)
+    read = max((prefix_tokens for key, prefix_tokens in breakpoints if key in cache), default=0)
+    written = max((prefix_tokens for _, prefix_tokens in breakpoints), default=0) - read
+    cache.update(key for key, _ in breakpoints)
+    return {
+        "input_tokens": max(total - read - written, 0),
+        "cache_read_input_tokens": read,
+        "cache_creation_input_tokens": written,
+    }
+
+
+def _error(profile: UpstreamProfile) -> Response:
+    error_type = "overloaded_error" if profile.error_status == 529 else "api_error"
+    return JSONResponse(
+        {"type": "error", "error": {"type": error_type, "message": "Simulated upstream failure"}},
+        status_code=profile.error_status,
+        headers={"retry-after": str(profile.retry_after_seconds)},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(profile: UpstreamProfile) -> Starlette:
+    prompt_cache: Set[bytes] = set()
+
+    async def messages(request: Request) -> Response:
+        body = await request.json()
+        model = body.get("model", "claude-fake")
+        output_tokens = min(profile.output_tokens, int(body.get("max_tokens") or profile.output_tokens))
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+
+        if random.random() < profile.error_rate:
+            return _error(profile)
+        input_usage = _input_usage(body, prompt_cache)
+        await asyncio.sleep(profile.latency_ms / 1000)
+
+        tokens = _tokens(output_tokens)
+        if not body.get("stream"):
+            if profile.tokens_per_second > 0:
+                await asyncio.sleep(output_tokens / profile.tokens_per_second)
+            return JSONResponse(
+                {
+                    "id": message_id,
+                    "type": "message",
+                    "role": "assistant",
+                    "model": model,
+                    "content": [{"type": "text", "text": "".join(tokens)}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": {**input_usage, "output_tokens": output_tokens},
+                }
+            )
+
+        async def events():
+            yield _sse(
+                "message_start",
+                {
+                    "type": "message_start",
+                    "message": {
+                        "id": message_id,
+                        "type": "message",
+                        "role": "assistant",
+                        "model": model,
+                        "content": [],
+                        "stop_reason": None,
+                        "stop_sequence": None,
+                        "usage": {**input_usage, "output_tokens": 1},
+                    },
+                },
+            )
+            yield _sse(
+                "content_block_start",
+                {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+            )
+            chunk = max(1, profile.chunk_tokens)
+            pause = chunk / profile.tokens_per_second if profile.tokens_per_second > 0 else 0
+            for start in range(0, len(tokens), chunk):
+                if start and pause:
+                    await asyncio.sleep(pause)
+                yield _sse(
+                    "content_block_delta",
+                    {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {"type": "text_delta", "text": "".join(tokens[start:start + chunk])},
+                    },
+                )
+            yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield _sse(
+                "message_delta",
+                {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                    "usage": {"output_tokens": output_tokens},
+                },
+            )
+            yield _sse("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def health(request: Request) -> Response:
+        return JSONResponse({"status": "ok"})
+
+    return Starlette(routes=[Route("/v1/messages", messages, methods=["POST"]), Route("/health", health)])
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = UpstreamProfile()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--chunk-tokens", type=int, default=defaults.chunk_tokens)
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--retry-after-seconds", type=float, default=defaults.retry_after_seconds)
+
+
+def profile_from_arguments(args: argparse.Namespace) -> UpstreamProfile:
+    return UpstreamProfile(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        chunk_tokens=args.chunk_tokens,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after_seconds=args.retry_after_seconds,
+    )
+
+
+def profile_to_arguments(profile: UpstreamProfile) -> list:
+    return [
+        "--latency-ms", str(profile.latency_ms),
+        "--tokens-per-second", str(profile.tokens_per_second),
+        "--chunk-tokens", str(profile.chunk_tokens),
+        "--output-tokens", str(profile.output_tokens),
+        "--error-rate", str(profile.error_rate),
+        "--error-status", str(profile.error_status),
+        "--retry-after-seconds", str(profile.retry_after_seconds),
+    ]
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(profile_from_arguments(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
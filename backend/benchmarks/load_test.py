@@ -0,0 +1,314 @@
+"""
+End-to-end load test: runs `app.main:app` under uvicorn against the local fake
+Anthropic upstream (benchmarks.fake_anthropic) and drives the chat, streaming,
+newsletter and mentoring endpoints at a fixed concurrency.
+
+Reports requests/sec, p50/p95/p99 latency and time to first byte per scenario, and
+exits non-zero when throughput, p50/p95 latency or median time to first byte got
+worse than --tolerance against the stored baseline (written with --update-baseline).
+Baselines only compare like with like, so regenerate them on the machine that runs
+the check:
+
+    cd backend
+    python -m benchmarks.load_test --update-baseline
+    python -m benchmarks.load_test --scenarios chat,stream --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fake_anthropic import (
+    UpstreamProfile,
+    add_profile_arguments,
+    profile_from_arguments,
+    profile_to_arguments,
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "load_baseline.json")
+SCENARIOS = ("chat", "stream", "newsletter", "mentoring")
+ADMIN_TOKEN = "benchmark-admin"
+UNLIMITED = str(10**9)
+
+# Result of one request: (ok, seconds to complete, seconds to first body byte)
+Sample = Tuple[bool, float, Optional[float]]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _app_environment(workdir: str, upstream_url: str, overrides: List[str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+            "ANTHROPIC_API_KEY": "benchmark",
+            "ANTHROPIC_BASE_URL": upstream_url,
+            "DISABLE_FIREBASE_AUTH": "true",
+            "BACKUP_API_KEY": ADMIN_TOKEN,
+            "RATE_LIMIT_PER_MINUTE": UNLIMITED,
+            "RATE_LIMIT_CHAT_PER_MINUTE": UNLIMITED,
+            "RATE_LIMIT_CHAT_BATCH_PER_MINUTE": UNLIMITED,
+            "RATE_LIMIT_MENTORING_PER_MINUTE": UNLIMITED,
+            "RATE_LIMIT_NEWSLETTER_PER_MINUTE": UNLIMITED,
+            "TOKEN_QUOTA_BUDGET": UNLIMITED,
+            "NEAR_DUP_SNAPSHOT_PATH": os.path.join(workdir, "near_dup.json"),
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    for override in overrides:
+        key, _, value = override.partition("=")
+        env[key] = value
+    return env
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, log_path: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                break
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    with open(log_path) as log:
+        sys.stderr.write(log.read()[-4000:])
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def _start(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def _timed(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> Sample:
+    """Send one request, reading the body as a stream so first-byte time is known."""
+    started = time.perf_counter()
+    first_byte = None
+    try:
+        async with client.stream(method, url, **kwargs) as response:
+            async for chunk in response.aiter_bytes():
+                if chunk and first_byte is None:
+                    first_byte = time.perf_counter() - started
+            ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    return ok, time.perf_counter() - started, first_byte
+
+
+def _scenario(name: str, run_id: str) -> Callable[[httpx.AsyncClient, int], Awaitable[Sample]]:
+    # Every request is distinct so caches and stream coalescing don't short-cut the upstream
+    if name == "chat":
+        return lambda client, i: _timed(
+            client, "POST", "/api/v1/chat", json={"message": f"How do I start mentoring? ({run_id}-{i})"}
+        )
+    if name == "stream":
+        return lambda client, i: _timed(
+            client, "POST", "/api/v1/chat/stream", json={"message": f"Plan my first month ({run_id}-{i})"}
+        )
+    if name == "newsletter":
+        return lambda client, i: _timed(
+            client, "POST", "/api/v1/newsletter/subscribe", json={"email": f"load-{run_id}-{i}@example.com"}
+        )
+
+    async def mentoring(client: httpx.AsyncClient, i: int) -> Sample:
+        # Applicants submit; admins page through the queue
+        if i % 2:
+            return await _timed(
+                client, "GET", "/api/v1/mentoring/admin/applications", params={"limit": 50},
+                headers={"X-Admin-Token": ADMIN_TOKEN},
+            )
+        return await _timed(
+            client, "POST", "/api/v1/mentoring/applications",
+            json={
+                "user_email": f"applicant-{run_id}-{i}@example.com",
+                "full_name": "Load Test",
+                "goals": "Grow into a staff engineer role",
+                "areas": "backend, architecture",
+            },
+        )
+
+    return mentoring
+
+
+async def _drive(base_url: str, name: str, requests: int, concurrency: int, warmup: int) -> Dict[str, float]:
+    run_id = f"{int(time.time())}{name[0]}"
+    send = _scenario(name, run_id)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        for i in range(warmup):
+            await send(client, -1 - i)
+
+        counter = iter(range(requests))
+        samples: List[Sample] = []
+
+        async def worker() -> None:
+            for i in counter:
+                samples.append(await send(client, i))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return _summarize(samples, elapsed)
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _summarize(samples: List[Sample], elapsed: float) -> Dict[str, float]:
+    latencies = sorted(seconds * 1000 for ok, seconds, _ in samples if ok)
+    first_bytes = sorted(first * 1000 for ok, _, first in samples if ok and first is not None)
+    errors = sum(1 for ok, _, _ in samples if not ok)
+    summary = {
+        "requests": len(samples),
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "ttft_p50_ms": statistics.median(first_bytes) if first_bytes else 0.0,
+        "ttft_p95_ms": _percentile(first_bytes, 0.95),
+    }
+    return {key: round(value, 4 if key == "error_rate" else 1) for key, value in summary.items()}
+
+
+def _regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    problems = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        if result["rps"] < expected["rps"] * (1 - tolerance):
+            problems.append(f"{name}: {result['rps']:.1f} rps vs baseline {expected['rps']:.1f}")
+        for key in ("p50_ms", "p95_ms", "ttft_p50_ms"):
+            if expected.get(key) and result[key] > expected[key] * (1 + tolerance):
+                problems.append(f"{name}: {key} {result[key]:.1f} vs baseline {expected[key]:.1f}")
+        if result["error_rate"] > expected.get("error_rate", 0.0) + 0.01:
+            problems.append(f"{name}: error rate {result['error_rate']:.1%} vs baseline {expected['error_rate']:.1%}")
+    return problems
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=400, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="extra app settings")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.4, help="allowed relative slowdown")
+    parser.add_argument("--output", help="also write the results as JSON here")
+    add_profile_arguments(parser)
+    # A quick upstream by default so a full run takes seconds, not minutes
+    parser.set_defaults(latency_ms=50.0, tokens_per_second=600.0, output_tokens=60, chunk_tokens=2)
+    return parser.parse_args()
+
+
+async def main() -> int:
+    args = _parse_args()
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    profile: UpstreamProfile = profile_from_arguments(args)
+
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    upstream_port, app_port = _free_port(), _free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    upstream_log, app_log = os.path.join(workdir, "upstream.log"), os.path.join(workdir, "app.log")
+
+    processes = []
+    try:
+        processes.append(_start(
+            [sys.executable, "-m", "benchmarks.fake_anthropic", "--port", str(upstream_port), *profile_to_arguments(profile)],
+            dict(os.environ), upstream_log,
+        ))
+        await _wait_ready(f"{upstream_url}/health", processes[-1], upstream_log)
+        processes.append(_start(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+                "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+            ],
+            _app_environment(workdir, upstream_url, args.app_env), app_log,
+        ))
+        await _wait_ready(f"{app_url}/", processes[-1], app_log)
+
+        results = {}
+        print(f"concurrency={args.concurrency} requests={args.requests} upstream={asdict(profile)}")
+        print(f"{'scenario':12} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'ttfb p50':>9} {'ttfb p95':>9} {'errors':>7}")
+        for name in names:
+            result = await _drive(app_url, name, args.requests, args.concurrency, args.warmup)
+            results[name] = result
+            print(
+                f"{name:12} {result['rps']:8.1f} {result['p50_ms']:7.1f}ms {result['p95_ms']:7.1f}ms "
+                f"{result['p99_ms']:7.1f}ms {result['ttft_p50_ms']:8.1f}ms {result['ttft_p95_ms']:8.1f}ms "
+                f"{result['error_rate']:6.1%}"
+            )
+    finally:
+        for process in reversed(processes):
+            _stop(process)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    run = {"concurrency": args.concurrency, "requests": args.requests, "upstream": asdict(profile), "results": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(run, output, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as output:
+            json.dump(run, output, indent=2)
+            output.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against; run with --update-baseline first")
+        return 0
+    with open(args.baseline) as source:
+        baseline = json.load(source)
+    if baseline.get("upstream") != run["upstream"] or baseline.get("concurrency") != run["concurrency"]:
+        print("baseline was recorded with a different upstream profile or concurrency; not comparing")
+        return 0
+    problems = _regressions(results, baseline.get("results", {}), args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if not problems:
+        print(f"no regressions against {os.path.relpath(args.baseline, BACKEND_DIR)} (tolerance {args.tolerance:.0%})")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,75 @@
+"""
+Per-call logging cost seen by the request path: the old `logging.basicConfig` stream
+handler with f-string messages versus app.core.logging_config (queue handoff, lazy
+formatting, per-logger sampling). Output goes to a throwaway file in both cases:
+
+    cd backend
+    python -m benchmarks.logging_overhead --messages 50000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import logging_config  # noqa: E402
+
+
+def _time_calls(logger: logging.Logger, messages: int, lazy: bool) -> float:
+    email = "reader@example.com"
+    started = time.perf_counter()
+    for i in range(messages):
+        if lazy:
+            logger.info("Authentication successful: %s (%d)", email, i)
+        else:
+            logger.info(f"Authentication successful: {email} ({i})")
+    return time.perf_counter() - started
+
+
+def _reset_root() -> None:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--sample-per-second", type=float, default=20.0)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmark.auth")
+    real_stderr = sys.stderr
+    with tempfile.TemporaryDirectory(prefix="logging-bench-") as workdir:
+        before_path = os.path.join(workdir, "before.log")
+        _reset_root()
+        logging.basicConfig(level=logging.INFO, filename=before_path)
+        before = _time_calls(logger, args.messages, lazy=False)
+        _reset_root()
+
+        after_path = os.path.join(workdir, "after.log")
+        with open(after_path, "w") as output:
+            sys.stderr = output
+            try:
+                logging_config.configure_logging("INFO", "json", args.sample_per_second)
+                after = _time_calls(logger, args.messages, lazy=True)
+                logging_config.stop_logging()
+            finally:
+                sys.stderr = real_stderr
+        _reset_root()
+
+        before_lines = sum(1 for _ in open(before_path))
+        after_lines = sum(1 for _ in open(after_path))
+
+    per_call = lambda seconds: seconds / args.messages * 1e6  # noqa: E731
+    print(f"messages={args.messages}")
+    print(f"basicConfig + f-strings : {per_call(before):6.2f}us/call  {before_lines:8d} lines written")
+    print(f"queue + JSON + sampling : {per_call(after):6.2f}us/call  {after_lines:8d} lines written")
+
+
+if __name__ == "__main__":
+    main()
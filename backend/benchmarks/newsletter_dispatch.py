@@ -0,0 +1,203 @@
+"""
+Newsletter dispatch throughput against a local aiosmtpd server.
+
+Seeds a throwaway SQLite file with active subscribers, starts an SMTP stand-in that
+accepts (and counts) every message after `--smtp-latency-ms`, then sends one issue
+three ways:
+
+- serial: one connection, one message at a time (concurrency 1, unthrottled)
+- pool: `--concurrency` persistent connections, unthrottled
+- resume: the pool run cancelled part-way, then dispatched again with resume
+
+and reports emails/sec, plus for the resume run how many recipients got the issue
+twice (sent before the crash but not yet recorded). Needs `pip install aiosmtpd`:
+
+    cd backend
+    python -m benchmarks.newsletter_dispatch --subscribers 5000 --concurrency 8
+    python -m benchmarks.newsletter_dispatch --transient-error-rate 0.02 --rate 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+_workdir = tempfile.mkdtemp(prefix="newsletter-dispatch-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from app.database import AsyncSessionLocal, Base, async_engine, engine  # noqa: E402
+from app.models.newsletter_issue import NewsletterDelivery, NewsletterIssue  # noqa: E402
+from app.models.subscriber import Subscriber  # noqa: E402
+from app.services.newsletter_dispatch import NewsletterDispatcher  # noqa: E402
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # pragma: no cover - benchmark-only dependency
+    Controller = None
+
+
+class CountingHandler:
+    """aiosmtpd handler: counts deliveries per recipient, optionally slow or flaky."""
+
+    def __init__(self, latency_seconds: float, transient_error_rate: float) -> None:
+        self.latency_seconds = latency_seconds
+        self.transient_error_rate = transient_error_rate
+        self.received: Counter = Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self._lock:
+            self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if random.random() < self.transient_error_rate:
+            return "451 4.3.0 Try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        with self._lock:
+            self.received.update(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.received.clear()
+            self.connections = 0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _seed(subscribers: int) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Subscriber))
+        rows = [{"email": f"reader{i}@example.com", "is_active": i % 20 != 0} for i in range(subscribers)]
+        for start in range(0, len(rows), 1000):
+            await db.execute(insert(Subscriber), rows[start:start + 1000])
+        await db.commit()
+
+
+async def _new_issue(name: str) -> int:
+    async with AsyncSessionLocal() as db:
+        issue = NewsletterIssue(
+            subject=f"Benchmark issue: {name}",
+            body_text="Hello from the mentoring program.\n\n" + "This month's highlights and events. " * 40,
+        )
+        db.add(issue)
+        await db.commit()
+        return issue.id
+
+
+async def _recorded(issue_id: int) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(
+            select(func.count()).where(NewsletterDelivery.issue_id == issue_id, NewsletterDelivery.status == "sent")
+        )
+
+
+def _dispatcher(port: int, concurrency: int, rate: float, args: argparse.Namespace) -> NewsletterDispatcher:
+    return NewsletterDispatcher(
+        host="127.0.0.1",
+        port=port,
+        username=None,
+        password=None,
+        use_tls=False,
+        start_tls=False,
+        timeout=30,
+        sender="Benchmark <newsletter@example.com>",
+        concurrency=concurrency,
+        rate_per_second=rate,
+        read_chunk=args.read_chunk,
+        record_batch=args.record_batch,
+        max_attempts=3,
+        messages_per_connection=args.messages_per_connection,
+    )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000, help="seeded rows; every 20th is inactive")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0, help="emails/sec cap for the pool runs; 0 = unthrottled")
+    parser.add_argument("--smtp-latency-ms", type=float, default=5.0, help="server-side delay per message")
+    parser.add_argument("--transient-error-rate", type=float, default=0.0, help="share of RCPTs answered 451")
+    parser.add_argument("--read-chunk", type=int, default=500)
+    parser.add_argument("--record-batch", type=int, default=100)
+    parser.add_argument("--messages-per-connection", type=int, default=100)
+    parser.add_argument("--crash-after", type=float, default=0.5, help="resume run: cancel after this share was sent")
+    args = parser.parse_args()
+    if Controller is None:
+        print("aiosmtpd is not installed: pip install aiosmtpd")
+        return 1
+
+    Base.metadata.create_all(bind=engine)
+    await _seed(args.subscribers)
+    active = args.subscribers - len(range(0, args.subscribers, 20))
+
+    handler = CountingHandler(args.smtp_latency_ms / 1000, args.transient_error_rate)
+    port = _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    results = []
+    try:
+        for name, concurrency, rate in (("serial", 1, 0), ("pool", args.concurrency, args.rate)):
+            handler.reset()
+            stats = await _dispatcher(port, concurrency, rate, args).dispatch(await _new_issue(name))
+            results.append((name, stats, handler.connections, 0))
+
+        # Cancel part-way, as a crash would stop it, then resume with a fresh dispatcher
+        handler.reset()
+        issue_id = await _new_issue("resume")
+        dispatcher = _dispatcher(port, args.concurrency, args.rate, args)
+        task = dispatcher.start(await dispatcher.claim(issue_id))
+        while sum(handler.received.values()) < active * args.crash_after and not task.done():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        recorded = await _recorded(issue_id)
+        started = time.perf_counter()
+        stats = await _dispatcher(port, args.concurrency, args.rate, args).dispatch(issue_id, resume=True)
+        stats.seconds = time.perf_counter() - started
+        duplicates = sum(count - 1 for count in handler.received.values() if count > 1)
+        missing = active - len(handler.received)
+        results.append(("resume", stats, handler.connections, duplicates))
+        print(f"resume: {recorded} recorded as sent before the cancel; {missing} recipients never received it")
+    finally:
+        controller.stop()
+        await async_engine.dispose()
+        shutil.rmtree(_workdir, ignore_errors=True)
+
+    print(
+        f"{active} active subscribers, SMTP latency {args.smtp_latency_ms:.0f} ms, "
+        f"transient error rate {args.transient_error_rate:.0%}"
+    )
+    print(f"{'run':8} {'sent':>7} {'failed':>7} {'skipped':>8} {'retries':>8} {'conns':>6} {'dupes':>6} {'seconds':>8} {'emails/s':>9}")
+    for name, stats, connections, duplicates in results:
+        print(
+            f"{name:8} {stats.sent:7d} {stats.failed:7d} {stats.skipped:8d} {stats.retries:8d} "
+            f"{connections:6d} {duplicates:6d} {stats.seconds:8.2f} {stats.emails_per_second:9.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,101 @@
+"""
+Newsletter signup throughput: per-request SELECT + INSERT/UPDATE + commit versus the
+batched upsert pipeline in app.services.subscription_batcher.
+
+Runs against a throwaway SQLite file so it can't touch real data:
+
+    cd backend
+    python -m benchmarks.newsletter_signups --signups 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_workdir = tempfile.mkdtemp(prefix="newsletter-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, select  # noqa: E402
+
+from app.database import AsyncSessionLocal, Base, async_engine, engine  # noqa: E402
+from app.models.subscriber import Subscriber  # noqa: E402
+from app.services.subscription_batcher import SubscriptionBatcher  # noqa: E402
+
+
+async def subscribe_per_request(email: str) -> str:
+    """The pre-batching endpoint body: one read and one write transaction per signup."""
+    async with AsyncSessionLocal() as db:
+        existing = await db.scalar(select(Subscriber).where(Subscriber.email == email))
+        if existing:
+            if existing.is_active:
+                return "already_subscribed"
+            existing.is_active = True
+            await db.commit()
+            return "reactivated"
+        db.add(Subscriber(email=email))
+        try:
+            await db.commit()
+        except Exception:
+            # Lost a race with a concurrent signup for the same address
+            await db.rollback()
+            return "already_subscribed"
+        return "subscribed"
+
+
+def _emails(count: int) -> list:
+    # Roughly 10% repeats, as when the same person submits twice
+    return [f"reader{i if i % 10 else i // 10}@example.com" for i in range(count)]
+
+
+async def _run(subscribe, emails, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(email: str) -> None:
+        async with semaphore:
+            await subscribe(email)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(email) for email in emails))
+    return time.perf_counter() - started
+
+
+async def _reset() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Subscriber))
+        await db.commit()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--batch-rows", type=int, default=200)
+    parser.add_argument("--batch-delay-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    emails = _emails(args.signups)
+
+    await _reset()
+    before = await _run(subscribe_per_request, emails, args.concurrency)
+
+    await _reset()
+    batcher = SubscriptionBatcher(max_batch=args.batch_rows, max_delay_ms=args.batch_delay_ms)
+    after = await _run(batcher.subscribe, emails, args.concurrency)
+    await batcher.close()
+    stats = batcher.stats()
+
+    await async_engine.dispose()
+
+    print(f"signups={args.signups} concurrency={args.concurrency}")
+    print(f"per-request commit : {args.signups / before:10.0f} signups/sec ({before:.2f}s)")
+    print(f"batched upsert     : {args.signups / after:10.0f} signups/sec ({after:.2f}s)")
+    print(f"speedup            : {before / after:10.1f}x  (avg batch {stats['avg_batch_size']:.0f} rows)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import `app.main` and serve
+its first requests, for the regular app and the serverless build (SERVERLESS=true,
+as used by api/index.py on Vercel).
+
+Every run is a new interpreter. Requests are sent straight to the ASGI app, without
+a socket or an HTTP client, so the numbers are only the app's own import and
+first-use costs; chat goes to the local fake Anthropic upstream. One extra run per
+mode, importing `app.main` only under `-X importtime`, breaks import time down by
+top-level package:
+
+    cd backend
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_anthropic import UpstreamProfile, profile_to_arguments
+from benchmarks.load_test import BACKEND_DIR, _app_environment, _free_port, _start, _stop, _wait_ready
+
+MODES = {"eager": "false", "serverless": "true"}
+STEPS = ("import", "startup", "root", "newsletter", "chat", "chat_again")
+
+# Runs in the child. Timings are taken around each step; nothing beyond asyncio/json
+# is imported up front, so every module the app needs is charged to the app.
+PROBE = r'''
+import asyncio, json, sys, time
+
+started = time.perf_counter()
+from app.main import app
+timings = {"import": time.perf_counter() - started}
+
+
+async def call(method, path, body=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"app"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("app", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.Event().wait()
+
+    status = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    if status[0] >= 400:
+        raise SystemExit(f"{method} {path} returned {status[0]}")
+
+
+async def timed(name, awaitable):
+    started = time.perf_counter()
+    await awaitable
+    timings[name] = time.perf_counter() - started
+
+
+async def main(run_id):
+    lifespan = app.router.lifespan_context(app)
+    await timed("startup", lifespan.__aenter__())
+    await timed("root", call("GET", "/"))
+    await timed("newsletter", call("POST", "/api/v1/newsletter/subscribe", {"email": f"cold-{run_id}@example.com"}))
+    await timed("chat", call("POST", "/api/v1/chat", {"message": f"How do I find a mentor? ({run_id})"}))
+    await timed("chat_again", call("POST", "/api/v1/chat", {"message": f"And a sponsor? ({run_id})"}))
+    await lifespan.__aexit__(None, None, None)
+    print(json.dumps(timings))
+
+
+if sys.argv[1] != "import-only":
+    asyncio.run(main(sys.argv[1]))
+'''
+
+
+def _probe(env: Dict[str, str], run_id: str, importtime: bool = False) -> Tuple[Dict[str, float], str]:
+    """Run PROBE in a fresh interpreter; with `importtime`, only import the app."""
+    flags = ["-X", "importtime"] if importtime else []
+    run_id = "import-only" if importtime else run_id
+    completed = subprocess.run(
+        [sys.executable, *flags, "-c", PROBE, run_id],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120,
+    )
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr[-4000:])
+        raise RuntimeError(f"probe failed: {completed.stdout.strip()}")
+    timings = {} if importtime else json.loads(completed.stdout.strip().splitlines()[-1])
+    return timings, completed.stderr
+
+
+def _import_breakdown(importtime_output: str) -> Dict[str, float]:
+    """Self import time in seconds, summed per top-level package."""
+    packages: Dict[str, float] = defaultdict(float)
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return packages
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode; medians are reported")
+    parser.add_argument("--top", type=int, default=10, help="packages to list in the import breakdown")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE")
+    return parser.parse_args()
+
+
+async def main() -> int:
+    args = _parse_args()
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    upstream_port = _free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    upstream_log = os.path.join(workdir, "upstream.log")
+    # An instant upstream, so chat timings are the app's own work
+    profile = UpstreamProfile(latency_ms=0, tokens_per_second=0)
+
+    upstream = _start(
+        [sys.executable, "-m", "benchmarks.fake_anthropic", "--port", str(upstream_port), *profile_to_arguments(profile)],
+        dict(os.environ), upstream_log,
+    )
+    try:
+        await _wait_ready(f"{upstream_url}/health", upstream, upstream_log)
+        results: Dict[str, Dict[str, float]] = {}
+        breakdowns: Dict[str, Dict[str, float]] = {}
+        # Eager first: its create_all gives the serverless runs (which skip schema work) their tables
+        for mode, flag in MODES.items():
+            env = _app_environment(workdir, upstream_url, [f"SERVERLESS={flag}", *args.app_env])
+            runs: List[Dict[str, float]] = []
+            for run in range(args.runs):
+                timings, _ = _probe(env, f"{mode}-{run}")
+                runs.append(timings)
+            results[mode] = {step: statistics.median(run[step] for run in runs) for step in STEPS}
+            _, importtime_output = _probe(env, f"{mode}-importtime", importtime=True)
+            breakdowns[mode] = _import_breakdown(importtime_output)
+    finally:
+        _stop(upstream)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"median of {args.runs} fresh processes per mode, milliseconds")
+    print(f"{'mode':12}" + "".join(f"{step:>12}" for step in (*STEPS, "cold total")))
+    for mode, timings in results.items():
+        cold = timings["import"] + timings["startup"] + timings["chat"]
+        print(f"{mode:12}" + "".join(f"{timings[step] * 1000:12.1f}" for step in STEPS) + f"{cold * 1000:12.1f}")
+
+    print(f"\nimport time by package (-X importtime, self time), top {args.top}")
+    for mode, packages in breakdowns.items():
+        ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]
+        print(f"{mode:12}" + ", ".join(f"{name} {seconds * 1000:.0f}" for name, seconds in ranked))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,33 +1,24 @@
-SYSTEM_PROMPT = """You are a highly knowledgeable AI assistant focused on personal branding and career development. 
-Follow these guidelines in all your responses:
+"""
+Legacy entry point. System prompts now live in app/services/prompt_registry.py,
+where AIService picks one per request; this keeps the old names importable.
+"""
+from app.core.config import settings
+from app.services.prompt_registry import CHAT_V1, prompt_registry
 
-1. Be concise and direct in your communication
-2. Always provide actionable advice
-3. Back up suggestions with real-world examples when possible
-4. Focus on practical, implementable steps
-5. Maintain a professional yet encouraging tone
-6. When discussing personal branding, emphasize authenticity and unique value proposition
-7. Structure longer responses with clear headings and bullet points
-8. If asked about technical topics, provide code examples or specific tools when relevant
+SYSTEM_PROMPT = CHAT_V1.system
 
-Remember to:
-- Never provide harmful or unethical advice
-- Admit when you don't have enough information
-- Ask clarifying questions when needed
-- Keep responses focused on personal branding and career development context
-"""
 
-def format_chat_prompt(user_message: str) -> dict:
+def format_chat_prompt(user_message: str, assistant: str = None) -> dict:
     """
-    Format the chat prompt with the user's message and any additional context
+    Format the chat prompt with the user's message and the selected template's system blocks
     """
     return {
-        "model": "claude-3-opus-20240229",
-        "max_tokens": 1024,
+        "model": settings.AI_MODEL,
+        "max_tokens": settings.MAX_TOKENS,
         "messages": [{
             "role": "user",
             "content": user_message
         }],
-        "system": SYSTEM_PROMPT,
-        "temperature": 0.7  # Adjust for creativity vs consistency
-    } 
\ No newline at end of file
+        "system": prompt_registry.get(assistant).system_blocks,
+        "temperature": settings.TEMPERATURE
+    }
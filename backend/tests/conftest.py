@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Importable from the repository root too, and never touching the developer's database
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("DISABLE_FIREBASE_AUTH", "true")
+
+
+@pytest.fixture
+def database():
+    """Empty tables in the test database, including the full-text index search builds."""
+    from app.database import Base, engine
+    from app.schema import import_models
+
+    import_models()
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE IF EXISTS mentee_applications_fts")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+
+
+@pytest.fixture
+def run():
+    """asyncio.run that also closes the async engine's pool, whose connections belong to that loop."""
+    from app.database import async_engine
+
+    def run(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
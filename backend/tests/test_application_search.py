@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, update
+
+from app.database import AsyncSessionLocal, async_engine
+from app.models.mentee_application import MenteeApplication
+from app.services import application_search
+from app.services.application_search import (
+    decode_cursor,
+    encode_cursor,
+    ensure_search_index,
+    parse_terms,
+    search_applications,
+)
+
+
+@pytest.fixture
+def search(database, monkeypatch):
+    """A fresh index state; the module caches whether the index was built."""
+    monkeypatch.setattr(application_search, "search_available", False)
+    monkeypatch.setattr(application_search, "_index_checked", False)
+    monkeypatch.setattr(application_search, "_index_lock", asyncio.Lock())
+
+
+async def _add(**fields) -> int:
+    async with AsyncSessionLocal() as db:
+        application = MenteeApplication(user_email=fields.pop("user_email", "mentee@example.com"), **fields)
+        db.add(application)
+        await db.commit()
+        return application.id
+
+
+async def _ids(query: str, status=None):
+    async with AsyncSessionLocal() as db:
+        hits, _ = await search_applications(db, parse_terms(query), limit=50, status=status)
+    return [hit["id"] for hit in hits]
+
+
+def test_index_is_built_over_existing_rows(search, run):
+    async def scenario():
+        existing = await _add(goals="Learn distributed systems")
+        built = await ensure_search_index(async_engine)
+        return existing, built, await _ids("distributed")
+
+    existing, built, ids = run(scenario())
+    assert built is True
+    assert ids == [existing]
+
+
+def test_triggers_keep_the_index_in_sync(search, run):
+    async def scenario():
+        await ensure_search_index(async_engine)
+        row_id = await _add(goals="Become a data engineer")
+        inserted = await _ids("engineer")
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(MenteeApplication).where(MenteeApplication.id == row_id).values(goals="Move into product design")
+            )
+            await db.commit()
+        old_term, new_term = await _ids("engineer"), await _ids("design")
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(MenteeApplication).where(MenteeApplication.id == row_id))
+            await db.commit()
+        return row_id, inserted, old_term, new_term, await _ids("design")
+
+    row_id, inserted, old_term, new_term, deleted = run(scenario())
+    assert inserted == [row_id]
+    assert old_term == []
+    assert new_term == [row_id]
+    assert deleted == []
+
+
+def test_status_filter_follows_status_changes(search, run):
+    async def scenario():
+        await ensure_search_index(async_engine)
+        pending = await _add(goals="Kubernetes operations", status="pending")
+        approved = await _add(goals="Kubernetes security", status="approved")
+        before = await _ids("kubernetes", status="approved")
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(MenteeApplication).where(MenteeApplication.id == pending).values(status="approved")
+            )
+            await db.commit()
+        return pending, approved, before, await _ids("kubernetes", status="approved")
+
+    pending, approved, before, after = run(scenario())
+    assert before == [approved]
+    assert sorted(after) == sorted([pending, approved])
+
+
+def test_last_term_matches_as_a_prefix_and_snippets_are_highlighted(search, run):
+    async def scenario():
+        await ensure_search_index(async_engine)
+        await _add(goals="Machine learning <b>research</b>")
+        async with AsyncSessionLocal() as db:
+            return await search_applications(db, parse_terms("machine lear"), limit=10)
+
+    hits, next_cursor = run(scenario())
+    assert len(hits) == 1 and next_cursor is None
+    assert "<mark>" in hits[0]["snippet"]
+    assert "&lt;b&gt;" in hits[0]["snippet"]
+
+
+def test_cursor_pages_through_every_match_once(search, run):
+    async def scenario():
+        await ensure_search_index(async_engine)
+        # Different term frequencies give different scores, equal ones tie on id
+        for index in range(7):
+            await _add(goals="python " * (1 + index % 3) + f"mentee {index}")
+        await _add(goals="rust only")
+        pages, cursor = [], None
+        async with AsyncSessionLocal() as db:
+            while True:
+                hits, next_cursor = await search_applications(db, ["python"], limit=3, cursor=cursor)
+                pages.append(hits)
+                if next_cursor is None:
+                    break
+                cursor = decode_cursor(next_cursor)
+        return pages
+
+    pages = run(scenario())
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ranked = [(hit["score"], hit["id"]) for page in pages for hit in page]
+    assert len({row_id for _, row_id in ranked}) == 7
+    assert ranked == sorted(ranked)
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    assert decode_cursor(encode_cursor(-1.25, 42)) == (-1.25, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_query_operators_are_treated_as_words():
+    assert parse_terms('goals:"rust" OR NEAR(x*') == ["goals", "rust", "OR", "NEAR", "x"]
+
+
+def test_concurrent_first_searches_wait_for_the_build(search, run):
+    async def scenario():
+        return await asyncio.gather(*(application_search.search_index_ready() for _ in range(5)))
+
+    assert run(scenario()) == [True] * 5
@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.near_duplicate_cache import NearDuplicateCache
+
+
+def _cache(path) -> NearDuplicateCache:
+    return NearDuplicateCache(threshold=0.5, max_entries=100, ttl_seconds=3600, snapshot_path=str(path))
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "near_dup.json"
+    cache = _cache(path)
+    cache.add("how do I apply for mentoring", "Use the form.", "tag")
+
+    assert asyncio.run(cache.save_snapshot_async()) is True
+    assert json.loads(path.read_text())["entries"][0]["response"] == "Use the form."
+    # Nothing changed since, so there is nothing to write
+    assert asyncio.run(cache.save_snapshot_async()) is False
+
+    restored = _cache(path)
+    assert restored.load_snapshot() == 1
+    assert restored.lookup("how do I apply for mentoring please", "tag") == "Use the form."
+
+
+def test_failed_write_keeps_index_dirty(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = _cache(blocker / "near_dup.json")
+    cache.add("how do I apply for mentoring", "Use the form.", "tag")
+
+    with pytest.raises(OSError):
+        asyncio.run(cache.save_snapshot_async())
+    assert cache.snapshot_payload() is not None
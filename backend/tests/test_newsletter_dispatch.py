@@ -0,0 +1,219 @@
+import asyncio
+import socket
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from app.database import AsyncSessionLocal
+from app.models.newsletter_issue import NewsletterDelivery, NewsletterIssue
+from app.models.subscriber import Subscriber
+from app.services.newsletter_dispatch import (
+    DELIVERY_FAILED,
+    DELIVERY_SENT,
+    PARTIAL,
+    SENDING,
+    SENT,
+    DispatchConflictError,
+    LeaseLostError,
+    NewsletterDispatcher,
+)
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+
+class RecordingHandler:
+    """Accepts every message except for the recipients in `rejected`, which get a 550."""
+
+    def __init__(self) -> None:
+        self.rejected = set()
+        self.received: Counter = Counter()
+        self._lock = threading.Lock()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.rejected:
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.received.update(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+
+@pytest.fixture
+def smtp():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = RecordingHandler()
+    controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+def _dispatcher(port: int, **overrides) -> NewsletterDispatcher:
+    options = dict(
+        host="127.0.0.1",
+        port=port,
+        username=None,
+        password=None,
+        use_tls=False,
+        start_tls=False,
+        timeout=5,
+        sender="Newsletter <newsletter@example.com>",
+        concurrency=2,
+        rate_per_second=0,
+        read_chunk=4,
+        record_batch=3,
+        max_attempts=1,
+        messages_per_connection=100,
+    )
+    options.update(overrides)
+    return NewsletterDispatcher(**options)
+
+
+async def _seed(subscribers: int) -> int:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            insert(Subscriber),
+            [{"email": f"reader{index}@example.com", "is_active": index != 0} for index in range(subscribers)],
+        )
+        issue = NewsletterIssue(subject="Monthly update", body_text="News from the mentoring program.")
+        db.add(issue)
+        await db.commit()
+        return issue.id
+
+
+async def _issue(issue_id: int) -> NewsletterIssue:
+    async with AsyncSessionLocal() as db:
+        return await db.get(NewsletterIssue, issue_id)
+
+
+async def _deliveries(issue_id: int):
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(NewsletterDelivery.email, NewsletterDelivery.status).where(NewsletterDelivery.issue_id == issue_id)
+        )
+        return dict(rows.all())
+
+
+def test_sends_to_every_active_subscriber_and_releases_the_lease(database, run, smtp):
+    handler, port = smtp
+
+    async def scenario():
+        issue_id = await _seed(10)
+        stats = await _dispatcher(port).dispatch(issue_id)
+        return stats, await _issue(issue_id), await _deliveries(issue_id)
+
+    stats, issue, deliveries = run(scenario())
+    assert stats.sent == 9 and stats.failed == 0
+    assert set(handler.received) == {f"reader{index}@example.com" for index in range(1, 10)}
+    assert max(handler.received.values()) == 1
+    assert set(deliveries.values()) == {DELIVERY_SENT}
+    assert issue.status == SENT
+    assert issue.lease_owner is None and issue.lease_expires_at is None
+
+
+def test_failed_recipients_leave_the_issue_partial_and_resume_retries_only_them(database, run, smtp):
+    handler, port = smtp
+    handler.rejected = {"reader3@example.com", "reader7@example.com"}
+
+    async def scenario():
+        issue_id = await _seed(10)
+        dispatcher = _dispatcher(port)
+        first = await dispatcher.dispatch(issue_id)
+        partial = await _issue(issue_id)
+        failed = await _deliveries(issue_id)
+        with pytest.raises(DispatchConflictError):
+            await dispatcher.claim(issue_id)
+
+        handler.rejected = set()
+        handler.received.clear()
+        second = await dispatcher.dispatch(issue_id, resume=True)
+        return first, partial, failed, second, await _issue(issue_id), await _deliveries(issue_id)
+
+    first, partial, failed, second, issue, deliveries = run(scenario())
+    assert first.sent == 7 and first.failed == 2
+    assert partial.status == PARTIAL
+    assert failed["reader3@example.com"] == DELIVERY_FAILED
+    assert second.sent == 2 and second.skipped == 7
+    assert set(handler.received) == {"reader3@example.com", "reader7@example.com"}
+    assert issue.status == SENT
+    assert set(deliveries.values()) == {DELIVERY_SENT}
+
+
+def test_cancelled_run_resumes_without_missing_anyone(database, run, smtp):
+    handler, port = smtp
+
+    async def scenario():
+        issue_id = await _seed(30)
+        dispatcher = _dispatcher(port, concurrency=1, rate_per_second=100, record_batch=1)
+        sending = dispatcher.start(await dispatcher.claim(issue_id))
+        while sum(handler.received.values()) < 5:
+            await asyncio.sleep(0.01)
+        sending.cancel()
+        await asyncio.gather(sending, return_exceptions=True)
+        interrupted = await _issue(issue_id)
+        await _dispatcher(port).dispatch(issue_id, resume=True)
+        return interrupted, await _issue(issue_id)
+
+    interrupted, issue = run(scenario())
+    assert interrupted.status == SENDING and interrupted.lease_owner is None
+    assert set(handler.received) == {f"reader{index}@example.com" for index in range(1, 30)}
+    # Only a send that was in flight when the run was cancelled can go out twice
+    assert sum(handler.received.values()) <= 29 + 1
+    assert issue.status == SENT
+
+
+def test_resume_waits_for_a_live_lease_to_lapse(database, run, smtp):
+    _, port = smtp
+
+    async def scenario():
+        issue_id = await _seed(3)
+        dispatcher = _dispatcher(port)
+        await dispatcher.claim(issue_id)
+        # Another process: its in-memory bookkeeping knows nothing of the first claim
+        other = _dispatcher(port)
+        with pytest.raises(DispatchConflictError, match="another run"):
+            await other.claim(issue_id, resume=True)
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(NewsletterIssue)
+                .where(NewsletterIssue.id == issue_id)
+                .values(lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+            )
+            await db.commit()
+        stats = await other.dispatch(issue_id, resume=True)
+        return stats, await _issue(issue_id)
+
+    stats, issue = run(scenario())
+    assert stats.sent == 2
+    assert issue.status == SENT
+
+
+def test_run_stops_when_its_lease_is_taken_over(database, run, smtp):
+    handler, port = smtp
+
+    async def scenario():
+        issue_id = await _seed(200)
+        dispatcher = _dispatcher(port, concurrency=1, rate_per_second=20, lease_seconds=0.3)
+        issue = await dispatcher.claim(issue_id)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(NewsletterIssue).where(NewsletterIssue.id == issue_id).values(lease_owner="another-host:1:abcd")
+            )
+            await db.commit()
+        with pytest.raises(LeaseLostError):
+            await dispatcher.send(issue)
+        return await _issue(issue_id)
+
+    issue = run(scenario())
+    assert sum(handler.received.values()) < 199
+    assert issue.status == SENDING
+    assert issue.lease_owner == "another-host:1:abcd"
@@ -0,0 +1,105 @@
+import asyncio
+import time
+import types
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import rate_limiter
+from app.utils.rate_limiter import (
+    MemoryRateLimitBackend,
+    RateLimit,
+    SQLiteRateLimitBackend,
+    _sliding_window_check,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 6000.0  # the start of a 60 second window
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(time=clock.time, monotonic=time.monotonic))
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryRateLimitBackend(shards=4)
+    return SQLiteRateLimitBackend(str(tmp_path / "rate_limits.db"))
+
+
+def test_sliding_window_allows_up_to_the_limit():
+    state = (0.0, 0, 0)
+    for _ in range(3):
+        allowed, retry_after, *state = _sliding_window_check(6000.0, 60, 3, *state)
+        assert allowed and retry_after == 0
+    allowed, retry_after, *_ = _sliding_window_check(6000.0, 60, 3, *state)
+    assert not allowed
+    assert retry_after == 60
+
+
+def test_previous_window_is_weighted_by_its_overlap():
+    # Halfway through the next window the previous 10 hits still count as 5
+    allowed, _, _, current, previous = _sliding_window_check(6090.0, 60, 10, 6060.0, 4, 10)
+    assert allowed and (current, previous) == (5, 10)
+    allowed, retry_after, *_ = _sliding_window_check(6090.0, 60, 10, 6060.0, 5, 10)
+    assert not allowed
+    assert retry_after == pytest.approx(6.0)
+
+
+def test_counters_two_windows_old_are_forgotten():
+    allowed, _, window_start, current, previous = _sliding_window_check(6130.0, 60, 3, 6000.0, 3, 0)
+    assert allowed
+    assert (window_start, current, previous) == (6120.0, 1, 0)
+
+
+def test_backend_rejects_past_the_limit_with_retry_after(backend, clock):
+    async def scenario():
+        results = [await backend.hit("chat:1.2.3.4", 3, 60) for _ in range(4)]
+        other_key = await backend.hit("chat:5.6.7.8", 3, 60)
+        return results, other_key
+
+    results, other_key = asyncio.run(scenario())
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] == 60
+    assert other_key == (True, 0.0)
+
+
+def test_backend_allows_again_as_the_window_slides(backend, clock):
+    async def scenario():
+        for _ in range(3):
+            await backend.hit("mentoring:1.2.3.4", 3, 60)
+        clock.advance(90)  # halfway into the next window the 3 earlier hits count as 1.5
+        return await backend.hit("mentoring:1.2.3.4", 3, 60), await backend.hit("mentoring:1.2.3.4", 3, 60)
+
+    first, second = asyncio.run(scenario())
+    assert first == (True, 0.0)
+    assert second[0] is False
+    assert second[1] == pytest.approx(10.0)
+
+
+def test_dependency_returns_429_with_retry_after(monkeypatch, clock):
+    monkeypatch.setattr(rate_limiter, "backend", MemoryRateLimitBackend(shards=1))
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(RateLimit("test", 2))])
+    async def limited():
+        return {"ok": True}
+
+    client = TestClient(app)
+    statuses = [client.get("/limited").status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    assert client.get("/limited").headers["Retry-After"] == "60"
@@ -0,0 +1,103 @@
+import asyncio
+
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.background_task import BackgroundTask
+from app.models.subscriber import Subscriber
+from app.services.notifications import SUBSCRIPTION_CONFIRMATION
+from app.services.subscription_batcher import (
+    ALREADY_SUBSCRIBED,
+    REACTIVATED,
+    SUBSCRIBED,
+    SubscriptionBatcher,
+)
+
+
+async def _add_subscribers(emails) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Subscriber), [{"email": email, "is_active": active} for email, active in emails.items()])
+        await db.commit()
+
+
+async def _subscribers():
+    async with AsyncSessionLocal() as db:
+        return dict((await db.execute(select(Subscriber.email, Subscriber.is_active))).all())
+
+
+def test_concurrent_signups_are_written_in_one_batch(database, run):
+    batcher = SubscriptionBatcher(max_batch=50, max_delay_ms=50)
+    emails = [f"reader{index}@example.com" for index in range(10)]
+
+    async def scenario():
+        outcomes = await asyncio.gather(*(batcher.subscribe(email) for email in emails))
+        await batcher.close()
+        return outcomes, await _subscribers()
+
+    outcomes, subscribers = run(scenario())
+    assert outcomes == [SUBSCRIBED] * 10
+    assert subscribers == {email: True for email in emails}
+    assert batcher.stats()["batches"] == 1
+
+
+def test_a_full_batch_is_written_without_waiting_for_the_delay(database, run):
+    batcher = SubscriptionBatcher(max_batch=4, max_delay_ms=10_000)
+
+    async def scenario():
+        signups = asyncio.gather(*(batcher.subscribe(f"reader{index}@example.com") for index in range(8)))
+        outcomes = await asyncio.wait_for(signups, timeout=5)
+        await batcher.close()
+        return outcomes
+
+    assert run(scenario()) == [SUBSCRIBED] * 8
+    assert batcher.stats()["batches"] == 2
+
+
+def test_outcomes_for_existing_inactive_and_repeated_emails(database, run):
+    batcher = SubscriptionBatcher(max_batch=50, max_delay_ms=50)
+
+    async def scenario():
+        await _add_subscribers({"active@example.com": True, "left@example.com": False})
+        outcomes = await asyncio.gather(
+            batcher.subscribe("active@example.com"),
+            batcher.subscribe("left@example.com"),
+            batcher.subscribe("new@example.com"),
+            batcher.subscribe("new@example.com"),
+        )
+        await batcher.close()
+        return outcomes, await _subscribers()
+
+    outcomes, subscribers = run(scenario())
+    assert outcomes == [ALREADY_SUBSCRIBED, REACTIVATED, SUBSCRIBED, ALREADY_SUBSCRIBED]
+    assert subscribers == {"active@example.com": True, "left@example.com": True, "new@example.com": True}
+
+
+def test_confirmations_are_queued_for_new_and_reactivated_addresses(database, run, monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_HOST", "smtp.example.com")
+    batcher = SubscriptionBatcher(max_batch=50, max_delay_ms=50)
+
+    async def scenario():
+        await _add_subscribers({"active@example.com": True, "left@example.com": False})
+        await asyncio.gather(
+            *(batcher.subscribe(email) for email in ("active@example.com", "left@example.com", "new@example.com"))
+        )
+        await batcher.close()
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(BackgroundTask.name, BackgroundTask.payload))).all()
+
+    tasks = run(scenario())
+    assert sorted(tasks) == [
+        (SUBSCRIPTION_CONFIRMATION, '{"email": "left@example.com"}'),
+        (SUBSCRIPTION_CONFIRMATION, '{"email": "new@example.com"}'),
+    ]
+
+
+def test_unbatched_mode_writes_each_signup_on_its_own(database, run):
+    batcher = SubscriptionBatcher(max_batch=50, max_delay_ms=50, enabled=False)
+
+    async def scenario():
+        return [await batcher.subscribe("reader@example.com") for _ in range(2)]
+
+    assert run(scenario()) == [SUBSCRIBED, ALREADY_SUBSCRIBED]
+    assert batcher.stats()["batches"] == 2
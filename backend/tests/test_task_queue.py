@@ -0,0 +1,245 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.database import AsyncSessionLocal
+from app.models.background_task import BackgroundTask
+from app.services.task_queue import DEAD, DONE, QUEUED, RUNNING, PermanentTaskError, TaskQueue, TaskStateError
+
+
+def _queue(max_attempts: int = 3, visibility_timeout_seconds: float = 30) -> TaskQueue:
+    return TaskQueue(
+        workers=0,
+        poll_seconds=1,
+        visibility_timeout_seconds=visibility_timeout_seconds,
+        max_attempts=max_attempts,
+        backoff_base_seconds=0,
+        backoff_max_seconds=0,
+        sweep_seconds=30,
+        retention_hours=24,
+        shutdown_grace_seconds=1,
+    )
+
+
+async def _task(task_id: int) -> BackgroundTask:
+    async with AsyncSessionLocal() as db:
+        return await db.get(BackgroundTask, task_id)
+
+
+def test_handler_receives_payload_and_task_is_done(database, run):
+    queue = _queue()
+    received = []
+
+    @queue.task("greet")
+    async def greet(payload):
+        received.append(payload)
+
+    async def scenario():
+        task_id = await queue.enqueue("greet", {"email": "reader@example.com"})
+        claimed = await queue.claim()
+        outcome = await queue.run(claimed)
+        return task_id, claimed, outcome, await _task(task_id)
+
+    task_id, claimed, outcome, row = run(scenario())
+    assert claimed.id == task_id and claimed.attempts == 1
+    assert outcome == DONE
+    assert received == [{"email": "reader@example.com"}]
+    assert row.status == DONE and row.locked_until is None
+
+
+def test_claim_skips_tasks_that_are_not_due(database, run):
+    queue = _queue()
+
+    async def scenario():
+        await queue.enqueue("later", {}, delay_seconds=60)
+        return await queue.claim()
+
+    assert run(scenario()) is None
+
+
+def test_claimed_task_is_leased_to_one_worker(database, run):
+    queue = _queue()
+
+    async def scenario():
+        await queue.enqueue("once", {})
+        first = await queue.claim()
+        second = await queue.claim()
+        return first, second
+
+    first, second = run(scenario())
+    assert first is not None
+    assert second is None
+
+
+def test_failures_are_retried_then_dead_lettered(database, run):
+    queue = _queue(max_attempts=2)
+
+    @queue.task("flaky")
+    async def flaky(payload):
+        raise ConnectionError("SMTP server went away")
+
+    async def scenario():
+        task_id = await queue.enqueue("flaky", {})
+        first = await queue.run(await queue.claim())
+        retried = await _task(task_id)
+        second = await queue.run(await queue.claim())
+        return first, retried, second, await _task(task_id)
+
+    first, retried, second, dead = run(scenario())
+    assert first == "retried"
+    assert retried.status == QUEUED and retried.attempts == 1
+    assert retried.last_error == "ConnectionError: SMTP server went away"
+    assert second == DEAD
+    assert dead.status == DEAD and dead.attempts == 2
+
+
+def test_permanent_error_is_dead_lettered_at_once(database, run):
+    queue = _queue(max_attempts=5)
+
+    @queue.task("bad-address")
+    async def bad_address(payload):
+        raise PermanentTaskError("550 no such user")
+
+    async def scenario():
+        task_id = await queue.enqueue("bad-address", {})
+        outcome = await queue.run(await queue.claim())
+        return outcome, await _task(task_id)
+
+    outcome, row = run(scenario())
+    assert outcome == DEAD
+    assert row.attempts == 1
+
+
+def test_task_without_a_handler_is_dead_lettered(database, run):
+    queue = _queue()
+
+    async def scenario():
+        await queue.enqueue("unknown", {})
+        return await queue.run(await queue.claim())
+
+    assert run(scenario()) == DEAD
+
+
+def test_expired_lease_is_queued_again_and_the_stale_run_is_dropped(database, run):
+    queue = _queue()
+    calls = []
+
+    @queue.task("slow")
+    async def slow(payload):
+        calls.append(payload)
+
+    async def scenario():
+        task_id = await queue.enqueue("slow", {})
+        stale = await queue.claim()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(BackgroundTask)
+                .where(BackgroundTask.id == task_id)
+                .values(locked_until=datetime.now(timezone.utc) - timedelta(seconds=1))
+            )
+            await db.commit()
+        expired = await queue.expire_leases()
+        fresh = await queue.claim()
+        stale_outcome = await queue.run(stale)
+        running = await _task(task_id)
+        fresh_outcome = await queue.run(fresh)
+        return expired, fresh, stale_outcome, running, fresh_outcome
+
+    expired, fresh, stale_outcome, running, fresh_outcome = run(scenario())
+    assert expired == 1
+    assert fresh.attempts == 2
+    assert stale_outcome == "lost"
+    assert running.status == RUNNING
+    assert fresh_outcome == DONE
+
+
+def test_expired_lease_on_last_attempt_is_dead_lettered(database, run):
+    queue = _queue(max_attempts=1)
+
+    async def scenario():
+        task_id = await queue.enqueue("crashes", {})
+        await queue.claim()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(BackgroundTask)
+                .where(BackgroundTask.id == task_id)
+                .values(locked_until=datetime.now(timezone.utc) - timedelta(seconds=1))
+            )
+            await db.commit()
+        await queue.expire_leases()
+        return await _task(task_id)
+
+    assert run(scenario()).status == DEAD
+
+
+def test_requeue_gives_a_dead_task_fresh_attempts(database, run):
+    queue = _queue(max_attempts=1)
+    fail = [True]
+
+    @queue.task("fixed-later")
+    async def fixed_later(payload):
+        if fail[0]:
+            raise RuntimeError("broken")
+
+    async def scenario():
+        task_id = await queue.enqueue("fixed-later", {})
+        await queue.run(await queue.claim())
+        fail[0] = False
+        requeued = await queue.requeue(task_id)
+        outcome = await queue.run(await queue.claim())
+        return requeued, outcome
+
+    requeued, outcome = run(scenario())
+    assert requeued.status == QUEUED and requeued.attempts == 0
+    assert outcome == DONE
+
+
+def test_only_dead_tasks_can_be_requeued(database, run):
+    queue = _queue()
+
+    async def scenario():
+        task_id = await queue.enqueue("pending", {})
+        await queue.requeue(task_id)
+
+    with pytest.raises(TaskStateError):
+        run(scenario())
+
+
+def test_staged_task_is_queued_only_if_the_transaction_commits(database, run):
+    queue = _queue()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            queue.stage(db, "rolled-back", {})
+            await db.rollback()
+        async with AsyncSessionLocal() as db:
+            queue.stage(db, "committed", {})
+            await db.commit()
+        return await queue.counts(), queue.enqueued
+
+    counts, enqueued = run(scenario())
+    assert counts == {QUEUED: 1}
+    assert enqueued == 1
+
+
+def test_drain_runs_every_due_task(database, run):
+    queue = _queue(max_attempts=1)
+
+    @queue.task("ok")
+    async def ok(payload):
+        pass
+
+    @queue.task("broken")
+    async def broken(payload):
+        raise RuntimeError("broken")
+
+    async def scenario():
+        for name in ("ok", "ok", "broken"):
+            await queue.enqueue(name, {})
+        outcomes = await queue.drain(max_seconds=5)
+        return outcomes, await queue.counts()
+
+    outcomes, counts = run(scenario())
+    assert outcomes == {DONE: 2, DEAD: 1}
+    assert counts == {DONE: 2, DEAD: 1}
@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app.utils.token_verifier import CLOCK_SKEW_SECONDS, FirebaseTokenVerifier, PublicKeyCache
+
+PROJECT_ID = "test-project"
+KID = "test-kid"
+
+
+def _certificate_pem(private_key) -> str:
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(private_key, hashes.SHA256())
+    )
+    return certificate.public_bytes(serialization.Encoding.PEM).decode("ascii")
+
+
+class StaticKeys(PublicKeyCache):
+    """Serves a fixed certificate set in place of Google's endpoint."""
+
+    def __init__(self, certificates):
+        super().__init__(url="https://certs.invalid/")
+        self.certificates = certificates
+
+    def _response(self) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json=self.certificates,
+            headers={"Cache-Control": "public, max-age=3600"},
+            request=httpx.Request("GET", self.url),
+        )
+
+    async def refresh(self) -> None:
+        self._install(self._response())
+
+    def refresh_sync(self) -> None:
+        self._install(self._response())
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def keys(signing_key):
+    return StaticKeys({KID: _certificate_pem(signing_key)})
+
+
+@pytest.fixture
+def verifier(keys):
+    return FirebaseTokenVerifier(keys)
+
+
+def _token(private_key, kid=KID, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "user-123",
+        "email": "user@example.com",
+        "iat": now - 10,
+        "auth_time": now - 10,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def test_valid_token(verifier, signing_key):
+    claims = verifier.verify_sync(_token(signing_key), PROJECT_ID)
+    assert claims["uid"] == "user-123"
+    assert claims["email"] == "user@example.com"
+
+
+def test_valid_token_async(verifier, keys, signing_key):
+    claims = asyncio.run(verifier.verify(_token(signing_key), PROJECT_ID))
+    assert claims["uid"] == "user-123"
+    assert keys.refreshes == 1
+
+
+def test_keys_are_fetched_once(verifier, keys, signing_key):
+    for _ in range(3):
+        verifier.verify_sync(_token(signing_key), PROJECT_ID)
+    assert keys.refreshes == 1
+
+
+def test_expired_token(verifier, signing_key):
+    past = int(time.time()) - 2 * 3600
+    token = _token(signing_key, iat=past, auth_time=past, exp=past + 3600)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify_sync(token, PROJECT_ID)
+
+
+def test_expiry_within_clock_skew_is_accepted(verifier, signing_key):
+    token = _token(signing_key, exp=int(time.time()) - CLOCK_SKEW_SECONDS // 2)
+    assert verifier.verify_sync(token, PROJECT_ID)["uid"] == "user-123"
+
+
+def test_wrong_audience(verifier, signing_key):
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier.verify_sync(_token(signing_key, aud="other-project"), PROJECT_ID)
+
+
+def test_wrong_issuer(verifier, signing_key):
+    token = _token(signing_key, iss="https://securetoken.google.com/other-project")
+    with pytest.raises(jwt.InvalidIssuerError):
+        verifier.verify_sync(token, PROJECT_ID)
+
+
+def test_unknown_kid(verifier, keys, signing_key):
+    with pytest.raises(jwt.InvalidTokenError, match="unknown key"):
+        verifier.verify_sync(_token(signing_key, kid="rotated-away"), PROJECT_ID)
+    # A second forged kid inside the refresh interval must not trigger another fetch
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify_sync(_token(signing_key, kid="another"), PROJECT_ID)
+    assert keys.refreshes == 1
+
+
+def test_bad_signature(verifier):
+    impostor = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify_sync(_token(impostor), PROJECT_ID)
+
+
+def test_tampered_payload(verifier, signing_key):
+    header, _, signature = _token(signing_key).split(".")
+    forged_payload = _token(signing_key, sub="admin").split(".")[1]
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify_sync(f"{header}.{forged_payload}.{signature}", PROJECT_ID)
+
+
+def test_non_rs256_header(verifier):
+    token = jwt.encode({"sub": "user-123"}, "s" * 32, algorithm="HS256", headers={"kid": KID})
+    with pytest.raises(jwt.InvalidTokenError, match="header"):
+        verifier.verify_sync(token, PROJECT_ID)
+
+
+@pytest.mark.parametrize("claim", ["iat", "auth_time"])
+def test_future_issued_at(verifier, signing_key, claim):
+    token = _token(signing_key, **{claim: int(time.time()) + 10 * CLOCK_SKEW_SECONDS})
+    with pytest.raises(jwt.ImmatureSignatureError):
+        verifier.verify_sync(token, PROJECT_ID)
+
+
+def test_issued_at_within_clock_skew_is_accepted(verifier, signing_key):
+    soon = int(time.time()) + CLOCK_SKEW_SECONDS // 2
+    assert verifier.verify_sync(_token(signing_key, iat=soon, auth_time=soon), PROJECT_ID)["uid"] == "user-123"
+
+
+@pytest.mark.parametrize("sub", ["", "x" * 129])
+def test_invalid_subject(verifier, signing_key, sub):
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify_sync(_token(signing_key, sub=sub), PROJECT_ID)
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.upstream_governor import UpstreamGovernor, UpstreamSaturatedError
+
+
+def test_admits_up_to_max_concurrency_without_queueing():
+    async def scenario():
+        governor = UpstreamGovernor(max_concurrency=2, max_queue=4, max_queue_wait_seconds=1)
+        await governor.acquire()
+        await governor.acquire()
+        return governor
+
+    governor = asyncio.run(scenario())
+    assert governor.in_flight == 2
+    assert governor.admitted == 2
+    assert governor.queued == 0
+
+
+def test_queued_callers_are_admitted_in_arrival_order():
+    async def scenario():
+        governor = UpstreamGovernor(max_concurrency=1, max_queue=4, max_queue_wait_seconds=5)
+        order = []
+
+        async def call(name):
+            async with governor.slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await governor.acquire()
+        callers = [asyncio.create_task(call(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        depth = governor.queue_depth
+        governor.release()
+        await asyncio.gather(*callers)
+        return governor, order, depth
+
+    governor, order, depth = asyncio.run(scenario())
+    assert depth == 3
+    assert order == ["a", "b", "c"]
+    assert governor.in_flight == 0
+    assert governor.queued == 3
+
+
+def test_full_queue_sheds_with_retry_after():
+    async def scenario():
+        governor = UpstreamGovernor(max_concurrency=1, max_queue=1, max_queue_wait_seconds=5)
+        await governor.acquire()
+        waiter = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamSaturatedError) as raised:
+            await governor.acquire()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return governor, raised.value
+
+    governor, error = asyncio.run(scenario())
+    assert governor.shed == 1
+    assert error.retry_after >= 1
+
+
+def test_queue_wait_times_out():
+    async def scenario():
+        governor = UpstreamGovernor(max_concurrency=1, max_queue=4, max_queue_wait_seconds=0.05)
+        await governor.acquire()
+        with pytest.raises(UpstreamSaturatedError):
+            await governor.acquire()
+        return governor
+
+    governor = asyncio.run(scenario())
+    assert governor.timed_out == 1
+    assert governor.queue_depth == 0
+    assert governor.in_flight == 1
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    async def scenario():
+        governor = UpstreamGovernor(max_concurrency=1, max_queue=4, max_queue_wait_seconds=5)
+        await governor.acquire()
+        waiter = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        governor.release()
+        return governor
+
+    governor = asyncio.run(scenario())
+    assert governor.in_flight == 0
+    assert governor.queue_depth == 0
+
+
+def test_disabled_governor_admits_everything():
+    async def scenario():
+        governor = UpstreamGovernor(max_concurrency=1, max_queue=0, max_queue_wait_seconds=0, enabled=False)
+        for _ in range(5):
+            await governor.acquire()
+        return governor
+
+    assert asyncio.run(scenario()).shed == 0
+
+
+def test_chat_endpoint_returns_503_with_retry_after(monkeypatch):
+    from app.main import create_application
+    from app.services.ai_service import ai_service
+
+    async def saturated(*args, **kwargs):
+        raise UpstreamSaturatedError("AI service is at capacity. Please try again shortly.", 7)
+
+    monkeypatch.setattr(ai_service, "generate_response", saturated)
+    client = TestClient(create_application())
+
+    response = client.post("/api/v1/chat", json={"message": "Hello"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
@@ -0,0 +1,141 @@
+import types
+
+import pytest
+
+from app.services import upstream_resilience
+from app.services.upstream_resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(upstream_resilience, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def _open_breaker(failure_threshold: int = 3, reset_seconds: float = 30, probes: int = 1) -> CircuitBreaker:
+    breaker = CircuitBreaker("test-model", failure_threshold, reset_seconds, probes)
+    for _ in range(failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_stays_closed_below_threshold(clock):
+    breaker = CircuitBreaker("test-model", failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker("test-model", failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_breaker_opens_at_threshold_and_fails_fast(clock):
+    breaker = _open_breaker()
+    assert breaker.state == OPEN
+    assert breaker.opened == 1
+
+    clock.advance(10)
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == 20
+    assert breaker.short_circuited == 1
+
+
+def test_breaker_half_opens_after_reset_and_closes_on_success(clock):
+    breaker = _open_breaker()
+    clock.advance(30)
+
+    breaker.before_call()  # the probe
+    assert breaker.state == HALF_OPEN
+    # Only one probe per interval; everyone else still fails fast
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _open_breaker()
+    clock.advance(30)
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.advance(30)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+
+def test_lost_probe_lets_the_next_interval_probe(clock):
+    breaker = _open_breaker()
+    clock.advance(30)
+    breaker.before_call()  # this probe never reports back
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.advance(30)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+
+def test_retry_budget_floor_when_quiet(clock):
+    budget = RetryBudget(ratio=0.2, min_retries=3)
+    budget.record_request()
+    assert [budget.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert budget.denied == 1
+
+
+def test_retry_budget_scales_with_traffic(clock):
+    budget = RetryBudget(ratio=0.2, min_retries=3)
+    for _ in range(50):
+        budget.record_request()
+    granted = sum(budget.try_acquire() for _ in range(20))
+    assert granted == 10
+    assert budget.stats() == {"requests": 50, "retries": 10, "denied": 10}
+
+
+def test_retry_budget_refills_after_window(clock):
+    budget = RetryBudget(ratio=0.2, min_retries=2, window_seconds=10)
+    budget.record_request()
+    assert budget.try_acquire() and budget.try_acquire()
+    assert not budget.try_acquire()
+
+    clock.advance(5)
+    assert not budget.try_acquire()
+    clock.advance(6)
+    assert budget.try_acquire()
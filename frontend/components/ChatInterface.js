@@ -7,11 +7,17 @@ import styles from '../styles/Chat.module.css';
 const apiUrl = process.env.NEXT_PUBLIC_API_URL;
 const siteUrl = process.env.NEXT_PUBLIC_SITE_URL;
 
+// Reconnect attempts for an interrupted response stream
+const MAX_STREAM_RESUMES = 3;
+const RESUME_DELAY_MS = 1000;
+
 const Chat = () => {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const messagesEndRef = useRef(null);
+  // Server-side conversation session, returned in the X-Session-Id header
+  const sessionIdRef = useRef(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -31,33 +37,23 @@ const Chat = () => {
     setIsLoading(true);
 
     try {
-      // Start streaming response
+      // Stream the response as server-sent events so a dropped connection can resume
       const streamUrl = `${apiUrl || 'http://localhost:8000'}/api/v1/chat/stream`;
-      const res = await fetch(streamUrl, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: userMessage })
-      });
-
-      if (!res.ok || !res.body) {
-        throw new Error('Failed to start streaming');
-      }
+      const body = JSON.stringify({ message: userMessage, session_id: sessionIdRef.current });
 
-      // Optimistically add an empty bot message to fill as tokens arrive
+      // The bot message is added on the first token and filled as more arrive
       let botContent = '';
-      setMessages(prev => [...prev, { type: 'bot', content: '' }]);
-
-      const reader = res.body.getReader();
-      const decoder = new TextDecoder();
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-        const chunk = decoder.decode(value, { stream: true });
-        // Detect backend error marker
-        if (chunk.startsWith('[STREAM_ERROR]:')) {
-          throw new Error(chunk.replace('[STREAM_ERROR]:', '').trim());
+      let botAdded = false;
+      let lastEventId = null;
+      let finished = false;
+
+      const appendText = (text) => {
+        botContent += text;
+        if (!botAdded) {
+          botAdded = true;
+          setMessages(prev => [...prev, { type: 'bot', content: botContent }]);
+          return;
         }
-        botContent += chunk;
         setMessages(prev => {
           const next = [...prev];
           // Update the last message (bot placeholder)
@@ -67,6 +63,69 @@ const Chat = () => {
           }
           return next;
         });
+      };
+
+      const handleEvent = (event, data) => {
+        if (event === 'delta') {
+          appendText(JSON.parse(data).text);
+        } else if (event === 'error') {
+          finished = true;
+          throw new Error(JSON.parse(data).message);
+        } else if (event === 'done') {
+          finished = true;
+        }
+      };
+
+      for (let attempt = 0; !finished && attempt <= MAX_STREAM_RESUMES; attempt++) {
+        const headers = { 'Content-Type': 'application/json', Accept: 'text/event-stream' };
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+
+        let res;
+        try {
+          res = await fetch(streamUrl, { method: 'POST', headers, body });
+        } catch (networkError) {
+          if (!lastEventId) throw networkError;
+          await new Promise(resolve => setTimeout(resolve, RESUME_DELAY_MS));
+          continue;
+        }
+        if (!res.ok || !res.body) {
+          throw new Error('Failed to start streaming');
+        }
+        sessionIdRef.current = res.headers.get('X-Session-Id') || sessionIdRef.current;
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        try {
+          while (!finished) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+              const rawEvent = buffer.slice(0, boundary);
+              buffer = buffer.slice(boundary + 2);
+              let event = 'message';
+              let data = '';
+              for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('id:')) lastEventId = line.slice(3).trim();
+                else if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+              }
+              if (data) handleEvent(event, data);
+            }
+          }
+        } catch (streamError) {
+          // Server-reported errors end the stream; network drops fall through to a resume
+          if (finished) throw streamError;
+        }
+        if (!finished) {
+          await new Promise(resolve => setTimeout(resolve, RESUME_DELAY_MS));
+        }
+      }
+      if (!finished) {
+        throw new Error('Stream interrupted');
       }
     } catch (error) {
       console.error('Error:', error);
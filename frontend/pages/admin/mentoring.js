@@ -4,21 +4,47 @@ import Head from 'next/head';
 import axios from 'axios';
 
 const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000/api/v1';
+const PAGE_SIZE = 50;
 
 export default function AdminMentoringPage() {
   const [token, setToken] = useState('');
   const [apps, setApps] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [total, setTotal] = useState(null);
+  const [statusFilter, setStatusFilter] = useState('');
+  const [createdFrom, setCreatedFrom] = useState('');
+  const [createdTo, setCreatedTo] = useState('');
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [query, setQuery] = useState('');
+  const [hits, setHits] = useState(null);
+  const [hitsCursor, setHitsCursor] = useState(null);
   const [error, setError] = useState('');
 
+  const filterParams = () => {
+    const params = {};
+    if (statusFilter) params.status = statusFilter;
+    if (createdFrom) params.created_from = new Date(createdFrom).toISOString();
+    if (createdTo) params.created_to = new Date(createdTo).toISOString();
+    return params;
+  };
+
+  const fetchPage = async (cursor) => {
+    const res = await axios.get(`${API_BASE}/mentoring/admin/applications`, {
+      params: { ...filterParams(), limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+      headers: { 'X-Admin-Token': token },
+    });
+    return res.data || { items: [], next_cursor: null, total_estimate: 0 };
+  };
+
   const load = async () => {
     setLoading(true);
     setError('');
     try {
-      const res = await axios.get(`${API_BASE}/mentoring/admin/applications`, {
-        headers: { 'X-Admin-Token': token },
-      });
-      setApps(res.data || []);
+      const page = await fetchPage(null);
+      setApps(page.items);
+      setNextCursor(page.next_cursor);
+      setTotal(page.total_estimate);
     } catch (e) {
       setError('Unauthorized or server error');
     } finally {
@@ -26,13 +52,64 @@ export default function AdminMentoringPage() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setApps((prev) => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+      setTotal(page.total_estimate);
+    } catch (e) {
+      setError('Unauthorized or server error');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const search = async (cursor) => {
+    if (!query.trim()) {
+      setHits(null);
+      return;
+    }
+    try {
+      const res = await axios.get(`${API_BASE}/mentoring/admin/applications/search`, {
+        params: { q: query, limit: 20, ...(statusFilter ? { status: statusFilter } : {}), ...(cursor ? { cursor } : {}) },
+        headers: { 'X-Admin-Token': token },
+      });
+      setHits((prev) => (cursor && prev ? [...prev, ...res.data.items] : res.data.items));
+      setHitsCursor(res.data.next_cursor);
+    } catch (e) {
+      setError('Search failed');
+    }
+  };
+
+  const exportApplications = async (format) => {
+    try {
+      const res = await axios.get(`${API_BASE}/mentoring/admin/applications/export`, {
+        params: { ...filterParams(), format },
+        headers: { 'X-Admin-Token': token },
+        responseType: 'blob',
+      });
+      const url = URL.createObjectURL(res.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `mentee_applications.${format}`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (e) {
+      setError('Export failed');
+    }
+  };
+
   const updateStatus = async (id, status) => {
     try {
-      await axios.post(`${API_BASE}/mentoring/admin/applications/${id}/status`, null, {
+      const res = await axios.post(`${API_BASE}/mentoring/admin/applications/${id}/status`, null, {
         params: { status },
         headers: { 'X-Admin-Token': token },
       });
-      await load();
+      // Update in place so already-loaded pages aren't refetched
+      setApps((prev) => prev.map((a) => (a.id === id ? res.data : a)));
     } catch (e) {
       alert('Failed to update status');
     }
@@ -55,6 +132,63 @@ export default function AdminMentoringPage() {
           />
           <button onClick={load} className="px-4 py-2 rounded-md bg-neutral-900 text-white">Load</button>
         </div>
+        <div className="flex flex-wrap items-center gap-3 text-sm">
+          <select
+            value={statusFilter}
+            onChange={(e) => setStatusFilter(e.target.value)}
+            className="rounded-md border border-neutral-300 px-3 py-2"
+          >
+            <option value="">All statuses</option>
+            <option value="pending">Pending</option>
+            <option value="accepted">Accepted</option>
+            <option value="rejected">Rejected</option>
+          </select>
+          <label className="flex items-center gap-2">
+            From
+            <input type="date" value={createdFrom} onChange={(e) => setCreatedFrom(e.target.value)} className="rounded-md border border-neutral-300 px-2 py-1" />
+          </label>
+          <label className="flex items-center gap-2">
+            To
+            <input type="date" value={createdTo} onChange={(e) => setCreatedTo(e.target.value)} className="rounded-md border border-neutral-300 px-2 py-1" />
+          </label>
+          <button onClick={() => exportApplications('csv')} className="px-3 py-2 rounded-md border border-neutral-300">Export CSV</button>
+          <button onClick={() => exportApplications('ndjson')} className="px-3 py-2 rounded-md border border-neutral-300">Export NDJSON</button>
+        </div>
+        <form
+          className="flex items-center gap-3"
+          onSubmit={(e) => {
+            e.preventDefault();
+            search(null);
+          }}
+        >
+          <input
+            type="search"
+            placeholder="Search goals, background, areas, expectations"
+            value={query}
+            onChange={(e) => setQuery(e.target.value)}
+            className="flex-1 rounded-md border border-neutral-300 px-3 py-2"
+          />
+          <button type="submit" className="px-4 py-2 rounded-md border border-neutral-300">Search</button>
+        </form>
+        {hits && (
+          <div className="divide-y divide-neutral-200 border rounded-md">
+            {hits.map((h) => (
+              <div key={h.id} className="p-4">
+                <div className="font-medium">{h.full_name || h.user_email}</div>
+                <div className="text-sm text-neutral-600">{h.user_email} · {h.status}</div>
+                {/* The server HTML-escapes snippets and only adds <mark> tags */}
+                <div className="text-sm mt-2" dangerouslySetInnerHTML={{ __html: h.snippet }} />
+              </div>
+            ))}
+            {hits.length === 0 && <div className="p-4 text-sm text-neutral-500">No matches.</div>}
+            {hitsCursor && (
+              <button onClick={() => search(hitsCursor)} className="w-full p-3 text-sm text-neutral-600">More results</button>
+            )}
+          </div>
+        )}
+        {total !== null && (
+          <div className="text-sm text-neutral-600">Showing {apps.length} of ~{total} applications</div>
+        )}
         {error && <div className="text-red-600 text-sm">{error}</div>}
         {loading ? (
           <div>Loading...</div>
@@ -79,6 +213,11 @@ export default function AdminMentoringPage() {
             {apps.length === 0 && <div className="p-4 text-sm text-neutral-500">No applications.</div>}
           </div>
         )}
+        {!loading && nextCursor && (
+          <button onClick={loadMore} disabled={loadingMore} className="px-4 py-2 rounded-md border border-neutral-300 text-sm">
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        )}
       </div>
     </Layout>
   );